@@ -0,0 +1,239 @@
+from model import Item, Recipe
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+# problem lists of the analysis report that fail an export when they gain entries missing in the baseline
+CHECKED_PROBLEMS = ['missing_producers', 'unreachable_items', 'unreachable_recipes', 'no_input_recipes', 'cycles']
+
+
+class RecipeGraphRegression(ValueError):
+
+    def __init__(self, regressions: Dict[str, List]) -> None:
+        super().__init__('\n'.join(f'{len(entries)} new {problem.replace("_", " ")}: {", ".join(map(str, entries))}' for problem, entries in regressions.items()))
+        self.regressions = regressions
+
+
+def group_offsets(groups: np.ndarray, size: int) -> np.ndarray:
+    # start of every group in an array sorted by the group numbers, followed by the end of the last one
+    return np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=size)))).astype(np.int64)
+
+
+class RecipeGraph:
+
+    def __init__(self, items: Dict[str, Item], recipes: Dict[str, Recipe]) -> None:
+        # items referenced only by recipes are added after the exported items
+        self.__item_ids = list(items)
+        item_index = {item_id: i for i, item_id in enumerate(self.__item_ids)}
+        for recipe in recipes.values():
+            for item_id in recipe.inputs + recipe.outputs:
+                if item_id not in item_index:
+                    item_index[item_id] = len(self.__item_ids)
+                    self.__item_ids.append(item_id)
+        self.__item_index = item_index
+        self.__recipe_ids = list(recipes)
+        self.__raw = np.array([items[item_id].row == 0 if item_id in items else False for item_id in self.__item_ids], dtype=bool)
+        # sparse item x recipe matrices as coordinate arrays sorted by recipe, built from the parallel arrays of the recipes
+        recipe_values = recipes.values()
+        self.in_recipe = np.repeat(np.arange(len(recipes)), [len(recipe.inputs) for recipe in recipe_values])
+        self.in_item = np.fromiter((item_index[item_id] for recipe in recipe_values for item_id in recipe.inputs), dtype=np.int64, count=len(self.in_recipe))
+        self.in_amount = np.frombuffer(b''.join(recipe.input_amounts.tobytes() for recipe in recipe_values), dtype=np.int64)
+        self.out_recipe = np.repeat(np.arange(len(recipes)), [len(recipe.outputs) for recipe in recipe_values])
+        self.out_item = np.fromiter((item_index[item_id] for recipe in recipe_values for item_id in recipe.outputs), dtype=np.int64, count=len(self.out_recipe))
+        self.out_amount = np.frombuffer(b''.join(recipe.output_amounts.tobytes() for recipe in recipe_values), dtype=np.int64)
+        self.time = np.array([recipe.time for recipe in recipe_values], dtype=np.float64)
+
+    @property
+    def item_ids(self) -> List[str]:
+        return self.__item_ids
+
+    @property
+    def recipe_ids(self) -> List[str]:
+        return self.__recipe_ids
+
+    @property
+    def raw(self) -> np.ndarray:
+        return self.__raw
+
+    def rates(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # coordinates and values of the item x recipe matrix of items produced (positive) and consumed (negative) per second by one machine
+        time = np.where(self.time > 0, self.time, 1)
+        rows = np.concatenate((self.out_item, self.in_item))
+        columns = np.concatenate((self.out_recipe, self.in_recipe))
+        values = np.concatenate((self.out_amount / time[self.out_recipe], -self.in_amount / time[self.in_recipe]))
+        return rows, columns, values
+
+    def produced(self) -> np.ndarray:
+        return np.bincount(self.out_item, minlength=len(self.__item_ids)) > 0
+
+    def consumed(self) -> np.ndarray:
+        return np.bincount(self.in_item, minlength=len(self.__item_ids)) > 0
+
+    def reachable(self, sources: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # items obtainable from the raw items and the recipes able to run, every round runs all recipes with obtainable ingredients
+        reachable_items = self.__raw.copy() if sources is None else sources.copy()
+        runnable = np.zeros(len(self.__recipe_ids), dtype=bool)
+        while True:
+            missing_inputs = np.bincount(self.in_recipe, weights=~reachable_items[self.in_item], minlength=len(self.__recipe_ids))
+            new_recipes = (missing_inputs == 0) & ~runnable
+            if not new_recipes.any():
+                return reachable_items, runnable
+            runnable |= new_recipes
+            reachable_items[self.out_item[new_recipes[self.out_recipe]]] = True
+
+    def item_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        # every ingredient of a recipe leads to every product of it
+        out_offsets = group_offsets(self.out_recipe, len(self.__recipe_ids))
+        out_counts = np.diff(out_offsets)[self.in_recipe]
+        sources = np.repeat(self.in_item, out_counts)
+        first_products = np.repeat(out_offsets[self.in_recipe], out_counts)
+        product_numbers = np.arange(len(sources)) - np.repeat(np.cumsum(out_counts) - out_counts, out_counts)
+        return sources, self.out_item[first_products + product_numbers]
+
+    def cycles(self) -> List[List[str]]:
+        sources, targets = self.item_edges()
+        # items without ingredients or without products in the remaining graph can not be part of a cycle
+        remaining = np.ones(len(self.__item_ids), dtype=bool)
+        while True:
+            edges = remaining[sources] & remaining[targets]
+            trimmed = remaining & (np.bincount(sources[edges], minlength=len(remaining)) > 0) & (np.bincount(targets[edges], minlength=len(remaining)) > 0)
+            if (trimmed == remaining).all():
+                break
+            remaining = trimmed
+        sources, targets = sources[edges], targets[edges]
+        order = np.argsort(sources, kind='stable')
+        sources, targets = sources[order], targets[order]
+        offsets = group_offsets(sources, len(remaining))
+        self_loops = set(sources[sources == targets].tolist())
+        components = [component for component in self.__components(np.flatnonzero(remaining).tolist(), offsets.tolist(), targets.tolist()) if len(component) > 1 or component[0] in self_loops]
+        return sorted(sorted(self.__item_ids[item] for item in component) for component in components)
+
+    @staticmethod
+    def __components(nodes: List[int], offsets: List[int], targets: List[int]) -> List[List[int]]:
+        # iterative Tarjan's strongly connected components
+        index = dict()
+        lowlink = dict()
+        stack = list()
+        on_stack = set()
+        components = list()
+        for root in nodes:
+            if root in index:
+                continue
+            work = [(root, offsets[root])]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, edge = work[-1]
+                if edge < offsets[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    target = targets[edge]
+                    if target not in index:
+                        index[target] = lowlink[target] = len(index)
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, offsets[target]))
+                    elif target in on_stack:
+                        lowlink[node] = min(lowlink[node], index[target])
+                    continue
+                work.pop()
+                if work:
+                    lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = list()
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def steady_state(self, target: str, rate: float = 1.0) -> Dict[str, Dict[str, float]]:
+        # machines needed for the target rate in items per second, every item is made by its first runnable recipe and raw items are mined
+        if target not in self.__item_index:
+            raise KeyError(f'Unknown item: {target}')
+        _, runnable = self.reachable()
+        producers = dict()
+        for recipe, item in zip(self.out_recipe.tolist(), self.out_item.tolist()):
+            if runnable[recipe]:
+                producers.setdefault(item, recipe)
+        in_offsets = group_offsets(self.in_recipe, len(self.__recipe_ids)).tolist()
+        in_items = self.in_item.tolist()
+        # intermediate items needed for the target and the recipes making them
+        made_items = dict()
+        pending = [self.__item_index[target]]
+        while pending:
+            item = pending.pop()
+            if item in made_items or self.__raw[item] or item not in producers:
+                continue
+            made_items[item] = len(made_items)
+            recipe = producers[item]
+            pending.extend(in_items[in_offsets[recipe]:in_offsets[recipe + 1]])
+        if self.__item_index[target] not in made_items:
+            raise ValueError(f'No runnable recipe makes: {target}')
+        recipes = np.array([producers[item] for item in made_items], dtype=np.int64)
+        rows, columns, values = self.rates()
+        recipe_columns = np.full(len(self.__recipe_ids), -1, dtype=np.int64)
+        recipe_columns[recipes] = np.arange(len(recipes))
+        used = recipe_columns[columns] >= 0
+        rows, columns, values = rows[used], recipe_columns[columns[used]], values[used]
+        # net rate of every intermediate item is zero except for the target
+        item_rows = np.full(len(self.__item_ids), -1, dtype=np.int64)
+        item_rows[list(made_items)] = np.arange(len(made_items))
+        balanced = item_rows[rows] >= 0
+        matrix = np.zeros((len(made_items), len(recipes)))
+        np.add.at(matrix, (item_rows[rows[balanced]], columns[balanced]), values[balanced])
+        demand = np.zeros(len(made_items))
+        demand[made_items[self.__item_index[target]]] = rate
+        machines, _, matrix_rank, _ = np.linalg.lstsq(matrix, demand, rcond=None)
+        if matrix_rank < len(recipes) or (machines < -1e-9).any():
+            raise ValueError(f'The recipes making {target} have no steady state')
+        # items not made by the chosen recipes are the inputs of the production
+        net_rates = np.zeros(len(self.__item_ids))
+        np.add.at(net_rates, rows, values * machines[columns])
+        return {
+            "machines": {self.__recipe_ids[recipe]: float(count) for recipe, count in zip(recipes.tolist(), machines)},
+            "inputs": {self.__item_ids[item]: float(-net_rates[item]) for item in np.flatnonzero((item_rows < 0) & (net_rates < -1e-9)).tolist()}
+        }
+
+
+def analyze(items: Dict[str, Item], recipes: Dict[str, Recipe]) -> Dict[str, Any]:
+    graph = RecipeGraph(items, recipes)
+    item_ids = np.array(graph.item_ids, dtype=object)
+    recipe_ids = np.array(graph.recipe_ids, dtype=object)
+    produced = graph.produced()
+    reachable_items, runnable = graph.reachable()
+    return {
+        "items": len(graph.item_ids),
+        "recipes": len(graph.recipe_ids),
+        "raw_items": sorted(item_ids[graph.raw].tolist()),
+        "missing_producers": sorted(item_ids[graph.consumed() & ~produced & ~graph.raw].tolist()),
+        "unreachable_items": sorted(item_ids[produced & ~reachable_items].tolist()),
+        "unreachable_recipes": sorted(recipe_ids[~runnable].tolist()),
+        "no_input_recipes": sorted(recipe_ids[np.bincount(graph.in_recipe, minlength=len(recipe_ids)) == 0].tolist()),
+        "cycles": graph.cycles()
+    }
+
+
+def regressions(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, List]:
+    found = dict()
+    for problem in CHECKED_PROBLEMS:
+        known = {json_key(entry) for entry in baseline.get(problem, list())}
+        new_entries = [entry for entry in report[problem] if json_key(entry) not in known]
+        if new_entries:
+            found[problem] = new_entries
+    return found
+
+
+def json_key(entry: Any) -> Any:
+    # cycles are lists of item ids
+    return tuple(entry) if isinstance(entry, list) else entry
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f'Recipe graph: {report["items"]} items, {report["recipes"]} recipes, {len(report["raw_items"])} raw items')
+    for problem in CHECKED_PROBLEMS:
+        if report[problem]:
+            print(f'  {problem.replace("_", " ")}: {len(report[problem])}')
@@ -1,12 +1,25 @@
 from argparse import ArgumentParser
+from atlas import pack_icons
+from cache import content_hash
+from fnmatch import fnmatch
 from pathlib import Path
 from typing import Dict, List, Tuple, Union, Iterator, Callable, Optional, cast
 from PIL import Image
 from UnityPy.classes import Texture2D, Sprite
 from UnityPy.enums import ClassIDType
+from UnityPy.files import ObjectReader
 import UnityPy
 import json
-import math
+import numpy as np
+import mmap
+import os
+import struct
+
+
+# icon rows and columns narrower than this are noise between the icons, unless they touch the edge of the atlas
+MIN_ICON_SIZE = 5
+
+IconBoxes = Tuple[np.ndarray, np.ndarray]
 
 
 def crop_box_x(image_size: Tuple[int, int], start_position: int, end_position: Optional[int]) -> Tuple[int, int, int, int]:
@@ -35,7 +48,7 @@ def split_image(image: Image.Image, projection_extractor: Callable[[Tuple[List[i
             if current_projection == 1:
                 start_position = current_position
             if current_projection == 0:
-                if current_position - start_position < 5:
+                if current_position - start_position < MIN_ICON_SIZE:
                     if debug:
                         print(f'Skipping element (would be {debug_index:02}. {debug_name}) of size {current_position - start_position}px ({start_position}-{current_position}) as too small.')
                     continue
@@ -52,69 +65,264 @@ def split_image(image: Image.Image, projection_extractor: Callable[[Tuple[List[i
             yield image.crop(crop_box)
 
 
-def asset_image_objects(game_data: Path) -> Iterator[Tuple[ClassIDType, Union[Texture2D, Sprite]]]:
-    env = UnityPy.load(game_data.absolute().as_posix())
-    print(f'assets = {len(env.assets)}')
-    print(f'conteiners = {len(env.container)}')
-    print(f'objects = {len(env.objects)}')
+def projection_runs(projections: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # start and end of every run of set pixels in every projection, the same runs as split_image yields
+    edges = np.diff(np.pad(projections, ((0, 0), (1, 1))).view(np.int8), axis=1)
+    run_projections, run_starts = np.nonzero(edges == 1)
+    _, run_ends = np.nonzero(edges == -1)
+    kept_runs = (run_ends - run_starts >= MIN_ICON_SIZE) | (run_ends == projections.shape[1])
+    return run_projections[kept_runs], run_starts[kept_runs], run_ends[kept_runs]
+
+
+def icon_boxes(image: Image.Image) -> IconBoxes:
+    # crop boxes of all icons, row after row from the top, and the index of the first box of every row (and the end)
+    _, row_starts, row_ends = projection_runs(np.array(image.getprojection()[1], dtype=bool)[np.newaxis])
+    # the column projections of all rows are split into icons at once
+    column_projections = np.array([image.crop(crop_box_y(image.size, row_start, row_end)).getprojection()[0] for row_start, row_end in zip(row_starts, row_ends)], dtype=bool).reshape(len(row_starts), image.size[0])
+    icon_rows, column_starts, column_ends = projection_runs(column_projections)
+    boxes = np.stack((column_starts, row_starts[icon_rows], column_ends, row_ends[icon_rows]), axis=1)
+    first_boxes = np.concatenate(([0], np.cumsum(np.bincount(icon_rows, minlength=len(row_starts))))).astype(np.int64)
+    return boxes, first_boxes
+
+
+def icon_box(icon_boxes: IconBoxes, icon_position: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    # rows are counted from the bottom of the atlas, indexed like the reversed nested lists of split_image
+    boxes, first_boxes = icon_boxes
+    row = range(len(first_boxes) - 2, -1, -1)[icon_position[0]]
+    return cast(Tuple[int, int, int, int], tuple(int(position) for position in boxes[range(first_boxes[row], first_boxes[row + 1])[icon_position[1]]]))
+
+
+ASSET_INDEX_VERSION = 3
+
+# the index is kept with the other files cached by the export, it holds the asset files of every game directory indexed so far
+DEFAULT_ASSET_INDEX = Path(__file__).parent / '.cache' / 'assets.json'
+
+IMAGE_TYPES = {ClassIDType.Texture2D, ClassIDType.Sprite}
+
+# raw texture and audio data referenced by the asset files, they never contain any objects
+RESOURCE_SUFFIXES = {'.resS', '.resource'}
+
+# Unity serialized files, the assemblies, the mono runtime and the configuration files next to them are never indexed
+ASSET_FILE_PATTERNS = ['*.assets', 'level*', 'sharedassets*', 'resources.assets']
+
+AssetRecord = Dict[str, Union[str, int]]
+
+DEFAULT_TEXTURE_CACHE_SIZE = 512 << 20
+
+TEXTURE_FORMATS = {'raw', 'png'}
+
+# longest image mode name stored in raw textures
+RAW_TEXTURE_MODE_SIZE = 16
+
+# format version, image mode, width and height in front of the raw pixel data
+RAW_TEXTURE_HEADER = struct.Struct(f'<4s{RAW_TEXTURE_MODE_SIZE}sII')
+
+# raw textures written with an older header are decoded again
+RAW_TEXTURE_VERSION = b'TEX2'
+
+# modes PNG files store without converting them, textures in other modes are cached as raw textures
+PNG_TEXTURE_MODES = {'1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I;16'}
+
+
+def asset_files(game_data: Path) -> List[Path]:
+    return sorted(file for file in game_data.rglob('*') if file.is_file() and file.suffix not in RESOURCE_SUFFIXES and any(fnmatch(file.name, pattern) for pattern in ASSET_FILE_PATTERNS))
+
+
+def asset_sources(asset_file: Path) -> List[Path]:
+    # the asset file with the resource files holding its texture data
+    return [asset_file] + [resource_file for resource_file in (asset_file.with_name(asset_file.name + suffix) for suffix in sorted(RESOURCE_SUFFIXES)) if resource_file.is_file()]
+
+
+def object_name(obj: ObjectReader) -> Optional[str]:
+    # peeking parses only the name instead of the whole object
+    if hasattr(obj, 'peek_name'):
+        return obj.peek_name()
+    return obj.read().name
+
+
+def read_asset_inventory(game_data: Path, asset_file: Path) -> List[AssetRecord]:
+    env = UnityPy.load(asset_file.absolute().as_posix())
+    asset = asset_file.relative_to(game_data).as_posix()
+    return [{'asset': asset, 'file': obj.assets_file.name, 'name': object_name(obj), 'type': obj.type.name, 'path_id': obj.path_id} for obj in env.objects if obj.type in IMAGE_TYPES]
+
+
+def load_asset_index(game_data: Path, index_file: Path = DEFAULT_ASSET_INDEX) -> Dict:
+    # only asset files whose size or modification time changed since the index was written are loaded again
+    # every game directory has its own entry, switching between game installs keeps the entries of the others
+    index = None
+    if index_file.exists():
+        try:
+            index = json.loads(index_file.read_text())
+        except ValueError:
+            index = None
+    if not isinstance(index, dict) or index.get('version') != ASSET_INDEX_VERSION:
+        index = {'version': ASSET_INDEX_VERSION, 'games': dict()}
+    game = game_data.absolute().as_posix()
+    asset_index = index['games'].setdefault(game, {'game': game, 'assets': dict()})
+    indexed_assets = asset_index['assets']
+    assets = dict()
+    changed = False
+    for asset_file in asset_files(game_data):
+        asset = asset_file.relative_to(game_data).as_posix()
+        sources = asset_sources(asset_file)
+        stamps = [[source.name, source.stat().st_size, source.stat().st_mtime_ns] for source in sources]
+        indexed_asset = indexed_assets.get(asset)
+        if indexed_asset is None or indexed_asset['stamps'] != stamps:
+            print(f'Indexing asset file: {asset}')
+            indexed_asset = {'stamps': stamps, 'hash': content_hash(sources), 'objects': read_asset_inventory(game_data, asset_file)}
+            changed = True
+        assets[asset] = indexed_asset
+    if changed or assets.keys() != indexed_assets.keys():
+        asset_index['assets'] = assets
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = index_file.with_suffix('.tmp')
+        temporary_file.write_text(json.dumps(index, indent=4))
+        temporary_file.replace(index_file)
+    return asset_index
+
+
+def find_asset_objects(asset_index: Dict, name: str) -> Iterator[AssetRecord]:
+    for indexed_asset in asset_index['assets'].values():
+        for record in indexed_asset['objects']:
+            if record['name'] == name:
+                yield record
+
+
+def read_asset_object(game_data: Path, record: AssetRecord) -> Union[Texture2D, Sprite]:
+    # resource files with the texture data are loaded by UnityPy from the same directory when needed
+    env = UnityPy.load((game_data / cast(str, record['asset'])).absolute().as_posix())
     for obj in env.objects:
-        if obj.type == ClassIDType.Texture2D:
-            yield (obj.type, cast(Texture2D, obj.read()))
-        elif obj.type == ClassIDType.Sprite:
-            yield (obj.type, cast(Sprite, obj.read()))
-
-
-def game_icons(game_data: Path, icons_config: Dict[str, Tuple[int, int]]) -> Tuple[Image.Image, Dict[str, str]]:
-    for _, data in asset_image_objects(game_data):
-        if data.name == 'BlockPreview':
-            img = data.image
-            icons = [[icon for icon in split_image(icons_row, projection_x, crop_box_x)] for icons_row in split_image(img, projection_y, crop_box_y)]
-            icons.reverse()
-            size = 64 * math.ceil(math.sqrt(len(set(icons_config.values()))))
-            icons_out = Image.new(img.mode, (size, size))
-            game_icons = dict()
-            x_offset = 0
-            y_offset = 0
-            for icon_position in icons_config.values():
-                if icon_position in game_icons:
-                    continue
-                game_icons[icon_position] = f'-{x_offset}px -{y_offset}px'
-                selected_icon = icons[icon_position[0]][icon_position[1]]
-                icons_out.paste(selected_icon, (x_offset + math.floor((64-selected_icon.size[0])/2), y_offset + math.floor((64-selected_icon.size[1])/2)))
-                x_offset += 64
-                if x_offset >= size:
-                    x_offset = 0
-                    y_offset += 64
-            return icons_out, {icon_name: game_icons[icon_position] for icon_name, icon_position in icons_config.items()}
+        if obj.path_id == record['path_id'] and obj.assets_file.name == record['file']:
+            return cast(Union[Texture2D, Sprite], obj.read())
+    raise KeyError(f'Object {record["name"]} ({record["path_id"]}) not found in asset file: {record["asset"]}')
+
+
+class TextureCache:
+
+    def __init__(self, cache_dir: Path, max_size: int = DEFAULT_TEXTURE_CACHE_SIZE, texture_format: str = 'raw') -> None:
+        if texture_format not in TEXTURE_FORMATS:
+            raise ValueError(f'Unsupported texture format: {texture_format}')
+        self.__cache_dir = cache_dir
+        self.__max_size = max_size
+        self.__texture_format = texture_format
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, key: str, decoder: Callable[[], Image.Image]) -> Image.Image:
+        # textures the configured format can not store are kept in the other one
+        texture_files = [self.__cache_dir / f'{key}.{texture_format}' for texture_format in sorted(TEXTURE_FORMATS, key=lambda texture_format: texture_format != self.__texture_format)]
+        for texture_file in texture_files:
+            image = self.__read_texture(texture_file) if texture_file.exists() else None
+            if image is not None:
+                # the modification time orders the textures for the eviction
+                os.utime(texture_file)
+                self.hits += 1
+                return image
+        self.misses += 1
+        image = decoder()
+        texture_file = next(texture_file for texture_file in texture_files + [None] if texture_file is None or self.__stores(texture_file, image))
+        if texture_file is not None:
+            self.__write_texture(texture_file, image)
+            self.__evict(texture_file)
+        return image
+
+    @staticmethod
+    def __stores(texture_file: Path, image: Image.Image) -> bool:
+        # the raw pixels of palette images miss their palette
+        if texture_file.suffix == '.png':
+            return image.mode in PNG_TEXTURE_MODES
+        return image.palette is None and len(image.mode.encode()) <= RAW_TEXTURE_MODE_SIZE
+
+    def __read_texture(self, texture_file: Path) -> Optional[Image.Image]:
+        try:
+            if texture_file.suffix == '.png':
+                with Image.open(texture_file) as image:
+                    image.load()
+                    return image
+            with texture_file.open('rb') as texture_content:
+                texture_map = mmap.mmap(texture_content.fileno(), 0, access=mmap.ACCESS_READ)
+            version, mode, width, height = RAW_TEXTURE_HEADER.unpack_from(texture_map)
+            if version != RAW_TEXTURE_VERSION:
+                return None
+            mode = mode.rstrip(b'\0').decode()
+            # the image keeps the mapping open, supported modes are not copied into memory at all
+            return Image.frombuffer(mode, (width, height), memoryview(texture_map)[RAW_TEXTURE_HEADER.size:], 'raw', mode, 0, 1)
+        except (OSError, ValueError, UnicodeDecodeError, struct.error):
+            return None
+
+    def __write_texture(self, texture_file: Path, image: Image.Image) -> None:
+        self.__cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary_file = texture_file.with_suffix('.tmp')
+        if texture_file.suffix == '.png':
+            image.save(temporary_file, format='PNG')
+        else:
+            with temporary_file.open('wb') as texture_content:
+                texture_content.write(RAW_TEXTURE_HEADER.pack(RAW_TEXTURE_VERSION, image.mode.encode(), image.width, image.height))
+                texture_content.write(image.tobytes())
+        temporary_file.replace(texture_file)
+
+    def __evict(self, kept_file: Path) -> None:
+        texture_files = sorted((texture_file.stat().st_mtime_ns, texture_file) for texture_file in self.__cache_dir.glob('*') if texture_file.suffix[1:] in TEXTURE_FORMATS)
+        cache_size = sum(texture_file.stat().st_size for _, texture_file in texture_files)
+        for _, texture_file in texture_files:
+            if cache_size <= self.__max_size:
+                break
+            if texture_file != kept_file:
+                cache_size -= texture_file.stat().st_size
+                texture_file.unlink()
+
+
+def asset_texture(game_data: Path, asset_index: Dict, record: AssetRecord, texture_cache: Optional[TextureCache] = None) -> Image.Image:
+    if texture_cache is None:
+        return read_asset_object(game_data, record).image
+    return texture_cache.load(f'{asset_index["assets"][record["asset"]]["hash"]}-{record["path_id"]}', lambda: read_asset_object(game_data, record).image)
+
+
+def crop_icons(img: Image.Image, icons_config: Dict[str, Tuple[int, int]]) -> Dict[str, Image.Image]:
+    # only the icons referenced by the configuration are cropped from the atlas, each position once
+    boxes = icon_boxes(img)
+    icons = dict()
+    for icon_position in icons_config.values():
+        if icon_position not in icons:
+            icons[icon_position] = img.crop(icon_box(boxes, icon_position))
+    return {icon_name: icons[icon_position] for icon_name, icon_position in icons_config.items()}
+
+
+def game_icons(game_data: Path, icons_config: Dict[str, Tuple[int, int]], index_file: Path = DEFAULT_ASSET_INDEX, texture_cache: Optional[TextureCache] = None, icons: Optional[Dict[str, Image.Image]] = None) -> Tuple[Image.Image, Dict[str, str]]:
+    # icons given by name replace the BlockPreview icons, which are left for the other names of the configuration
+    icons = dict() if icons is None else icons
+    asset_index = load_asset_index(game_data, index_file)
+    for record in find_asset_objects(asset_index, 'BlockPreview'):
+        img = asset_texture(game_data, asset_index, record, texture_cache)
+        block_icons = crop_icons(img, {icon_name: icon_position for icon_name, icon_position in icons_config.items() if icon_name not in icons})
+        block_icons.update(icons)
+        return pack_icons(block_icons, 'RGBA' if icons else img.mode)
     else:
-        return Image.new('RGBA', (1, 1)), dict()
+        return pack_icons(icons) if icons else (Image.new('RGBA', (1, 1)), dict())
 
 
 def main():
     # Parse command line arguments
     parser = ArgumentParser()
     parser.add_argument('game', nargs='?', default='~/.steam/root/steam/steamapps/common/FortressCraft/FC_Linux_Universal_Data/', help='The directory with the FortressCraft Evolved! game files')
+    parser.add_argument('--cache', type=Path, default=Path(__file__).parent / '.cache' / 'textures', help='The directory with textures decoded by previous runs')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_TEXTURE_CACHE_SIZE >> 20, help='The maximum size of the decoded textures in MiB')
+    parser.add_argument('--cache-format', choices=sorted(TEXTURE_FORMATS), default='raw', help='Store decoded textures as raw memory-mapped pixels or as lossless PNG files')
     args = parser.parse_args()
 
     game_data = Path(args.game).expanduser()
+    texture_cache = TextureCache(args.cache.expanduser(), args.cache_size << 20, args.cache_format)
 
-    obj_dict = dict()
-    for img_type, data in asset_image_objects(game_data):
-        obj_dict.setdefault(img_type.name, dict()).setdefault(data.assets_file.name, list()).append({'file': data.assets_file.name, 'name': data.name, 'type': img_type.name, 'path_id': data.path_id})
-        # try:
-        #     data.image.save(Path(__file__).parent / 'assets' / f'{data.name}.png')
-        # except:
-        #     print(f'Failed to save image: {data.assets_file.name}/{data.name}.png of type {img_type.name}')
-        if data.name == 'BlockPreview':
-            img = data.image
-            icons = [[icon for icon in split_image(icons_row, projection_x, crop_box_x)] for icons_row in split_image(img, projection_y, crop_box_y)]
-            icons.reverse()
-            # icons[26][7].show()
-            # icons[4][4].show()
-
-    output_file = Path(__file__).parent / 'assets.json'
-    output_file.write_text(json.dumps({'game_assets': obj_dict}, indent=4))
+    asset_index = load_asset_index(game_data)
+    print(f'assets = {len(asset_index["assets"])}')
+    print(f'objects = {sum(len(indexed_asset["objects"]) for indexed_asset in asset_index["assets"].values())}')
+    for record in find_asset_objects(asset_index, 'BlockPreview'):
+        img = asset_texture(game_data, asset_index, record, texture_cache)
+        boxes, first_boxes = icon_boxes(img)
+        print(f'icons = {len(boxes)} in {len(first_boxes) - 1} rows')
+        # img.crop(icon_box((boxes, first_boxes), (26, 7))).show()
+        # img.crop(icon_box((boxes, first_boxes), (4, 4))).show()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from PIL import Image
+import hashlib
+import math
+
+
+ICON_SIZE = 64
+
+ATLAS_FORMATS = {'png': 'PNG', 'webp': 'WEBP'}
+
+DEFAULT_ATLAS_FORMATS = ['png']
+
+DEFAULT_ATLAS_SCALES = [1.0]
+
+# lossy WebP qualities tried in order when the lossless atlas does not fit into the size budget
+WEBP_QUALITIES = [90, 80, 70, 60, 50]
+
+# image files decoded by one task of the worker pool
+DEFAULT_ICON_BATCH_SIZE = 32
+
+
+def icon_hash(icon: Image.Image) -> str:
+    return hashlib.sha1(f'{icon.mode}:{icon.width}x{icon.height}:'.encode() + icon.tobytes()).hexdigest()
+
+
+def pack_icons(icons: Dict[str, Image.Image], mode: str = 'RGBA') -> Tuple[Image.Image, Dict[str, str]]:
+    # visually identical icons share one cell, the cells form the smallest grid with at most one incomplete row
+    cells = dict()
+    icon_cells = dict()
+    for icon_name, icon in icons.items():
+        icon_cells[icon_name] = cells.setdefault(icon_hash(icon), (len(cells), icon))[0]
+    columns = math.ceil(math.sqrt(len(cells)))
+    rows = math.ceil(len(cells) / columns) if columns else 0
+    atlas = Image.new(mode, (columns * ICON_SIZE, rows * ICON_SIZE))
+    positions = list()
+    for cell, icon in cells.values():
+        x_offset = ICON_SIZE * (cell % columns)
+        y_offset = ICON_SIZE * (cell // columns)
+        positions.append(f'-{x_offset}px -{y_offset}px')
+        atlas.paste(icon, (x_offset + math.floor((ICON_SIZE-icon.size[0])/2), y_offset + math.floor((ICON_SIZE-icon.size[1])/2)))
+    return atlas, {icon_name: positions[cell] for icon_name, cell in icon_cells.items()}
+
+
+def load_icon(image_file: Path) -> Image.Image:
+    # images bigger than a cell are scaled down keeping their aspect ratio, animated images keep their first frame
+    with Image.open(image_file) as image:
+        image.draft('RGB', (ICON_SIZE, ICON_SIZE))
+        icon = image.convert('RGBA')
+    if icon.width > ICON_SIZE or icon.height > ICON_SIZE:
+        icon.thumbnail((ICON_SIZE, ICON_SIZE), Image.Resampling.LANCZOS)
+    return icon
+
+
+def load_icon_batch(image_files: List[Path]) -> List[Optional[Image.Image]]:
+    icons = list()
+    for image_file in image_files:
+        try:
+            icons.append(load_icon(image_file))
+        except (OSError, ValueError, Image.DecompressionBombError) as error:
+            print(f'Skipping icon image {image_file}: {error}')
+            icons.append(None)
+    return icons
+
+
+def load_icons(image_files: Dict[str, Path], workers: int = 1, batch_size: int = DEFAULT_ICON_BATCH_SIZE) -> Dict[str, Image.Image]:
+    # every file is decoded once however many icons use it, the decoders release the GIL so the batches are decoded in parallel threads
+    files = sorted(set(image_files.values()))
+    batches = [files[start:start + batch_size] for start in range(0, len(files), batch_size)]
+    decoded = dict()
+    with ThreadPoolExecutor(max(1, workers)) as executor:
+        for batch, icons in zip(batches, executor.map(load_icon_batch, batches)):
+            decoded.update(zip(batch, icons))
+    return {icon_name: decoded[image_file] for icon_name, image_file in image_files.items() if decoded[image_file] is not None}
+
+
+def atlas_file_name(atlas_format: str, scale: float) -> str:
+    return f'icons.{atlas_format}' if scale == 1 else f'icons@{scale:g}x.{atlas_format}'
+
+
+def encode_atlas(atlas: Image.Image, atlas_format: str, size_budget: Optional[int] = None) -> bytes:
+    # lossless encodings first, lossy ones only when the lossless atlas is over the size budget
+    encodings = list()
+    if atlas_format == 'png':
+        encodings.append(lambda: save_atlas(atlas, ATLAS_FORMATS[atlas_format], optimize=True))
+        encodings.append(lambda: save_atlas(atlas.quantize(256, Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE), ATLAS_FORMATS[atlas_format], optimize=True))
+    elif atlas_format == 'webp':
+        encodings.append(lambda: save_atlas(atlas, ATLAS_FORMATS[atlas_format], lossless=True, quality=100, method=6))
+        encodings.extend(lambda quality=quality: save_atlas(atlas, ATLAS_FORMATS[atlas_format], quality=quality, method=6) for quality in WEBP_QUALITIES)
+    else:
+        raise ValueError(f'Unsupported atlas format: {atlas_format}')
+    smallest = None
+    for encoding in encodings:
+        encoded = encoding()
+        if size_budget is None or len(encoded) <= size_budget:
+            return encoded
+        if smallest is None or len(encoded) < len(smallest):
+            smallest = encoded
+    print(f'Icon atlas ({atlas_format}, {atlas.width}x{atlas.height}px) does not fit into {size_budget} bytes, the smallest encoding has {len(smallest)} bytes')
+    return smallest
+
+
+def save_atlas(atlas: Image.Image, image_format: str, **params) -> bytes:
+    atlas_content = BytesIO()
+    atlas.save(atlas_content, format=image_format, **params)
+    return atlas_content.getvalue()
+
+
+def scale_atlas(atlas: Image.Image, scale: float) -> Image.Image:
+    # every cell is scaled on its own, so the filter never mixes pixels of neighbouring icons and all cells keep the same whole size
+    if scale == 1:
+        return atlas
+    columns = atlas.width // ICON_SIZE
+    rows = atlas.height // ICON_SIZE
+    if not columns or not rows:
+        return atlas.resize((max(1, round(atlas.width * scale)), max(1, round(atlas.height * scale))), Image.Resampling.LANCZOS)
+    cell_size = max(1, round(ICON_SIZE * scale))
+    scaled = Image.new(atlas.mode, (columns * cell_size, rows * cell_size))
+    for row in range(rows):
+        for column in range(columns):
+            cell = atlas.crop((column * ICON_SIZE, row * ICON_SIZE, (column + 1) * ICON_SIZE, (row + 1) * ICON_SIZE))
+            if cell.getbbox() is not None:
+                scaled.paste(cell.resize((cell_size, cell_size), Image.Resampling.LANCZOS), (column * cell_size, row * cell_size))
+    return scaled
+
+
+def encode_atlases(atlas: Image.Image, atlas_formats: Sequence[str] = DEFAULT_ATLAS_FORMATS, scales: Sequence[float] = DEFAULT_ATLAS_SCALES, size_budget: Optional[int] = None, workers: int = 1) -> Dict[str, bytes]:
+    # the encoders release the GIL, so all scales and formats are encoded in parallel threads
+    for atlas_format in atlas_formats:
+        if atlas_format not in ATLAS_FORMATS:
+            raise ValueError(f'Unsupported atlas format: {atlas_format}')
+    encoded_atlases = [(atlas_file_name(atlas_format, scale), atlas_format, scale) for scale in scales for atlas_format in atlas_formats]
+    with ThreadPoolExecutor(max(1, workers)) as executor:
+        scaled_atlases = dict(zip(scales, executor.map(partial(scale_atlas, atlas), scales)))
+        encoded = executor.map(lambda encoded_atlas: encode_atlas(scaled_atlases[encoded_atlas[2]], encoded_atlas[1], size_budget), encoded_atlases)
+        return {file_name: content for (file_name, _, _), content in zip(encoded_atlases, encoded)}
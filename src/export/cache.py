@@ -0,0 +1,132 @@
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+import hashlib
+import pickle
+
+
+CACHE_VERSION = 2
+
+T = TypeVar('T')
+
+
+def source_files(sources: List[Path]) -> List[Path]:
+    files = list()
+    for source in sources:
+        if source.is_dir():
+            files.extend(sorted(file for file in source.rglob('*') if file.is_file()))
+        else:
+            files.append(source)
+    return files
+
+
+def file_stamp(file: Path) -> Tuple[str, int, int]:
+    file_stat = file.stat()
+    return (file.as_posix(), file_stat.st_size, file_stat.st_mtime_ns)
+
+
+def content_hash(files: List[Path]) -> str:
+    files_hash = hashlib.sha256()
+    for file in files:
+        with file.open('rb') as content:
+            for chunk in iter(lambda: content.read(1 << 20), b''):
+                files_hash.update(chunk)
+    return files_hash.hexdigest()
+
+
+class ExportCache:
+
+    def __init__(self, cache_dir: Path, enabled: bool = True) -> None:
+        self.__cache_dir = cache_dir
+        self.__enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        # entries looked up or stored by this cache, the other entries are left by previous exports
+        self.__used = set()
+
+    def __entry_file(self, kind: str, sources: List[Path]) -> Path:
+        sources_key = hashlib.sha1('\n'.join(source.resolve().as_posix() for source in sources).encode()).hexdigest()
+        entry_file = self.__cache_dir / f'{kind}-{sources_key}.pickle'
+        self.__used.add(entry_file)
+        return entry_file
+
+    def lookup(self, kind: str, sources: List[Path], hash_contents: bool = True) -> Tuple[bool, Any]:
+        if not self.__enabled:
+            return False, None
+        entry_file = self.__entry_file(kind, sources)
+        files = source_files(sources)
+        stamps = [file_stamp(file) for file in files]
+        entry = self.__read_entry(entry_file)
+        if entry is not None and entry['stamps'] == stamps:
+            self.hits += 1
+            return True, entry['value']
+        # touched but unchanged files (same size, same content) are still cache hits
+        if entry is not None and hash_contents and [stamp[:2] for stamp in entry['stamps']] == [stamp[:2] for stamp in stamps]:
+            if entry['hash'] == content_hash(files):
+                self.hits += 1
+                entry['stamps'] = stamps
+                self.__write_entry(entry_file, entry)
+                return True, entry['value']
+        self.misses += 1
+        return False, None
+
+    def store(self, kind: str, sources: List[Path], value: Any, hash_contents: bool = True) -> None:
+        if not self.__enabled:
+            return
+        files = source_files(sources)
+        stamps = [file_stamp(file) for file in files]
+        self.__write_entry(self.__entry_file(kind, sources), {'version': CACHE_VERSION, 'stamps': stamps, 'hash': content_hash(files) if hash_contents else None, 'value': value})
+
+    def load(self, kind: str, sources: List[Path], loader: Callable[[], T], hash_contents: bool = True) -> T:
+        hit, value = self.lookup(kind, sources, hash_contents)
+        if not hit:
+            value = loader()
+            self.store(kind, sources, value, hash_contents)
+        return value
+
+    def load_all(self, kind: str, files: List[Path], reader: Callable[[Path], T], executor: Optional[Executor] = None) -> List[T]:
+        # files missing in the cache are read by the executor, results keep the order of the files
+        values = dict()
+        missing_files = dict()
+        for file in files:
+            if file in values or file in missing_files:
+                continue
+            hit, value = self.lookup(kind, [file])
+            if hit:
+                values[file] = value
+            else:
+                missing_files[file] = None
+        read_values = map(reader, missing_files) if executor is None else executor.map(reader, missing_files)
+        for file, value in zip(missing_files, read_values):
+            self.store(kind, [file], value)
+            values[file] = value
+        return [values[file] for file in files]
+
+    def prune(self, kind_prefix: str) -> int:
+        # entries of the kinds starting with the prefix this cache did not use are removed, a disabled cache keeps every entry
+        if not self.__enabled or not self.__cache_dir.is_dir():
+            return 0
+        removed = 0
+        for entry_file in self.__cache_dir.glob(f'{kind_prefix}*.pickle'):
+            if entry_file not in self.__used:
+                entry_file.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def __read_entry(entry_file: Path) -> Any:
+        if not entry_file.exists():
+            return None
+        try:
+            with entry_file.open('rb') as entry_content:
+                entry = pickle.load(entry_content)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        return entry if isinstance(entry, dict) and entry.get('version') == CACHE_VERSION else None
+
+    def __write_entry(self, entry_file: Path, entry: Dict) -> None:
+        self.__cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary_file = entry_file.with_suffix('.tmp')
+        with temporary_file.open('wb') as entry_content:
+            pickle.dump(entry, entry_content, pickle.HIGHEST_PROTOCOL)
+        temporary_file.replace(entry_file)
@@ -1,19 +1,54 @@
 from genericpath import isfile
 import json
+from analysis import RecipeGraph, RecipeGraphRegression, analyze, print_report, regressions
 from argparse import ArgumentParser
 from pathlib import Path
-from typing import Dict, List, Tuple, Union, Iterator, cast
-from assets import game_icons
+from typing import Any, Dict, List, Tuple, Union, Iterable, Iterator, Optional, Sequence
+from assets import DEFAULT_ASSET_INDEX, DEFAULT_TEXTURE_CACHE_SIZE, TextureCache, game_icons
+from atlas import ATLAS_FORMATS, DEFAULT_ATLAS_FORMATS, DEFAULT_ATLAS_SCALES, encode_atlases, load_icons
+from cache import ExportCache
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from images import IMAGE_MANIFEST, image_name_index, image_name_key
+from items import DEFAULT_ITEM_ALIASES, ItemIndex
+from model import Category, Item, Recipe
+from profiling import Profiler
+from watch import DEFAULT_WATCH_INTERVAL, FileStamp, FileWatcher, path_stamp
+from writer import OutputWriter
 import xml.etree.ElementTree as ET
+import hashlib
 import re
+import sys
+import time
+
+
+# costs (key, amount), crafted key, crafted amount
+CraftRecord = Tuple[List[Tuple[str, int]], Optional[str], int]
+
+# crafted key, crafted amount, optional ingredients, costs (key, amount)
+AutoCraftRecord = Tuple[Optional[str], int, bool, List[Tuple[Optional[str], int]]]
+
+# machine key, craft time, power use per second, recipes
+AutoCrafterRecord = Tuple[Optional[str], float, float, List[AutoCraftRecord]]
+
+# machine key, id, name, file name
+RecipeSetRecord = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+# output directory, game data, assets data, overlays
+ExportDataset = Tuple[Path, Path, Optional[Path], Sequence[Path]]
 
 
 class IdConverter:
 
     __WORD_PATTERN = re.compile(r'[A-Z]?[a-z]+|[A-Z]{2,}(?=[A-Z][a-z]|\d|\W|$)|\d+')
 
-    def __init__(self) -> None:
-        self.__counter = 0
+    def __init__(self, counter: int = 0) -> None:
+        self.__counter = counter
+
+    @property
+    def counter(self) -> int:
+        return self.__counter
 
     def create_object_id(self, object_key: Union[str, None]) -> str:
         if object_key:
@@ -21,242 +56,643 @@ class IdConverter:
         else:
             words = ['missing', 'id', str(self.__counter)]
             self.__counter += 1
-        return '-'.join(map(str.lower, words))
+        # ids are repeated in every item, recipe and category referencing them
+        return sys.intern('-'.join(map(str.lower, words)))
+
+
+def iterate_entries(xml_file: Path) -> Iterator[ET.Element]:
+    # yields every complete child of the root element and drops it once processed, so only one entry is kept in memory
+    entries = ET.iterparse(xml_file, events=('start', 'end'))
+    _, root = next(entries)
+    depth = 0
+    for event, element in entries:
+        if event == 'start':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                yield element
+                root.clear()
+
+
+def entry_fields(entry: ET.Element) -> Dict[str, str]:
+    # single pass equivalent of findtext for every direct child
+    fields = dict()
+    for child in entry:
+        if child.tag not in fields:
+            fields[child.tag] = child.text or ''
+    return fields
 
 
-def write(output_file: Path, factoriolab_json: Dict, debug: bool=False):
-    if debug:
-        print(f'Writing data to: {output_file.name}')
-        print(json.dumps(factoriolab_json, indent=4))
-    output_file.write_text(json.dumps(factoriolab_json))
+def child_entries(entry: ET.Element, group_tag: str, entry_tag: str) -> Iterator[ET.Element]:
+    # equivalent of findall(f'{group_tag}/{entry_tag}')
+    for group in entry:
+        if group.tag == group_tag:
+            for child in group:
+                if child.tag == entry_tag:
+                    yield child
 
 
-def extract_terrain(game_data: Path, id_converter: IdConverter) -> Iterator[Tuple[str, Dict, Dict]]:
-    for terrain in ET.parse(game_data / "TerrainData.xml").getroot():
-        category_name = terrain.findtext('Category', 'Terrain')
+def extract_terrain(game_data: Path, id_converter: IdConverter) -> Iterator[Tuple[str, Item, Category]]:
+    categories = dict()
+    for terrain in iterate_entries(game_data / "TerrainData.xml"):
+        terrain_fields = entry_fields(terrain)
+        category_name = terrain_fields.get('Category', 'Terrain')
         category_id = id_converter.create_object_id(category_name)
-        category = {
-            "id": category_id,
-            "name": category_name
-        }
-        for variant in terrain.findall("Values/ValueEntry"):
-            key = variant.findtext('Key')
+        category = categories.setdefault((category_id, category_name), Category(category_id, category_name))
+        stack = int(terrain_fields.get('MaxStack', 200))
+        for variant in child_entries(terrain, "Values", "ValueEntry"):
+            variant_fields = entry_fields(variant)
+            key = variant_fields.get('Key')
             object_id = id_converter.create_object_id(key)
-            object = {
-                "category": category_id,
-                "id": object_id,
-                "name": variant.findtext('Name'),
-                "row": 0,
-                "stack": int(terrain.findtext('MaxStack', default=200))
-            }
+            object = Item(object_id, variant_fields.get('Name'), category_id, 0, stack)
             yield key.lower() if key else object_id, object, category
         else:
-            key = terrain.findtext('Key')
+            key = terrain_fields.get('Key')
             object_id = id_converter.create_object_id(key)
-            object = {
-                "category": category_id,
-                "id": object_id,
-                "name": terrain.findtext('Name'),
-                "row": 0,
-                "stack": int(terrain.findtext('MaxStack', default=200))
-            }
+            object = Item(object_id, terrain_fields.get('Name'), category_id, 0, stack)
             yield key.lower() if key else object_id, object, category
 
 
-def extract_items(game_data: Path, id_converter: IdConverter) -> Iterator[Tuple[str, Dict, Dict]]:
-    for item_entry in ET.parse(game_data / 'Items.xml').getroot():
-        category_name = item_entry.findtext('Category')
+def extract_items(game_data: Path, id_converter: IdConverter) -> Iterator[Tuple[str, Item, Category]]:
+    categories = dict()
+    for item_entry in iterate_entries(game_data / 'Items.xml'):
+        item_fields = entry_fields(item_entry)
+        category_name = item_fields.get('Category')
         category_id = id_converter.create_object_id(category_name)
-        category = {
-            "id": category_id,
-            "name": category_name
-        }
-        key = item_entry.findtext('Key')
+        category = categories.setdefault((category_id, category_name), Category(category_id, category_name))
+        key = item_fields.get('Key')
         object_id = id_converter.create_object_id(key)
-        object = {
-            "category": category_id,
-            "id": object_id,
-            "name": item_entry.findtext('Name'),
-            "row": 1,
-            "stack": 200 if item_entry.findtext('Type') == "ItemStack" else 1
-        }
+        object = Item(object_id, item_fields.get('Name'), category_id, 1, 200 if item_fields.get('Type') == "ItemStack" else 1)
         yield key.lower() if key else object_id, object, category
-        object_key = item_entry.findtext('Object')
+        object_key = item_fields.get('Object')
         if object_key and object_key != key:
             yield object_key.lower() if key else object_id, object, category
 
 
-def extract_recipes(receipe_set: Path, receipe_set_id: str, factory_id: str, machine_name: str, all_items: Dict) -> Iterator[Tuple[Dict, List]]:
-    for craft in ET.parse(receipe_set).getroot():
+def read_recipe_sets(receipe_sets: Path) -> List[RecipeSetRecord]:
+    receipe_set_records = list()
+    for receipe_set in iterate_entries(receipe_sets):
+        receipe_set_fields = entry_fields(receipe_set)
+        receipe_set_records.append((receipe_set_fields.get("MachineKey"), receipe_set_fields.get("Id"), receipe_set_fields.get("Name"), receipe_set_fields.get("FileName")))
+    return receipe_set_records
+
+
+def read_recipes(receipe_set: Path) -> List[CraftRecord]:
+    crafts = list()
+    for craft in iterate_entries(receipe_set):
+        costs = list()
+        for cost in child_entries(craft, "Costs", "CraftCost"):
+            cost_fields = entry_fields(cost)
+            if cost_fields.get("Key"):
+                costs.append((cost_fields["Key"], int(cost_fields.get("Amount", 0))))
+        craft_fields = entry_fields(craft)
+        crafts.append((costs, craft_fields.get("CraftedKey"), int(craft_fields.get("CraftedAmount", 0))))
+    return crafts
+
+
+def read_auto_recipe(craft: ET.Element) -> AutoCraftRecord:
+    costs = list()
+    for cost in child_entries(craft, "Costs", "CraftCost"):
+        cost_fields = entry_fields(cost)
+        costs.append((cost_fields.get("Key", cost_fields.get("Name")), int(cost_fields.get("Amount", 0))))
+    craft_fields = entry_fields(craft)
+    optional_ingredients = craft_fields.get("OptionalIngredients", "false").lower() == "true"
+    return craft_fields.get("CraftedKey", craft_fields.get("Key")), int(craft_fields.get("CraftedAmount", 0)), optional_ingredients, costs
+
+
+def read_auto_recipes(receipe: Path) -> AutoCrafterRecord:
+    auto_craft_fields = dict()
+    crafts = list()
+    for entry in iterate_entries(receipe):
+        if entry.tag == "Recipe":
+            crafts.append(read_auto_recipe(entry))
+        elif entry.tag not in auto_craft_fields:
+            auto_craft_fields[entry.tag] = entry.text or ''
+    return auto_craft_fields.get("Value"), float(auto_craft_fields.get("CraftTime", 0)), float(auto_craft_fields.get("PowerUsePerSecond", 0)), crafts
+
+
+def extract_recipes(receipe_set: Path, receipe_set_id: str, factory_id: str, machine_name: str, item_index: ItemIndex) -> Iterator[Tuple[Recipe, List[Item]]]:
+    return resolve_recipes(receipe_set, read_recipes(receipe_set), receipe_set_id, factory_id, machine_name, item_index)
+
+
+def resolve_recipes(receipe_set: Path, crafts: List[CraftRecord], receipe_set_id: str, factory_id: str, machine_name: str, item_index: ItemIndex) -> Iterator[Tuple[Recipe, List[Item]]]:
+    for costs, key, crafted_amount in crafts:
         used_items = list()
         craft_cost = dict()
-        for cost in craft.findall("Costs/CraftCost"):
-            key = cost.findtext("Key")
-            if key:
-                object = all_items[key.lower()]
-                used_items.append(object)
-                craft_cost[object["id"]] = int(cost.findtext("Amount", default=0))
-        key = craft.findtext("CraftedKey")
-        if key:
-            object = all_items[key.lower()]
+        for cost_key, amount in costs:
+            object = item_index.resolve(cost_key, receipe_set.name)
+            if not object:
+                continue
             used_items.append(object)
-            receip = {
-                "id": f'{object["id"]}-{receipe_set_id}',
-                "name": f'{object["name"]} ({machine_name})',
-                "cost": 1000,
-                "time": 2,
-                "in": craft_cost,
-                "out": { object["id"]: int(craft.findtext("CraftedAmount", default=0)) },
-                "producers": [factory_id],
-                "row": 0,
-                "category": object["category"]
-            }
+            craft_cost[object.id] = amount
+        object = item_index.resolve(key, receipe_set.name) if key else None
+        if object:
+            used_items.append(object)
+            receip = Recipe(f'{object.id}-{receipe_set_id}', f'{object.name} ({machine_name})', 1000, 2, craft_cost, { object.id: crafted_amount }, factory_id, 0, object.category)
             yield receip, used_items
 
 
-def extract_auto_recipes(receipe: Path, all_items: Dict) -> Iterator[Tuple[Dict, Dict, List]]:
-    auto_craft = ET.parse(receipe).getroot()
-    factory_id = auto_craft.findtext("Value")
-    if factory_id:
-        factory = all_items[factory_id.lower()]
-        factory["factory"] = { "speed": 1, "type": "electric", "usage": 4000 }
-        for craft in auto_craft.findall("Recipe"):
-            key = craft.findtext("CraftedKey", default=craft.findtext("Key"))
+def extract_auto_recipes(receipe: Path, item_index: ItemIndex) -> Iterator[Tuple[Item, Recipe, List[Item]]]:
+    return resolve_auto_recipes(receipe, read_auto_recipes(receipe), item_index)
+
+
+def resolve_auto_recipes(receipe: Path, auto_crafter: AutoCrafterRecord, item_index: ItemIndex) -> Iterator[Tuple[Item, Recipe, List[Item]]]:
+    factory_id, craft_time, power_use, crafts = auto_crafter
+    factory = item_index.resolve(factory_id, receipe.name) if factory_id else None
+    if factory:
+        for key, crafted_amount, optional_ingredients, ingredients in crafts:
             if key:
-                crafted_object = all_items.get(key.lower().replace(" ", ""))
+                crafted_object = item_index.resolve(key, receipe.name)
                 if not crafted_object:
-                    print(f'Missing crafted item: {receipe} = {key}')
                     continue
                 costs = dict()
                 used_items = [factory, crafted_object]
-                for cost in craft.findall("Costs/CraftCost"):
-                    key = cost.findtext("Key", default=cost.findtext("Name"))
+                for key, amount in ingredients:
                     if key:
-                        object = all_items.get(key.lower().replace(" ", "").replace("-", ""))
+                        object = item_index.resolve(key, receipe.name)
                         if not object:
-                            print(f'Missing ingridient for: {receipe} = {key}')
                             continue
                         used_items.append(object)
-                        costs[object["id"]] = int(cost.findtext("Amount", default=0))
+                        costs[object.id] = amount
                     else:
                         print(f'Missing ingridient for: {receipe}')
-                craft_costs = [{cost: amount} for cost, amount in costs.items()] if craft.findtext("OptionalIngredients", default="false").lower() == "true" else [costs]
-                craft_time = float(auto_craft.findtext("CraftTime", default=0))
-                craft_energy_cost = craft_time * float(auto_craft.findtext("PowerUsePerSecond", default=0))
-                crafted_amount = int(craft.findtext("CraftedAmount", default=0))
+                craft_costs = [{cost: amount} for cost, amount in costs.items()] if optional_ingredients else [costs]
+                craft_energy_cost = craft_time * power_use
                 for receipe_cost in craft_costs:
                     if not receipe_cost:
                         print(f'Craft without ingridients: {receipe}')
                         continue
-                    receip = {
-                        "id": f'{crafted_object["id"]}-{factory["id"]}',
-                        "name": f'{crafted_object["name"]} ({factory["name"]})',
-                        "cost": craft_energy_cost,
-                        "time": craft_time,
-                        "in": receipe_cost,
-                        "out": { crafted_object["id"]: crafted_amount },
-                        "producers": [factory["id"]],
-                        "row": 0,
-                        "category": crafted_object["category"]
-                    }
+                    receip = Recipe(f'{crafted_object.id}-{factory.id}', f'{crafted_object.name} ({factory.name})', craft_energy_cost, craft_time, receipe_cost, { crafted_object.id: crafted_amount }, factory.id, 0, crafted_object.category)
                     yield factory, receip, used_items
 
 
+ICONS_CONFIGURATION = Path(__file__).parent / 'icons_fill.json'
+
+ANALYSIS_REPORT = 'analysis.json'
+
+# every atlas setting and set of wiki images has its own kind of icons cache entries
+ICONS_CACHE_KIND = 'icons'
+
+# BlockPreview cell of the missing icon, used when the icons configuration has none
+NO_ICON_CELL = (19, 15)
+
+
 def icons_configuration() -> Dict[str, Tuple[int, int]]:
-    icons_config_path = Path(__file__).parent / 'icons_fill.json'
-    with icons_config_path.open() as icons_config_file:
+    with ICONS_CONFIGURATION.open() as icons_config_file:
         icons_config_json = json.load(icons_config_file)
     return {icon_name: (position['row'], position['col']) for icon_name, position in icons_config_json['icons'].items()}
 
 
-def main():
-    # Parse command line arguments
-    parser = ArgumentParser()
-    parser.add_argument('game', nargs='?', default='~/.steam/root/steam/steamapps/common/FortressCraft/Default/Data/', help='The directory with the FortressCraft Evolved! game files')
-    args = parser.parse_args()
+def layer_file(layers: Sequence[Path], name: str) -> Path:
+    # overlays replace the files of the layers below them, missing files are reported against the base game data
+    for layer in reversed(layers):
+        if (layer / name).is_file():
+            return layer / name
+    return layers[0] / name
 
-    game_data = Path(args.game).expanduser()
 
-    id_converter = IdConverter()
+def layer_candidates(layers: Sequence[Path], name: str) -> List[Path]:
+    # a file created in any layer can replace the file used so far
+    return [layer / name for layer in layers]
 
-    categories = dict()
 
-    all_items = dict()
-    for key, terrain, category in extract_terrain(game_data, id_converter):
-        all_items[key] = terrain
-        categories[category["id"]] = category
-    for key, item, category in extract_items(game_data, id_converter):
-        all_items[key] = item
-        categories[category["id"]] = category
-
-    all_items["coal"] = all_items.get("coalore")
-    all_items["coalenrichment"] = all_items.get("enrichedcoal")
-    all_items["fuelcanisterkey"] = all_items.get("emptyfuelcanister")
-    all_items["chargedplasmahead"] = all_items.get("plasmacutterhead")
-
-    used_items = dict()
-    data_recipes = dict()
-    factories = dict()
-
-    for receipe_set in ET.parse(game_data / 'RecipeSets.xml').getroot():
-        factory_id = receipe_set.findtext("MachineKey")
-        if factory_id:
-            factory_id = factory_id.lower()
-            factory = all_items[factory_id]
-            factory["factory"] = { "speed": 1, "type": "electric", "usage": 4000 }
-            factories[factory["id"]] = factory
-            receipe_set_id = receipe_set.findtext("Id", factory["id"])
-            receipe_set_id = id_converter.create_object_id(receipe_set_id)
-            machine_name = cast(str, receipe_set.findtext("Name", factory["name"]))
-            receipe_file = receipe_set.findtext("FileName")
-            if receipe_file:
-                used_items[factory["id"]] = factory
-                receipe_file = game_data / receipe_file
-                if receipe_file.exists() and receipe_file.is_file():
-                    for receip, items in extract_recipes(receipe_file, receipe_set_id, factory["id"], machine_name, all_items):
-                        data_recipes[receip["id"]] = receip
-                        for object in items:
-                            used_items[object["id"]] = object
-
-    for auto_craft_receipe in (game_data / "GenericAutoCrafter").iterdir():
-        if auto_craft_receipe.is_file():
-            for factory, receip, items in extract_auto_recipes(auto_craft_receipe, all_items):
-                factories[factory["id"]] = factory
-                data_recipes[receip["id"]] = receip
-                for object in items:
-                    used_items[object["id"]] = object
-
-    icons_config = icons_configuration()
-    icons_image, icons_positions = game_icons(game_data.parent.parent / 'FC_Linux_Universal_Data', icons_config)
-    icons_image.save(Path(__file__).parent / 'icons.png')
-    factoriolab_icons = {item: {"row": 19, "col": 15} for item in categories}
-    factoriolab_icons.update({item["id"]: {"row": 19, "col": 15} for item in sorted(used_items.values(), key=lambda object: object["category"])})
+def layer_files(layers: Sequence[Path], directory: str) -> List[Path]:
+    files = dict()
+    for layer in layers:
+        if (layer / directory).is_dir():
+            files.update((file.name, file) for file in (layer / directory).iterdir() if file.is_file())
+    return [files[name] for name in sorted(files)]
+
+
+def read_items(game_data: Path, profiler: Optional[Profiler] = None, overlays: Sequence[Path] = ()) -> Tuple[List[Tuple[str, Item, Category]], int]:
+    profiler = Profiler(False) if profiler is None else profiler
+    layers = [game_data, *overlays]
+    id_converter = IdConverter()
+    with profiler.stage('terrain'):
+        items = list(extract_terrain(layer_file(layers, 'TerrainData.xml').parent, id_converter))
+    with profiler.stage('items'):
+        items.extend(extract_items(layer_file(layers, 'Items.xml').parent, id_converter))
+    return items, id_converter.counter
+
+
+def wiki_icon_files(used_items: Dict[str, Item], image_index: Dict[str, Path]) -> Dict[str, Path]:
+    # items are matched by their name, then by their id made of the words of the item key
+    icon_files = dict()
+    for item in used_items.values():
+        for item_name in (item.name, item.id):
+            image_file = image_index.get(image_name_key(item_name))
+            if image_file is not None:
+                icon_files[item.id] = image_file
+                break
+    return icon_files
+
+
+def render_icons(assets_data: Path, texture_cache: Optional[TextureCache] = None, atlas_formats: Sequence[str] = DEFAULT_ATLAS_FORMATS, atlas_scales: Sequence[float] = DEFAULT_ATLAS_SCALES, atlas_size_budget: Optional[int] = None, jobs: int = 1, profiler: Optional[Profiler] = None, icon_files: Optional[Dict[str, Path]] = None, asset_index: Path = DEFAULT_ASSET_INDEX) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+    profiler = Profiler(False) if profiler is None else profiler
+    icons = None
+    if icon_files:
+        with profiler.stage('decode'):
+            icons = load_icons(icon_files, jobs)
+    with profiler.stage('sprites'):
+        icons_image, icons_positions = game_icons(assets_data, icons_configuration(), index_file=asset_index, texture_cache=texture_cache, icons=icons)
+    with profiler.stage('encode'):
+        return encode_atlases(icons_image, atlas_formats, atlas_scales, atlas_size_budget, jobs), icons_positions
+
+
+def export(game_data: Path, output_dir: Path, cache: ExportCache, assets_data: Optional[Path] = None, jobs: int = 1, aliases: Dict[str, str] = DEFAULT_ITEM_ALIASES, texture_cache: Optional[TextureCache] = None, atlas_formats: Sequence[str] = DEFAULT_ATLAS_FORMATS, atlas_scales: Sequence[float] = DEFAULT_ATLAS_SCALES, atlas_size_budget: Optional[int] = None, compress: bool = True, profiler: Optional[Profiler] = None, overlays: Sequence[Path] = (), wiki_images: Optional[Path] = None) -> List[str]:
+    return ExportPipeline(cache, jobs, aliases, texture_cache, atlas_formats, atlas_scales, atlas_size_budget, compress, profiler, wiki_images=wiki_images).export(game_data, output_dir, assets_data, overlays)
+
+
+class ExportPipeline:
+
+    def __init__(self, cache: ExportCache, jobs: int = 1, aliases: Dict[str, str] = DEFAULT_ITEM_ALIASES, texture_cache: Optional[TextureCache] = None, atlas_formats: Sequence[str] = DEFAULT_ATLAS_FORMATS, atlas_scales: Sequence[float] = DEFAULT_ATLAS_SCALES, atlas_size_budget: Optional[int] = None, compress: bool = True, profiler: Optional[Profiler] = None, analysis: bool = False, analysis_baseline: Optional[Dict[str, Any]] = None, steady_states: Sequence[Tuple[str, float]] = (), wiki_images: Optional[Path] = None, asset_index: Path = DEFAULT_ASSET_INDEX) -> None:
+        self.__cache = cache
+        self.__jobs = jobs
+        self.__executor = None
+        self.__aliases = aliases
+        self.__texture_cache = texture_cache
+        self.__atlas_formats = atlas_formats
+        self.__atlas_scales = atlas_scales
+        self.__atlas_size_budget = atlas_size_budget
+        self.__compress = compress
+        self.__profiler = Profiler(False) if profiler is None else profiler
+        self.__analysis = analysis or analysis_baseline is not None or bool(steady_states)
+        self.__analysis_baseline = analysis_baseline
+        self.__steady_states = steady_states
+        self.__wiki_images = wiki_images
+        self.__asset_index = asset_index
+        self.__image_index = None
+        # parsed game files are kept for the following datasets, only the files an overlay replaces are parsed again
+        self.__items = dict()
+        self.__recipe_sets = dict()
+        self.__recipes = dict()
+        self.__auto_recipes = dict()
+        self.__icons = dict()
+        # game files and directories every output directory was exported from
+        self.__dependencies = dict()
+        # stamps of the game files taken before they were read, a file saved while it was exported differs from its stamp
+        self.__stamps: Dict[Path, FileStamp] = dict()
+
+    def items(self, game_data: Path, overlays: Sequence[Path] = ()) -> Tuple[List[Tuple[str, Item, Category]], int, Dict[str, Category], ItemIndex]:
+        layers = [game_data, *overlays]
+        sources = (layer_file(layers, 'TerrainData.xml'), layer_file(layers, 'Items.xml'))
+        if sources not in self.__items:
+            # the terrain and items stages are only recorded when the game files are parsed instead of loaded from the cache
+            items, id_counter = self.__cache.load('items', list(sources), partial(read_items, game_data, self.__profiler, overlays))
+            categories = dict()
+            for _, _, category in items:
+                categories[category.id] = category
+            self.__items[sources] = items, id_counter, categories, ItemIndex(items, self.__aliases)
+        return self.__items[sources]
+
+    def recipe_sets(self, recipe_sets_file: Path) -> List[RecipeSetRecord]:
+        if recipe_sets_file not in self.__recipe_sets:
+            self.__recipe_sets[recipe_sets_file] = self.__cache.load('recipe-sets', [recipe_sets_file], partial(read_recipe_sets, recipe_sets_file))
+        return self.__recipe_sets[recipe_sets_file]
+
+    @contextmanager
+    def workers(self) -> Iterator[None]:
+        # the processes parsing the recipe files are started once and reused by every export until the block ends
+        if self.__jobs <= 1 or self.__executor is not None:
+            yield
+            return
+        with ProcessPoolExecutor(self.__jobs) as executor:
+            self.__executor = executor
+            try:
+                yield
+            finally:
+                self.__executor = None
+
+    def __parse(self, receipe_files: List[Path], auto_craft_receipes: List[Path]) -> None:
+        # files are parsed independently of each other, the results are resolved against the items in the original order
+        missing_receipe_files = [receipe_file for receipe_file in receipe_files if receipe_file not in self.__recipes]
+        missing_auto_craft_receipes = [auto_craft_receipe for auto_craft_receipe in auto_craft_receipes if auto_craft_receipe not in self.__auto_recipes]
+        if not missing_receipe_files and not missing_auto_craft_receipes:
+            return
+        with self.workers():
+            with self.__profiler.stage('recipes'):
+                self.__recipes.update(zip(missing_receipe_files, self.__cache.load_all('recipes', missing_receipe_files, read_recipes, self.__executor)))
+            with self.__profiler.stage('autocrafters'):
+                self.__auto_recipes.update(zip(missing_auto_craft_receipes, self.__cache.load_all('auto-recipes', missing_auto_craft_receipes, read_auto_recipes, self.__executor)))
+
+    def invalidate(self, files: Iterable[Path]) -> None:
+        # changed files are parsed again by the next export, the other parsed files are kept
+        changed_files = set(files)
+        self.__items = {sources: items for sources, items in self.__items.items() if not changed_files.intersection(sources)}
+        for parsed_files in [self.__recipe_sets, self.__recipes, self.__auto_recipes]:
+            for changed_file in changed_files.intersection(parsed_files):
+                del parsed_files[changed_file]
+        if ICONS_CONFIGURATION in changed_files:
+            self.__icons.clear()
+        if self.__wiki_images is not None and self.__wiki_images / IMAGE_MANIFEST in changed_files:
+            self.__image_index = None
+        for changed_file in changed_files:
+            self.__stamps.pop(changed_file, None)
+
+    def analyze(self, used_items: Dict[str, Item], data_recipes: Dict[str, Recipe]) -> Dict[str, Any]:
+        analysis_report = analyze(used_items, data_recipes)
+        print_report(analysis_report)
+        if self.__steady_states:
+            recipe_graph = RecipeGraph(used_items, data_recipes)
+            analysis_report["steady_states"] = dict()
+            for item_id, rate in self.__steady_states:
+                try:
+                    analysis_report["steady_states"][item_id] = dict(recipe_graph.steady_state(item_id, rate), rate=rate)
+                except (KeyError, ValueError) as error:
+                    analysis_report["steady_states"][item_id] = {"rate": rate, "error": str(error.args[0])}
+                print_steady_state(item_id, analysis_report["steady_states"][item_id])
+        return analysis_report
+
+    def dependencies(self, output_dir: Path) -> List[Path]:
+        return self.__dependencies.get(output_dir, list())
+
+    def stamps(self, output_dir: Path) -> Dict[Path, FileStamp]:
+        return {dependency: self.__stamps[dependency] for dependency in self.dependencies(output_dir)}
+
+    def __stamp(self, files: Iterable[Path]) -> None:
+        # files parsed for a previous data set keep the stamp they were parsed with
+        for file in files:
+            if file not in self.__stamps:
+                self.__stamps[file] = path_stamp(file)
+
+    def image_index(self) -> Dict[str, Path]:
+        # the names of the downloaded wiki images are indexed once for all data sets
+        if self.__image_index is None:
+            self.__image_index = image_name_index(self.__wiki_images) if self.__wiki_images is not None else dict()
+        return self.__image_index
+
+    def icons(self, assets_data: Path, icon_files: Optional[Dict[str, Path]] = None) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+        icon_files = dict() if icon_files is None else icon_files
+        icons_key = (assets_data, tuple(sorted(icon_files.items())))
+        if icons_key not in self.__icons:
+            # the asset files are too big to be hashed, any change of their size or modification time invalidates the icons
+            icons_kind = f'{ICONS_CACHE_KIND}-{"-".join(self.__atlas_formats)}-{"-".join(f"{scale:g}" for scale in self.__atlas_scales)}-{self.__atlas_size_budget or 0}'
+            icons_sources = [assets_data, ICONS_CONFIGURATION]
+            if icon_files:
+                # the wiki images are content addressed, the items using them are part of the cache kind
+                icons_kind += '-' + hashlib.sha1('\n'.join(f'{icon_name}={image_file.as_posix()}' for icon_name, image_file in icons_key[1]).encode()).hexdigest()[:16]
+                icons_sources.extend(sorted(set(icon_files.values())))
+            self.__icons[icons_key] = self.__cache.load(icons_kind, icons_sources, partial(render_icons, assets_data, self.__texture_cache, self.__atlas_formats, self.__atlas_scales, self.__atlas_size_budget, self.__jobs, self.__profiler, icon_files, self.__asset_index), hash_contents=False)
+        return self.__icons[icons_key]
+
+    def prune_cache(self) -> int:
+        # icons rendered for settings or wiki images no data set uses anymore are removed from the cache
+        return self.__cache.prune(f'{ICONS_CACHE_KIND}-')
+
+    def export(self, game_data: Path, output_dir: Path, assets_data: Optional[Path] = None, overlays: Sequence[Path] = ()) -> List[str]:
+        assets_data = game_data.parent.parent / 'FC_Linux_Universal_Data' if assets_data is None else assets_data
+        profiler = self.__profiler
+        layers = [game_data, *overlays]
+        self.__stamp(candidate for game_file in ['TerrainData.xml', 'Items.xml', 'RecipeSets.xml'] for candidate in layer_candidates(layers, game_file))
+
+        with profiler.stage('game-items'):
+            _, id_counter, categories, item_index = self.items(game_data, overlays)
+            id_converter = IdConverter(id_counter)
+            item_index.clear_unresolved()
+
+        used_items = dict()
+        data_recipes = dict()
+        factories = dict()
+
+        with profiler.stage('recipe-sets'):
+            receipe_sets = self.recipe_sets(layer_file(layers, 'RecipeSets.xml'))
+        receipe_files = [layer_file(layers, receipe_file) for factory_id, _, _, receipe_file in receipe_sets if factory_id and receipe_file and layer_file(layers, receipe_file).is_file()]
+        auto_craft_receipes = layer_files(layers, 'GenericAutoCrafter')
+        dependencies = [ICONS_CONFIGURATION] + ([self.__wiki_images / IMAGE_MANIFEST] if self.__wiki_images is not None else []) + layer_candidates(layers, 'GenericAutoCrafter') + auto_craft_receipes
+        for game_file in ['TerrainData.xml', 'Items.xml', 'RecipeSets.xml'] + [receipe_file for factory_id, _, _, receipe_file in receipe_sets if factory_id and receipe_file]:
+            dependencies.extend(layer_candidates(layers, game_file))
+        self.__dependencies[output_dir] = list(dict.fromkeys(dependencies))
+        self.__stamp(self.__dependencies[output_dir])
+        # the CPU time of the worker processes is counted when they exit at the end of the parse stage
+        with profiler.stage('parse'):
+            self.__parse(receipe_files, auto_craft_receipes)
+
+        with profiler.stage('resolve'):
+            for factory_id, receipe_set_id, machine_name, receipe_file in receipe_sets:
+                if factory_id:
+                    factory = item_index.resolve(factory_id, 'RecipeSets.xml')
+                    if not factory:
+                        continue
+                    factories[factory.id] = factory
+                    receipe_set_id = factory.id if receipe_set_id is None else receipe_set_id
+                    receipe_set_id = id_converter.create_object_id(receipe_set_id)
+                    machine_name = factory.name if machine_name is None else machine_name
+                    if receipe_file:
+                        used_items[factory.id] = factory
+                        receipe_file = layer_file(layers, receipe_file)
+                        if receipe_file in self.__recipes:
+                            for receip, items in resolve_recipes(receipe_file, self.__recipes[receipe_file], receipe_set_id, factory.id, machine_name, item_index):
+                                data_recipes[receip.id] = receip
+                                for object in items:
+                                    used_items[object.id] = object
+
+            for auto_craft_receipe in auto_craft_receipes:
+                for factory, receip, items in resolve_auto_recipes(auto_craft_receipe, self.__auto_recipes[auto_craft_receipe], item_index):
+                    factories[factory.id] = factory
+                    data_recipes[receip.id] = receip
+                    for object in items:
+                        used_items[object.id] = object
+
+            item_index.report()
+
+        analysis_report = None
+        if self.__analysis:
+            with profiler.stage('analysis'):
+                analysis_report = self.analyze(used_items, data_recipes)
+            # nothing is written when the recipes got worse than the baseline
+            if self.__analysis_baseline is not None:
+                found = regressions(analysis_report, self.__analysis_baseline)
+                if found:
+                    raise RecipeGraphRegression(found)
+
+        with profiler.stage('icons'):
+            icon_files = None
+            if self.__wiki_images is not None:
+                with profiler.stage('match'):
+                    icon_files = wiki_icon_files(used_items, self.image_index())
+                print(f'Wiki images matched: {len(icon_files)} of {len(used_items)} items')
+            icons_atlases, icons_positions = self.icons(assets_data, icon_files)
+
+        # all outputs are replaced together once every one of them is written, unchanged files are not touched
+        with profiler.stage('write'):
+            output_writer = OutputWriter(output_dir, self.__compress)
+            try:
+                write_outputs(output_writer, icons_atlases, icons_positions, icons_configuration(), categories, used_items, data_recipes, factories, profiler, icon_files or dict())
+                if analysis_report is not None:
+                    with profiler.stage(ANALYSIS_REPORT):
+                        output_writer.write_bytes(ANALYSIS_REPORT, json.dumps(analysis_report, indent=4).encode())
+            except BaseException:
+                output_writer.discard()
+                raise
+            with profiler.stage('commit'):
+                return output_writer.commit()
+
+
+def print_steady_state(item_id: str, steady_state: Dict[str, Any]) -> None:
+    if "error" in steady_state:
+        print(f'Steady state of {item_id}: {steady_state["error"]}')
+        return
+    print(f'Steady state of {item_id} at {steady_state["rate"]:g}/s:')
+    for recipe_id, machines in steady_state["machines"].items():
+        print(f'  {machines:10.3f} x {recipe_id}')
+    for input_id, rate in steady_state["inputs"].items():
+        print(f'  {rate:10.3f}/s {input_id}')
+
+
+def update_exports(pipeline: ExportPipeline, datasets: List[ExportDataset], watcher: FileWatcher) -> Dict[Path, List[str]]:
+    # only the data sets exported from a changed file are exported again, from the files parsed before except the changed ones
+    changed_files = watcher.changed()
+    if not changed_files:
+        return dict()
+    pipeline.invalidate(changed_files)
+    written = dict()
+    for output_dir, game_data, assets_data, overlays in datasets:
+        if not set(changed_files).intersection(pipeline.dependencies(output_dir)):
+            continue
+        try:
+            written[output_dir] = pipeline.export(game_data, output_dir, assets_data, overlays)
+        except (ET.ParseError, ValueError, OSError) as error:
+            # a file saved halfway is exported once it is complete, the previous outputs are kept until then, as are the outputs of regressed recipes
+            print(f'Export to {output_dir} failed: {error}')
+            continue
+        watcher.track(pipeline.dependencies(output_dir), pipeline.stamps(output_dir))
+    return written
+
+
+def watch_exports(pipeline: ExportPipeline, datasets: List[ExportDataset], interval: float = DEFAULT_WATCH_INTERVAL) -> None:
+    # the files start from the stamps taken before they were exported, files saved during the first exports are exported again
+    watcher = FileWatcher()
+    for output_dir, _, _, _ in datasets:
+        watcher.track(pipeline.dependencies(output_dir), pipeline.stamps(output_dir))
+    print(f'Watching {len(watcher)} game files for changes, press Ctrl+C to stop')
+    try:
+        with pipeline.workers():
+            while True:
+                time.sleep(interval)
+                started = time.perf_counter()
+                written = update_exports(pipeline, datasets, watcher)
+                for output_dir, output_files in written.items():
+                    print(f'Updated {output_dir} in {(time.perf_counter() - started) * 1000:.0f}ms: {", ".join(output_files) or "no output changed"}')
+    except KeyboardInterrupt:
+        pass
+
+
+def write_outputs(output_writer: OutputWriter, icons_atlases: Dict[str, bytes], icons_positions: Dict[str, str], icons_config: Dict[str, Tuple[int, int]], categories: Dict[str, Category], used_items: Dict[str, Item], data_recipes: Dict[str, Recipe], factories: Dict[str, Item], profiler: Optional[Profiler] = None, wiki_icons: Iterable[str] = ()):
+    profiler = Profiler(False) if profiler is None else profiler
+    for atlas_file, atlas_content in icons_atlases.items():
+        with profiler.stage(atlas_file):
+            output_writer.write_bytes(atlas_file, atlas_content)
+    # icons.json holds the BlockPreview cells of the icons configuration, items drawn from a wiki image have no such cell and are only positioned by data.json
+    wiki_icons = set(wiki_icons)
+    no_icon_cell = icons_config.get("no-icon", NO_ICON_CELL)
+    factoriolab_icons = {item: icons_config.get(item, no_icon_cell) for item in categories}
+    factoriolab_icons.update({item.id: icons_config.get(item.id, no_icon_cell) for item in sorted(used_items.values(), key=lambda object: object.category) if item.id not in wiki_icons})
     factoriolab_icons = {
         "no-icon": {
-            "row": 19,
-            "col": 15
+            "row": no_icon_cell[0],
+            "col": no_icon_cell[1]
         },
-        "icons": factoriolab_icons
+        "icons": {icon_name: {"row": row, "col": col} for icon_name, (row, col) in factoriolab_icons.items()}
     }
-    write(Path(__file__).parent / 'icons.json', factoriolab_icons, False)
+    with profiler.stage('icons.json'):
+        output_writer.write_json('icons.json', factoriolab_icons)
 
     no_icon_position = icons_positions.get("no-icon")
+    # items and recipes are converted to the FactorioLab schema one by one while the document is written
     factoriolab_data = {
         "version": { "FortressCraft Evolved": "0.1" },
-        "categories": list(categories.values()),
+        "categories": [category.to_json() for category in categories.values()],
         "icons": [{"id": item, "position": icons_positions.get(item, no_icon_position)} for item in categories] + [{"id": item, "position": icons_positions.get(item, no_icon_position)} for item in used_items.keys()],
-        "items": list(used_items.values()),
-        "recipes": list(data_recipes.values())
+        "items": (item.to_json(item.id in factories) for item in used_items.values()),
+        "recipes": (receip.to_json() for receip in data_recipes.values())
     }
-    write(Path(__file__).parent / 'data.json', factoriolab_data, False)
+    with profiler.stage('data.json'):
+        output_writer.write_json('data.json', factoriolab_data)
 
     factoriolab_hash = {
         "items": list(used_items.keys()),
         "factories": list(factories.keys()),
         "recipes": list(data_recipes.keys())
     }
-    write(Path(__file__).parent / 'hash.json', factoriolab_hash, False)
+    with profiler.stage('hash.json'):
+        output_writer.write_json('hash.json', factoriolab_hash)
+
+
+def main():
+    # Parse command line arguments
+    parser = ArgumentParser()
+    parser.add_argument('game', nargs='?', default='~/.steam/root/steam/steamapps/common/FortressCraft/Default/Data/', help='The directory with the FortressCraft Evolved! game files')
+    parser.add_argument('--output', type=Path, default=Path(__file__).parent, help='The directory the FactorioLab data set is written to')
+    parser.add_argument('--overlay', action='append', default=[], metavar='NAME=DIR', help='Also export the game files with the files in DIR replacing the game files into the NAME subdirectory of the output, repeat a NAME to stack several directories')
+    parser.add_argument('--cache', type=Path, default=Path(__file__).parent / '.cache', help='The directory with parsed game files from previous exports')
+    parser.add_argument('--no-cache', action='store_true', help='Parse all game files even if they did not change since the last export')
+    parser.add_argument('--jobs', type=int, default=1, help='The number of processes parsing recipe files and threads decoding and encoding icons in parallel')
+    parser.add_argument('--texture-cache-size', type=int, default=DEFAULT_TEXTURE_CACHE_SIZE >> 20, help='The maximum size of decoded game textures kept in the cache directory in MiB')
+    parser.add_argument('--icons-format', action='append', choices=sorted(ATLAS_FORMATS), help='Formats of the icon sprite sheet, PNG by default')
+    parser.add_argument('--icons-scale', action='append', type=float, help='Additional resolutions of the icon sprite sheet relative to the 64px icons')
+    parser.add_argument('--icons-budget', type=int, help='The maximum size of every icon sprite sheet in KiB, lossy encoding is used if the lossless one is bigger')
+    parser.add_argument('--wiki-images', type=Path, metavar='DIR', help='The directory wiki.py --download saved the wiki images to, items named like an image get it as their icon instead of the BlockPreview one')
+    parser.add_argument('--no-gzip', action='store_true', help='Do not write precompressed .gz copies of the JSON files')
+    parser.add_argument('--analysis', action='store_true', help='Check the exported recipes for items without recipes, unreachable recipes and cycles, and write the results to analysis.json')
+    parser.add_argument('--analysis-baseline', type=Path, metavar='FILE', help='Fail the export when the recipes have problems missing in this analysis.json of a previous export')
+    parser.add_argument('--steady-state', action='append', default=[], metavar='ITEM[=RATE]', help='Calculate the machines and inputs making RATE (1 by default) of item ITEM per second')
+    parser.add_argument('--watch', action='store_true', help='Keep running and export again whenever one of the exported game files changes')
+    parser.add_argument('--watch-interval', type=float, default=DEFAULT_WATCH_INTERVAL, help='The delay in seconds between checks of the game files for changes')
+    parser.add_argument('--profile', type=Path, metavar='FILE', help='Write the wall time, CPU time and peak memory of every export stage to this JSON file')
+    parser.add_argument('--alias', action='append', default=[], metavar='ALIAS=KEY', help='Resolve item key ALIAS used in recipe files as the item KEY')
+    args = parser.parse_args()
+
+    game_data = Path(args.game).expanduser()
+    aliases = dict(DEFAULT_ITEM_ALIASES)
+    for alias in args.alias:
+        alias_key, separator, item_key = alias.partition('=')
+        if not separator or not alias_key or not item_key:
+            parser.error(f'invalid alias: {alias}')
+        aliases[alias_key.strip().lower()] = item_key.strip()
+    steady_states = list()
+    for steady_state in args.steady_state:
+        item_id, separator, rate = steady_state.partition('=')
+        try:
+            steady_states.append((item_id.strip(), float(rate) if separator else 1.0))
+        except ValueError:
+            parser.error(f'invalid steady state: {steady_state}')
+    analysis_baseline = json.loads(args.analysis_baseline.expanduser().read_text()) if args.analysis_baseline else None
+    overlays = dict()
+    for overlay in args.overlay:
+        overlay_name, separator, overlay_dir = overlay.partition('=')
+        if not separator or not overlay_name or not overlay_dir or Path(overlay_name).name != overlay_name:
+            parser.error(f'invalid overlay: {overlay}')
+        overlays.setdefault(overlay_name, list()).append(Path(overlay_dir).expanduser())
+
+    texture_cache = None if args.no_cache else TextureCache(args.cache.expanduser() / 'textures', args.texture_cache_size << 20)
+
+    # a regression stops the export after the profile is written, which shows the stages up to it
+    failure = None
+    # peak memory is measured by tracing the Python allocations, which slows the export down
+    with Profiler(args.profile is not None) as profiler:
+        pipeline = ExportPipeline(ExportCache(args.cache.expanduser(), not args.no_cache), jobs=args.jobs, aliases=aliases, texture_cache=texture_cache, atlas_formats=args.icons_format or DEFAULT_ATLAS_FORMATS, atlas_scales=DEFAULT_ATLAS_SCALES + [scale for scale in args.icons_scale or [] if scale != 1], atlas_size_budget=args.icons_budget << 10 if args.icons_budget else None, compress=not args.no_gzip, profiler=profiler, analysis=args.analysis, analysis_baseline=analysis_baseline, steady_states=steady_states, wiki_images=args.wiki_images.expanduser() if args.wiki_images else None, asset_index=args.cache.expanduser() / 'assets.json')
+        # the vanilla game files, the item index and the icons are shared by all data sets
+        output_dir = args.output.expanduser()
+        datasets = [(output_dir, game_data, None, list())] + [(output_dir / overlay_name, game_data, None, overlay_dirs) for overlay_name, overlay_dirs in overlays.items()]
+        for dataset_output_dir, dataset_game_data, dataset_assets_data, dataset_overlays in datasets:
+            if dataset_overlays:
+                print(f'Exporting overlay: {dataset_output_dir.name}')
+            with profiler.stage(dataset_output_dir.name if dataset_overlays else 'vanilla') if overlays else nullcontext():
+                try:
+                    pipeline.export(dataset_game_data, dataset_output_dir, dataset_assets_data, dataset_overlays)
+                except RecipeGraphRegression as regression:
+                    failure = f'Export to {dataset_output_dir} failed, the recipes got worse than the analysis baseline:\n{regression}\n'
+                    break
+        if failure is None:
+            pipeline.prune_cache()
+            if args.watch:
+                watch_exports(pipeline, datasets, args.watch_interval)
+    if args.profile:
+        profiler.write(args.profile.expanduser())
+    if failure is not None:
+        parser.exit(1, failure)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
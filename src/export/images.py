@@ -0,0 +1,34 @@
+from pathlib import Path
+from typing import Dict
+from urllib.parse import unquote
+import json
+import re
+
+
+IMAGE_MANIFEST = 'manifest.json'
+
+# downloaded images Pillow can decode into icons
+ICON_IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+
+
+def image_name_key(name: str) -> str:
+    # "Iron_Gear.png", "Iron Gear" and "iron-gear" share the key "iron gear"
+    name = unquote(name)
+    suffix = Path(name).suffix
+    if suffix.lower() in ICON_IMAGE_SUFFIXES:
+        name = name[:-len(suffix)]
+    return ' '.join(re.findall(r'[0-9a-z]+', name.casefold()))
+
+
+def image_name_index(images_dir: Path) -> Dict[str, Path]:
+    # every name of a downloaded image leads to its file, a name shared by several images keeps the image with the first URL
+    manifest_file = images_dir / IMAGE_MANIFEST
+    manifest = json.loads(manifest_file.read_text()) if manifest_file.exists() else dict()
+    index = dict()
+    for _, image in sorted(manifest.items()):
+        image_file = images_dir / image['file']
+        if image_file.suffix.lower() in ICON_IMAGE_SUFFIXES:
+            for image_name in image['names']:
+                index.setdefault(image_name_key(image_name), image_file)
+    index.pop('', None)
+    return index
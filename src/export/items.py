@@ -0,0 +1,76 @@
+from model import Category, Item
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+
+DEFAULT_ITEM_ALIASES = {
+    "coal": "coalore",
+    "coalenrichment": "enrichedcoal",
+    "fuelcanisterkey": "emptyfuelcanister",
+    "chargedplasmahead": "plasmacutterhead"
+}
+
+KEY_SEPARATOR_PATTERN = re.compile(r'[\s\-_]+')
+
+
+def normalize_key(key: str) -> str:
+    return KEY_SEPARATOR_PATTERN.sub('', key.lower())
+
+
+class ItemIndex:
+
+    def __init__(self, items: Iterable[Tuple[str, Item, Category]], aliases: Dict[str, str] = DEFAULT_ITEM_ALIASES) -> None:
+        # exact keys behave like a dictionary of all items (the last item with a key wins)
+        self.__keys = dict()
+        item_names = list()
+        for key, item, _ in items:
+            self.__keys[key] = item
+            item_names.append((item.name, item))
+        # normalized keys take precedence over normalized names, the first item with a name wins
+        self.__normalized = dict()
+        for name, item in item_names:
+            if name:
+                self.__normalized.setdefault(normalize_key(name), item)
+        for key, item in self.__keys.items():
+            self.__normalized[normalize_key(key)] = item
+        for alias, key in aliases.items():
+            item = self.get(key)
+            if item is not None:
+                self.__keys[alias.lower()] = item
+                self.__normalized[normalize_key(alias)] = item
+        self.__unresolved = dict()
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def keys(self) -> Iterable[str]:
+        return self.__keys.keys()
+
+    def get(self, key: str) -> Optional[Item]:
+        item = self.__keys.get(key.lower())
+        if item is None:
+            item = self.__normalized.get(normalize_key(key))
+        return item
+
+    def resolve(self, key: str, source: str) -> Optional[Item]:
+        item = self.get(key)
+        if item is None:
+            self.__unresolved.setdefault(key, set()).add(source)
+        return item
+
+    def clear_unresolved(self) -> None:
+        self.__unresolved.clear()
+
+    @property
+    def unresolved(self) -> Dict[str, List[str]]:
+        return {key: sorted(sources) for key, sources in sorted(self.__unresolved.items())}
+
+    def report(self) -> None:
+        unresolved = self.unresolved
+        if unresolved:
+            print(f'Unresolved item keys ({len(unresolved)}):')
+            for key, sources in unresolved.items():
+                print(f'  {key}: {", ".join(sources)}')
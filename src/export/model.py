@@ -0,0 +1,80 @@
+from array import array
+from typing import Dict, Union
+
+
+# energy costs and craft times are whole numbers in the recipe sets and decimals in the auto crafter files
+Number = Union[int, float]
+
+FACTORY = { "speed": 1, "type": "electric", "usage": 4000 }
+
+
+class Category:
+
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id: str, name: str) -> None:
+        self.id = id
+        self.name = name
+
+    def to_json(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name
+        }
+
+
+class Item:
+
+    __slots__ = ('id', 'name', 'category', 'row', 'stack')
+
+    def __init__(self, id: str, name: str, category: str, row: int, stack: int) -> None:
+        self.id = id
+        self.name = name
+        self.category = category
+        self.row = row
+        self.stack = stack
+
+    def to_json(self, factory: bool = False) -> Dict:
+        item = {
+            "category": self.category,
+            "id": self.id,
+            "name": self.name,
+            "row": self.row,
+            "stack": self.stack
+        }
+        if factory:
+            item["factory"] = dict(FACTORY)
+        return item
+
+
+class Recipe:
+
+    # ingredients and products are parallel sequences of item ids and amounts
+    __slots__ = ('id', 'name', 'cost', 'time', 'inputs', 'input_amounts', 'outputs', 'output_amounts', 'producer', 'row', 'category')
+
+    def __init__(self, id: str, name: str, cost: Number, time: Number, inputs: Dict[str, int], outputs: Dict[str, int], producer: str, row: int, category: str) -> None:
+        self.id = id
+        self.name = name
+        self.cost = cost
+        self.time = time
+        self.inputs = tuple(inputs)
+        self.input_amounts = array('q', inputs.values())
+        self.outputs = tuple(outputs)
+        self.output_amounts = array('q', outputs.values())
+        self.producer = producer
+        self.row = row
+        self.category = category
+
+    def to_json(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "cost": self.cost,
+            "time": self.time,
+            "in": dict(zip(self.inputs, self.input_amounts)),
+            "out": dict(zip(self.outputs, self.output_amounts)),
+            "producers": [self.producer],
+            "row": self.row,
+            "category": self.category
+        }
+
@@ -0,0 +1,176 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# upper bounds of the request latency histogram buckets in seconds, slower requests are counted in the last bucket
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+def cpu_time() -> float:
+    # worker processes are included once they are joined
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def max_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss << 10
+
+
+class Profiler:
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.__enabled = enabled
+        self.__started_tracing = False
+        self.__stages = dict()
+        # stage record, wall time, CPU time and traced memory peak of every running stage
+        self.__running = list()
+        self.__start = (0.0, 0.0)
+        self.__wall_time = 0.0
+        self.__cpu_time = 0.0
+        self.__peak_memory = 0
+
+    def __enter__(self) -> 'Profiler':
+        if self.__enabled:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.__started_tracing = True
+            tracemalloc.reset_peak()
+            self.__start = (time.perf_counter(), cpu_time())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.__enabled:
+            wall_start, cpu_start = self.__start
+            self.__wall_time = time.perf_counter() - wall_start
+            self.__cpu_time = cpu_time() - cpu_start
+            self.__peak_memory = max([tracemalloc.get_traced_memory()[1]] + [stage['peak_memory'] for stage in self.__stages.values()])
+            if self.__started_tracing:
+                tracemalloc.stop()
+                self.__started_tracing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.__enabled
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.__enabled:
+            yield
+            return
+        stages = self.__running[-1][0]['stages'] if self.__running else self.__stages
+        record = stages.setdefault(name, {'calls': 0, 'wall_time': 0.0, 'cpu_time': 0.0, 'peak_memory': 0, 'stages': dict()})
+        # the peak is reset for every stage, the parent stage keeps the peak reached before
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        if self.__running:
+            self.__running[-1][3] = max(self.__running[-1][3], peak_memory)
+        tracemalloc.reset_peak()
+        frame = [record, time.perf_counter(), cpu_time(), current_memory]
+        self.__running.append(frame)
+        try:
+            yield
+        finally:
+            self.__running.pop()
+            peak_memory = max(frame[3], tracemalloc.get_traced_memory()[1])
+            record['calls'] += 1
+            record['wall_time'] += time.perf_counter() - frame[1]
+            record['cpu_time'] += cpu_time() - frame[2]
+            record['peak_memory'] = max(record['peak_memory'], peak_memory)
+            if self.__running:
+                self.__running[-1][3] = max(self.__running[-1][3], peak_memory)
+
+    @staticmethod
+    def __stage_report(stages: Dict[str, Dict]) -> List[Dict[str, Any]]:
+        return [dict(record, name=name, stages=Profiler.__stage_report(record['stages'])) for name, record in stages.items()]
+
+    def report(self, **sections: Any) -> Dict[str, Any]:
+        report = {
+            "command": sys.argv,
+            "wall_time": self.__wall_time,
+            "cpu_time": self.__cpu_time,
+            "peak_memory": self.__peak_memory,
+            "max_rss": max_rss(),
+            "stages": self.__stage_report(self.__stages)
+        }
+        report.update(sections)
+        return report
+
+    def write(self, report_file: Path, **sections: Any) -> None:
+        report = self.report(**sections)
+        print(f'{"stage":<32} {"wall":>10} {"cpu":>10} {"peak memory":>12}')
+        self.__print_stages(report['stages'], '')
+        print(f'{"total":<32} {report["wall_time"]:9.3f}s {report["cpu_time"]:9.3f}s {report["peak_memory"] / (1 << 20):9.1f}MiB')
+        report_file.parent.mkdir(parents=True, exist_ok=True)
+        report_file.write_text(json.dumps(report, indent=4))
+        print(f'Profile written to: {report_file}')
+
+    @staticmethod
+    def __print_stages(stages: List[Dict[str, Any]], indent: str) -> None:
+        for stage in stages:
+            print(f'{indent + stage["name"]:<32} {stage["wall_time"]:9.3f}s {stage["cpu_time"]:9.3f}s {stage["peak_memory"] / (1 << 20):9.1f}MiB')
+            Profiler.__print_stages(stage['stages'], indent + '  ')
+
+
+class CrawlStats:
+
+    def __init__(self) -> None:
+        self.__lock = Lock()
+        self.__requests = 0
+        self.__failures = 0
+        self.__statuses = dict()
+        self.__bytes = 0
+        self.__latency = 0.0
+        self.__latencies = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.__first_request = None
+        self.__last_response = None
+
+    def record(self, started: float, size: int, status: Optional[int] = None) -> None:
+        # started is the time.perf_counter() value from before the request was sent, status is None for failed requests
+        finished = time.perf_counter()
+        latency = finished - started
+        with self.__lock:
+            self.__requests += 1
+            if status is None:
+                self.__failures += 1
+            else:
+                self.__statuses[str(status)] = self.__statuses.get(str(status), 0) + 1
+            self.__bytes += size
+            self.__latency += latency
+            self.__latencies[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self.__first_request = started if self.__first_request is None else min(self.__first_request, started)
+            self.__last_response = finished if self.__last_response is None else max(self.__last_response, finished)
+
+    @property
+    def requests(self) -> int:
+        return self.__requests
+
+    def report(self) -> Dict[str, Any]:
+        with self.__lock:
+            elapsed = self.__last_response - self.__first_request if self.__requests else 0.0
+            return {
+                "requests": self.__requests,
+                "failures": self.__failures,
+                "statuses": dict(sorted(self.__statuses.items())),
+                "bytes": self.__bytes,
+                "elapsed": elapsed,
+                "requests_per_second": self.__requests / elapsed if elapsed else 0.0,
+                "bytes_per_second": self.__bytes / elapsed if elapsed else 0.0,
+                "mean_latency": self.__latency / self.__requests if self.__requests else 0.0,
+                "latency_histogram": [{"le": bound, "count": count} for bound, count in zip(LATENCY_BUCKETS + [None], self.__latencies)]
+            }
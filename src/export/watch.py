@@ -0,0 +1,43 @@
+from cache import file_stamp
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+DEFAULT_WATCH_INTERVAL = 0.5
+
+FileStamp = Optional[Tuple[str, int, int]]
+
+
+def path_stamp(path: Path) -> FileStamp:
+    # missing files are watched too, creating them is a change
+    try:
+        return file_stamp(path)
+    except OSError:
+        return None
+
+
+class FileWatcher:
+
+    def __init__(self, files: Iterable[Path] = ()) -> None:
+        self.__stamps: Dict[Path, FileStamp] = dict()
+        self.track(files)
+
+    def __len__(self) -> int:
+        return len(self.__stamps)
+
+    def track(self, files: Iterable[Path], stamps: Optional[Dict[Path, FileStamp]] = None) -> None:
+        # files already watched keep their stamp, so a change made meanwhile is not missed
+        # given stamps were taken earlier, when the files were read, a change made since then is reported by the next poll
+        for file in files:
+            if file not in self.__stamps:
+                self.__stamps[file] = stamps[file] if stamps is not None and file in stamps else path_stamp(file)
+
+    def changed(self) -> List[Path]:
+        # polled with a stat call per file, nothing is read until a file changes
+        changed_files = list()
+        for file, stamp in self.__stamps.items():
+            current_stamp = path_stamp(file)
+            if current_stamp != stamp:
+                self.__stamps[file] = current_stamp
+                changed_files.append(file)
+        return changed_files
@@ -1,84 +1,540 @@
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from genericpath import isfile
+from html.parser import HTMLParser
+import gzip
+import hashlib
 import json
+import mmap
 import requests
 from argparse import ArgumentParser
 from bs4 import BeautifulSoup
+from images import IMAGE_MANIFEST
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Callable, Union
+from profiling import CrawlStats, Profiler
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from threading import Lock
+from typing import Dict, List, Set, Tuple, Callable, Union, Optional, Iterable, cast
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote, unquote
+import re
+import sqlite3
 import time
+import zlib
 
 DEFAULT_WIKI_URL = 'https://fortresscrafte.fandom.com/wiki/FortressCraft_Evolved_Wiki'
 
 DEFAULT_BASE_WIKI_IMAGE_DOMAIN = 'https://static.wikia.nocookie.net/fortresscrafte/images'
 
-def get_page(url: str, debug_dump_file: Union[Path, None] = None) -> BeautifulSoup:
-    if url.startswith('http'):
-        print(f'Getting content of page: "{url}"')
-        page_content = requests.get(url).text
-        if debug_dump_file is not None:
-            debug_dump_file.touch()
-            debug_dump_file.write_text(page_content)
-        time.sleep(0.1)
-    else:
-        page_file = Path(url)
-        if page_file.exists() and page_file.is_file():
-            page_content = page_file.read_text()
-        else:
+DEFAULT_ARTICLE_PATH = '/wiki/'
+
+DEFAULT_EXCLUDED_PATTERNS = [
+    'Template',
+    'Forum:',
+    'User:',
+    'Help:',
+    'Help_talk:',
+    'User_blog:',
+    'Message_Wall',
+    'Special:Log',
+    'Special:Search',
+    'Special:Contributions',
+    'action=',
+    'oldid=',
+    'diff='
+    ]
+
+DEFAULT_IGNORED_QUERY_PARAMETERS = ['so']
+
+# encoded characters that would split the path differently once decoded, "AC%2FDC" is one title and "AC/DC" two path segments
+ENCODED_PATH_DELIMITERS = re.compile('(%2[Ff]|%3[Ff]|%23)')
+
+DEFAULT_REQUEST_INTERVAL = 0.1
+
+DEFAULT_WORKERS = 1
+
+DEFAULT_CHECKPOINT_INTERVAL = 50
+
+# compressed bytes fed to the decompressor at once while the archive index is rebuilt
+ARCHIVE_CHUNK_SIZE = 1 << 16
+
+DEFAULT_DOWNLOAD_WORKERS = 8
+
+DEFAULT_DOWNLOAD_RETRIES = 3
+
+
+class WikiPage:
+
+    def __init__(self, base_urls: List[Optional[str]], link_urls: List[Optional[str]], images: List[Tuple[Optional[str], Optional[str]]]) -> None:
+        self.base_urls = base_urls
+        self.link_urls = link_urls
+        self.images = images
+
+
+class WikiPageParser(HTMLParser):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.__base_urls = list()
+        self.__link_urls = list()
+        self.__images = list()
+
+    @staticmethod
+    def __attributes(attrs: List[Tuple[str, Optional[str]]]) -> Dict[str, str]:
+        # same as BeautifulSoup: valueless attributes are empty strings and the last duplicate wins
+        return {name: '' if value is None else value for name, value in attrs}
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag == 'a':
+            self.__link_urls.append(self.__attributes(attrs).get('href'))
+        elif tag == 'img':
+            attributes = self.__attributes(attrs)
+            self.__images.append((attributes.get('src'), attributes.get('data-image-key')))
+        elif tag == 'base':
+            self.__base_urls.append(self.__attributes(attrs).get('href'))
+
+    def page(self) -> WikiPage:
+        return WikiPage(self.__base_urls, self.__link_urls, self.__images)
+
+
+Page = Union[BeautifulSoup, WikiPage]
+
+def parse_page(page_content: str) -> WikiPage:
+    parser = WikiPageParser()
+    parser.feed(page_content)
+    parser.close()
+    return parser.page()
+
+
+class HostRateLimiter:
+
+    def __init__(self, interval: float = DEFAULT_REQUEST_INTERVAL) -> None:
+        self.__interval = interval
+        self.__lock = Lock()
+        self.__next_request = dict()
+
+    def wait(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        with self.__lock:
+            now = time.monotonic()
+            request_time = max(now, self.__next_request.get(host, now))
+            self.__next_request[host] = request_time + self.__interval
+        if request_time > now:
+            time.sleep(request_time - now)
+
+
+def create_session(pool_size: int = DEFAULT_WORKERS, retries: int = 0) -> requests.Session:
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]) if retries > 0 else 0
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class PageArchive:
+
+    # every record is a separate gzip member of the archive, so records can be appended and decompressed on their own
+    def __init__(self, archive_file: Path) -> None:
+        self.__archive_file = archive_file
+        self.__index_file = archive_file.with_name(f'{archive_file.name}.idx')
+        self.__lock = Lock()
+        self.__index = dict()
+        self.__archive_file.touch()
+        if not self.__load_index():
+            self.__rebuild_index()
+        self.__archive = self.__archive_file.open('ab')
+        self.__mapped = None
+
+    def __load_index(self) -> bool:
+        if not self.__index_file.exists():
+            return False
+        archive_size = 0
+        for index_line in self.__index_file.read_text().splitlines():
+            record = json.loads(index_line)
+            self.__index[record['url']] = record
+            archive_size = max(archive_size, record['offset'] + record['length'])
+        return archive_size == self.__archive_file.stat().st_size
+
+    def __rebuild_index(self) -> None:
+        self.__index.clear()
+        archive_content = memoryview(self.__archive_file.read_bytes())
+        offset = 0
+        with self.__index_file.open('w') as index:
+            while offset < len(archive_content):
+                # every record is decompressed in chunks, so the rest of the archive is not copied for every record
+                decompressor = zlib.decompressobj(wbits=31)
+                header = b''
+                position = offset
+                try:
+                    while not decompressor.eof and position < len(archive_content):
+                        chunk = archive_content[position:position + ARCHIVE_CHUNK_SIZE]
+                        content = decompressor.decompress(chunk)
+                        if b'\n' not in header:
+                            header += content
+                        position += len(chunk)
+                except zlib.error:
+                    pass
+                if not decompressor.eof or b'\n' not in header:
+                    # a record cut short by an interrupted crawl is dropped with everything after it
+                    print(f'Dropping incomplete archive record at offset {offset}')
+                    with self.__archive_file.open('r+b') as archive:
+                        archive.truncate(offset)
+                    break
+                header = json.loads(header.split(b'\n', 1)[0])
+                length = position - offset - len(decompressor.unused_data)
+                record = {'url': header['url'], 'offset': offset, 'length': length, 'etag': header['etag'], 'last_modified': header['last_modified']}
+                self.__index[record['url']] = record
+                index.write(f'{json.dumps(record)}\n')
+                offset += length
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.__index
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def validators(self, url: str) -> Dict[str, str]:
+        record = self.__index.get(url)
+        headers = dict()
+        if record is not None and record['etag']:
+            headers['If-None-Match'] = record['etag']
+        if record is not None and record['last_modified']:
+            headers['If-Modified-Since'] = record['last_modified']
+        return headers
+
+    def record(self, url: str, page_content: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        header = json.dumps({'url': url, 'etag': etag, 'last_modified': last_modified, 'date': time.time()})
+        compressed = gzip.compress(f'{header}\n{page_content}'.encode())
+        with self.__lock:
+            self.__archive.seek(0, 2)
+            record = {'url': url, 'offset': self.__archive.tell(), 'length': len(compressed), 'etag': etag, 'last_modified': last_modified}
+            self.__archive.write(compressed)
+            self.__archive.flush()
+            with self.__index_file.open('a') as index:
+                index.write(f'{json.dumps(record)}\n')
+            self.__index[url] = record
+
+    def read(self, url: str) -> Optional[str]:
+        record = self.__index.get(url)
+        if record is None:
+            return None
+        end = record['offset'] + record['length']
+        # the record is copied before the lock is released, another reader may replace the map of a grown archive
+        with self.__lock:
+            if self.__mapped is None or len(self.__mapped) < end:
+                if self.__mapped is not None:
+                    self.__mapped.close()
+                with self.__archive_file.open('rb') as archive:
+                    self.__mapped = mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ)
+            compressed = self.__mapped[record['offset']:end]
+        return gzip.decompress(compressed).decode().split('\n', 1)[1]
+
+    def get_page(self, url: str, debug_dump_file: Union[Path, None] = None) -> Page:
+        page_content = self.read(url)
+        if page_content is None:
+            print(f'Page missing in archive: "{url}"')
             page_content = ''
-    return BeautifulSoup(page_content, 'html.parser')
+        return parse_page(page_content)
+
+    def close(self) -> None:
+        self.__archive.close()
+        if self.__mapped is not None:
+            self.__mapped.close()
+            self.__mapped = None
+
+
+class PageFetcher:
+
+    def __init__(self, session: Optional[requests.Session] = None, rate_limiter: Optional[HostRateLimiter] = None, archive: Optional[PageArchive] = None, stats: Optional[CrawlStats] = None) -> None:
+        self.__session = create_session() if session is None else session
+        self.__rate_limiter = HostRateLimiter() if rate_limiter is None else rate_limiter
+        self.__archive = archive
+        self.__stats = stats
+
+    def __get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        # the latency is measured after waiting for the rate limiter
+        started = time.perf_counter()
+        try:
+            response = self.__session.get(url, headers=headers)
+        except requests.RequestException:
+            if self.__stats is not None:
+                self.__stats.record(started, 0)
+            raise
+        if self.__stats is not None:
+            self.__stats.record(started, len(response.content), response.status_code)
+        return response
+
+    def __call__(self, url: str, debug_dump_file: Union[Path, None] = None) -> Page:
+        if url.startswith('http') and self.__archive is not None:
+            print(f'Getting content of page: "{url}"')
+            self.__rate_limiter.wait(url)
+            response = self.__get(url, self.__archive.validators(url))
+            if response.status_code == 304:
+                page_content = cast(str, self.__archive.read(url))
+            else:
+                page_content = response.text
+                # error pages must not replace the archived copy
+                if response.status_code == 200:
+                    self.__archive.record(url, page_content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        elif url.startswith('http'):
+            print(f'Getting content of page: "{url}"')
+            self.__rate_limiter.wait(url)
+            page_content = self.__get(url).text
+            if debug_dump_file is not None:
+                debug_dump_file.touch()
+                debug_dump_file.write_text(page_content)
+        else:
+            page_file = Path(url)
+            if page_file.exists() and page_file.is_file():
+                page_content = page_file.read_text()
+            else:
+                page_content = ''
+        return parse_page(page_content)
+
+
+_default_fetcher = PageFetcher()
+
+def get_page(url: str, debug_dump_file: Union[Path, None] = None) -> Page:
+    return _default_fetcher(url, debug_dump_file)
+
+def canonical_url(url: str, article_path: str = DEFAULT_ARTICLE_PATH, ignored_query_parameters: Iterable[str] = DEFAULT_IGNORED_QUERY_PARAMETERS) -> str:
+    scheme, netloc, path, query, _ = urlsplit(url)
+    path = ''.join(part.upper() if i % 2 else quote(unquote(part), safe="/:@!$&'()*+,;=~") for i, part in enumerate(ENCODED_PATH_DELIMITERS.split(path)))
+    if article_path and path.count('/') == 1 and len(path) > 1:
+        # wiki articles are reachable both from the root and from the article path
+        path = f'{article_path.rstrip("/")}{path}'
+    query_parameters = sorted((name, value) for name, value in parse_qsl(query, keep_blank_values=True) if name not in ignored_query_parameters)
+    return urlunsplit((scheme.lower(), netloc.lower(), path, urlencode(query_parameters, quote_via=quote), ''))
+
+
+class UrlFrontier:
 
-def scrap_images(url: str, base_image_domain: str = DEFAULT_BASE_WIKI_IMAGE_DOMAIN, base_wiki_domain: Union[str, None] = None, get_page: Callable[[str, Union[Path, None]], BeautifulSoup] = get_page) -> Dict[str, Set[str]]:
+    def __init__(self, base_wiki_domain: str, excluded_patterns: Iterable[str] = DEFAULT_EXCLUDED_PATTERNS, article_path: str = DEFAULT_ARTICLE_PATH, ignored_query_parameters: Iterable[str] = DEFAULT_IGNORED_QUERY_PARAMETERS) -> None:
+        self.__base_wiki_domain = canonical_url(base_wiki_domain, '', ignored_query_parameters)
+        excluded_patterns = list(excluded_patterns)
+        self.__excluded = re.compile('|'.join(map(re.escape, excluded_patterns))) if excluded_patterns else None
+        self.__article_path = article_path
+        self.__ignored_query_parameters = frozenset(ignored_query_parameters)
+        self.__queue = deque()
+        self.__queued = set()
+        self.__visited = set()
+
+    def __len__(self) -> int:
+        return len(self.__queue)
+
+    @property
+    def visited(self) -> Set[str]:
+        return self.__visited
+
+    def accepts(self, url: str) -> bool:
+        return url.startswith(self.__base_wiki_domain) and (self.__excluded is None or self.__excluded.search(url) is None)
+
+    def add(self, url: str) -> bool:
+        url = canonical_url(url, self.__article_path, self.__ignored_query_parameters)
+        if url in self.__queued or url in self.__visited or not self.accepts(url):
+            return False
+        self.__queue.append(url)
+        self.__queued.add(url)
+        return True
+
+    def extend(self, urls: Iterable[str]) -> List[str]:
+        added = list()
+        for url in urls:
+            if self.add(url):
+                added.append(self.__queue[-1])
+        return added
+
+    def pop(self) -> str:
+        url = self.__queue.popleft()
+        self.__queued.remove(url)
+        self.__visited.add(url)
+        return url
+
+    def restore(self, queued: Iterable[str], visited: Iterable[str]) -> None:
+        self.__visited.update(visited)
+        for url in queued:
+            if url not in self.__queued and url not in self.__visited:
+                self.__queue.append(url)
+                self.__queued.add(url)
+
+
+class CrawlCheckpoint:
+
+    # pages stay in the frontier table until they are fully processed, so pages being fetched during an interruption are fetched again
+    __SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS frontier (url TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS images (source TEXT, name TEXT, PRIMARY KEY (source, name));
+        CREATE TABLE IF NOT EXISTS debug_files (name TEXT, url TEXT PRIMARY KEY);
+    '''
+
+    def __init__(self, checkpoint_file: Path, resume: bool = False, interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> None:
+        if not resume and checkpoint_file.exists():
+            checkpoint_file.unlink()
+        checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(checkpoint_file)
+        self.__connection.executescript(self.__SCHEMA)
+        self.__interval = interval
+        self.__pending_pages = 0
+
+    def load(self) -> Tuple[List[str], Set[str], Dict[str, Set[str]], Dict[str, List[str]]]:
+        queued = [url for url, in self.__connection.execute('SELECT url FROM frontier ORDER BY rowid')]
+        visited = {url for url, in self.__connection.execute('SELECT url FROM visited')}
+        images = dict()
+        for image_source, image_name in self.__connection.execute('SELECT source, name FROM images'):
+            images.setdefault(image_source, set()).add(image_name)
+        debug_files = dict()
+        for debug_file_name, page_url in self.__connection.execute('SELECT name, url FROM debug_files ORDER BY rowid'):
+            debug_files.setdefault(debug_file_name, list()).append(page_url)
+        return queued, visited, images, debug_files
+
+    def queue(self, urls: Iterable[str]) -> None:
+        self.__connection.executemany('INSERT OR IGNORE INTO frontier (url) VALUES (?)', ((url,) for url in urls))
+
+    def debug_file(self, debug_file_name: str, page_url: str) -> None:
+        self.__connection.execute('INSERT OR IGNORE INTO debug_files (name, url) VALUES (?, ?)', (debug_file_name, page_url))
+
+    def page_done(self, page_url: str, queued: Iterable[str], images: Dict[str, Set[str]]) -> None:
+        self.__connection.execute('DELETE FROM frontier WHERE url = ?', (page_url,))
+        self.__connection.execute('INSERT OR IGNORE INTO visited (url) VALUES (?)', (page_url,))
+        self.queue(queued)
+        self.__connection.executemany('INSERT OR IGNORE INTO images (source, name) VALUES (?, ?)', ((image_source, image_name) for image_source, image_names in images.items() for image_name in image_names))
+        self.__pending_pages += 1
+        if self.__pending_pages >= self.__interval:
+            self.commit()
+
+    def commit(self) -> None:
+        self.__connection.commit()
+        self.__pending_pages = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.__connection.close()
+
+
+class BreadthFirstStrategy:
+
+    def seeds(self, url: str, base_wiki_domain: str) -> List[str]:
+        return [url]
+
+    def follow(self, page_url: str, links: Set[str], base_wiki_domain: str) -> Iterable[str]:
+        return links
+
+
+class AllPagesStrategy:
+
+    ENUMERATION_PAGES = ['Special:AllPages', 'Local_Sitemap']
+
+    def seeds(self, url: str, base_wiki_domain: str) -> List[str]:
+        return [f'{base_wiki_domain}/{enumeration_page}' for enumeration_page in self.ENUMERATION_PAGES]
+
+    def follow(self, page_url: str, links: Set[str], base_wiki_domain: str) -> Iterable[str]:
+        # only enumeration pages are followed: to their next pages and to the articles they list
+        if not self.is_enumeration_page(page_url, base_wiki_domain):
+            return []
+        followed_links = list()
+        for link in links:
+            link_url = canonical_url(link)
+            if self.is_enumeration_page(link_url, base_wiki_domain) or self.is_article_page(link_url, base_wiki_domain):
+                followed_links.append(link_url)
+        return followed_links
+
+    @staticmethod
+    def page_title(page_url: str, base_wiki_domain: str) -> Optional[str]:
+        if not page_url.startswith(f'{base_wiki_domain}/'):
+            return None
+        return page_url[len(base_wiki_domain) + 1:]
+
+    def is_enumeration_page(self, page_url: str, base_wiki_domain: str) -> bool:
+        page_title = self.page_title(page_url, base_wiki_domain)
+        return page_title is not None and any(page_title.startswith(enumeration_page) for enumeration_page in self.ENUMERATION_PAGES)
+
+    def is_article_page(self, page_url: str, base_wiki_domain: str) -> bool:
+        page_title = self.page_title(page_url, base_wiki_domain)
+        return bool(page_title) and ':' not in page_title and '?' not in page_title
+
+
+CRAWL_STRATEGIES = {
+    'bfs': BreadthFirstStrategy(),
+    'allpages': AllPagesStrategy()
+    }
+
+DEFAULT_CRAWL_STRATEGY = 'bfs'
+
+def scrap_images(url: str, base_image_domain: str = DEFAULT_BASE_WIKI_IMAGE_DOMAIN, base_wiki_domain: Union[str, None] = None, get_page: Callable[[str, Union[Path, None]], Page] = get_page, workers: int = DEFAULT_WORKERS, excluded_patterns: Iterable[str] = DEFAULT_EXCLUDED_PATTERNS, checkpoint: Optional[CrawlCheckpoint] = None, strategy: str = DEFAULT_CRAWL_STRATEGY, debug_dir: Optional[Path] = None) -> Dict[str, Set[str]]:
+    # fetched pages are dumped into the debug directory, nothing is written without one
+    if workers < 1:
+        raise ValueError(f'At least one worker is needed to crawl: {workers}')
     base_wiki_domain = (url[:url.rfind('/')] if url.rfind('/') > 8 else url) if base_wiki_domain is None else base_wiki_domain
+    # the base domain is compared with canonical URLs, the article path is not added to it
+    base_wiki_domain = canonical_url(base_wiki_domain, '')
+    crawl_strategy = CRAWL_STRATEGIES[strategy]
     images = dict()
     debug_files = dict()
-    debug_dir = Path(__file__).parent / 'debug'
-    if not debug_dir.exists():
-        debug_dir.mkdir()
-    visited = set()
-    page_queue = deque({url})
-    while len(page_queue) > 0:
-        page_url = page_queue.popleft()
-        if page_url.startswith(base_wiki_domain) \
-                and 'Template' not in page_url \
-                and 'Forum:' not in page_url \
-                and 'User:' not in page_url \
-                and 'Help:' not in page_url \
-                and 'Help_talk:' not in page_url \
-                and 'User_blog:' not in page_url \
-                and 'Message_Wall' not in page_url \
-                and 'Special:Log' not in page_url \
-                and 'Special:Search' not in page_url \
-                and 'Special:Contributions' not in page_url \
-                and 'action=' not in page_url \
-                and 'oldid=' not in page_url \
-                and 'diff=' not in page_url \
-                and page_url not in visited:
-            # debug
-            debug_file_name = page_url
-            debug_file_name = debug_file_name[:debug_file_name.find('?')] if debug_file_name.find('?') > 0 else debug_file_name
-            debug_file_name = debug_file_name[debug_file_name.rfind('/')+1:] if debug_file_name.rfind('/') > 0 else debug_file_name
-            debug_files.setdefault(debug_file_name, list()).append(page_url)
-            debug_file_name = f'{debug_file_name}_{len(debug_files[debug_file_name])}.html'
-            debug_file_path = debug_dir / debug_file_name
-            visited.add(page_url)
-            wiki_page = get_page(page_url, debug_file_path)
-            page_queue.extend(get_links(wiki_page, page_url))
-            for image_source, image_names in get_images(wiki_page, base_image_domain).items():
-                images.setdefault(image_source, set()).update(image_names)
-    debug_index = debug_dir / '_index.json'
-    if debug_index.exists():
-        debug_index.unlink()
-        debug_index.touch()
-    debug_index.write_text(json.dumps(debug_files, indent=4, sort_keys=True))
+    if debug_dir is not None:
+        debug_dir.mkdir(parents=True, exist_ok=True)
+    frontier = UrlFrontier(base_wiki_domain, excluded_patterns)
+    if checkpoint is not None:
+        queued, visited, images, debug_files = checkpoint.load()
+        frontier.restore(queued, visited)
+    debug_paths = {page_url: debug_dir / f'{debug_file_name}_{i + 1}.html' for debug_file_name, page_urls in debug_files.items() for i, page_url in enumerate(page_urls)} if debug_dir is not None else dict()
+    queued = frontier.extend(crawl_strategy.seeds(url, base_wiki_domain))
+    if checkpoint is not None:
+        checkpoint.queue(queued)
+    try:
+        # pages are fetched by the workers, links and images are merged only by the crawling thread
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = dict()
+            while len(frontier) > 0 or len(running) > 0:
+                while len(frontier) > 0 and len(running) < workers:
+                    page_url = frontier.pop()
+                    # debug
+                    if debug_dir is not None and page_url not in debug_paths:
+                        debug_file_name = page_url
+                        debug_file_name = debug_file_name[:debug_file_name.find('?')] if debug_file_name.find('?') > 0 else debug_file_name
+                        debug_file_name = debug_file_name[debug_file_name.rfind('/')+1:] if debug_file_name.rfind('/') > 0 else debug_file_name
+                        debug_files.setdefault(debug_file_name, list()).append(page_url)
+                        debug_paths[page_url] = debug_dir / f'{debug_file_name}_{len(debug_files[debug_file_name])}.html'
+                        if checkpoint is not None:
+                            checkpoint.debug_file(debug_file_name, page_url)
+                    running[executor.submit(get_page, page_url, debug_paths.get(page_url))] = page_url
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for page_future in done:
+                    page_url = running.pop(page_future)
+                    wiki_page = page_future.result()
+                    queued = frontier.extend(crawl_strategy.follow(page_url, get_links(wiki_page, page_url), base_wiki_domain))
+                    page_images = get_images(wiki_page, base_image_domain)
+                    for image_source, image_names in page_images.items():
+                        images.setdefault(image_source, set()).update(image_names)
+                    if checkpoint is not None:
+                        checkpoint.page_done(page_url, queued, page_images)
+    finally:
+        if checkpoint is not None:
+            checkpoint.commit()
+    if debug_dir is not None:
+        (debug_dir / '_index.json').write_text(json.dumps(debug_files, indent=4, sort_keys=True))
     return images
 
-def get_images(page: BeautifulSoup, base_image_domain: str = DEFAULT_BASE_WIKI_IMAGE_DOMAIN) -> Dict[str, Set[str]]:
+def page_images(page: Page) -> Iterable[Tuple[Optional[str], Optional[str]]]:
+    if isinstance(page, WikiPage):
+        return page.images
+    return ((image.get('src'), image.get('data-image-key')) for image in page.find_all('img'))
+
+def page_link_urls(page: Page) -> Iterable[Optional[str]]:
+    if isinstance(page, WikiPage):
+        return page.link_urls
+    return (link.get('href') for link in page.find_all('a'))
+
+def page_base_urls(page: Page) -> Iterable[Optional[str]]:
+    if isinstance(page, WikiPage):
+        return page.base_urls
+    return (base.get('href') for base in page.find_all('base'))
+
+def get_images(page: Page, base_image_domain: str = DEFAULT_BASE_WIKI_IMAGE_DOMAIN) -> Dict[str, Set[str]]:
     images = dict()
-    for image in page.find_all('img'):
-        image_source = image.get('src')
+    for image_source, image_name in page_images(page):
         if image_source and image_source.startswith(base_image_domain):
-            image_name = image.get('data-image-key')
             image_file = None
             for source_part in image_source.split('/'):
                 if source_part.endswith('.png') or source_part.endswith('.ico') or source_part.endswith('.jpg') or source_part.endswith('.jpeg'):
@@ -89,12 +545,11 @@ def get_images(page: BeautifulSoup, base_image_domain: str = DEFAULT_BASE_WIKI_I
                     images[image_source].add(image_name)
     return images
 
-def get_links(page: BeautifulSoup, url: str) -> Set[str]:
+def get_links(page: Page, url: str) -> Set[str]:
     base_url = get_base_url(page, url)
     protocol = get_protocol(base_url)
     page_links = set()
-    for link in page.find_all('a'):
-        link_url = link.get('href')
+    for link_url in page_link_urls(page):
         if link_url is None or link_url.startswith('#'):
             continue
         if link_url.startswith('//'):
@@ -106,10 +561,9 @@ def get_links(page: BeautifulSoup, url: str) -> Set[str]:
     return page_links
 
 
-def get_base_url(page: BeautifulSoup, url: str) -> str:
+def get_base_url(page: Page, url: str) -> str:
     base_url = None
-    for base in page.find_all('base'):
-        base_url = base.get('href')
+    for base_url in page_base_urls(page):
         if base_url is not None:
             break
         # TODO: support base url as tag value see FortressCraft_Evolved_Wiki_2.html
@@ -121,16 +575,139 @@ def get_protocol(url: str) -> str:
     return url[:url.find('://')]
 
 
+def original_image_url(image_source: str) -> Tuple[str, str]:
+    # drops thumbnail transformations like /scale-to-width-down/32 keeping the revision and its cache buster
+    image_path, _, revision = image_source.partition('/revision/')
+    if not revision:
+        return image_path, image_source
+    revision_path, _, query = revision.partition('?')
+    revision_id = revision_path.split('/', 1)[0]
+    return image_path, f'{image_path}/revision/{revision_id}{"?" + query if query else ""}'
+
+
+def group_images(images: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    originals = dict()
+    for image_source, image_names in images.items():
+        image_path, image_url = original_image_url(image_source)
+        original = originals.setdefault(image_path, [image_url, set()])
+        # the newest revision has the biggest cache buster
+        original[0] = max(original[0], image_url)
+        original[1].update(image_names)
+    return {image_url: image_names for image_url, image_names in originals.values()}
+
+
+def file_hash(file: Path) -> str:
+    file_hash = hashlib.sha256()
+    with file.open('rb') as content:
+        for chunk in iter(lambda: content.read(1 << 20), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def download_images(images: Dict[str, Set[str]], output_dir: Path, fetch_image: Optional[Callable[[str], bytes]] = None, workers: int = DEFAULT_DOWNLOAD_WORKERS, stats: Optional[CrawlStats] = None) -> Dict[str, Dict]:
+    if fetch_image is None:
+        session = create_session(workers, DEFAULT_DOWNLOAD_RETRIES)
+
+        def fetch_image(image_url: str) -> bytes:
+            response = session.get(image_url)
+            response.raise_for_status()
+            return response.content
+
+    manifest_file = output_dir / IMAGE_MANIFEST
+    previous_manifest = json.loads(manifest_file.read_text()) if manifest_file.exists() else dict()
+    manifest = dict()
+    downloads = dict()
+    for image_url, image_names in sorted(group_images(images).items()):
+        image = previous_manifest.get(image_url)
+        if image is not None and (output_dir / image['file']).exists() and file_hash(output_dir / image['file']) == image['sha256']:
+            manifest[image_url] = dict(image, names=sorted(image_names))
+        else:
+            downloads[image_url] = image_names
+
+    def download(image_url: str) -> Tuple[str, bytes]:
+        print(f'Downloading image: "{image_url}"')
+        started = time.perf_counter()
+        try:
+            image_content = fetch_image(image_url)
+        except requests.RequestException:
+            if stats is not None:
+                stats.record(started, 0)
+            raise
+        if stats is not None:
+            stats.record(started, len(image_content), 200)
+        return image_url, image_content
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        image_futures = [executor.submit(download, image_url) for image_url in downloads]
+        for image_future in image_futures:
+            try:
+                image_url, image_content = image_future.result()
+            except requests.RequestException as error:
+                print(f'Failed to download image: {error}')
+                continue
+            image_hash = hashlib.sha256(image_content).hexdigest()
+            image_suffix = Path(urlsplit(image_url).path.partition('/revision/')[0]).suffix.lower()
+            image_file = Path('objects') / image_hash[:2] / f'{image_hash}{image_suffix}'
+            if not (output_dir / image_file).exists():
+                (output_dir / image_file).parent.mkdir(parents=True, exist_ok=True)
+                temporary_file = (output_dir / image_file).with_suffix('.tmp')
+                temporary_file.write_bytes(image_content)
+                temporary_file.replace(output_dir / image_file)
+            manifest[image_url] = {'file': image_file.as_posix(), 'sha256': image_hash, 'names': sorted(downloads[image_url])}
+    manifest_file.write_text(json.dumps(manifest, indent=4, sort_keys=True))
+    return manifest
+
+
 def main():
     # Parse command line arguments
     parser = ArgumentParser()
     parser.add_argument('url', nargs='?', default=DEFAULT_WIKI_URL, help='The URL of the FortressCraft Evolved! wiki')
+    parser.add_argument('--strategy', choices=sorted(CRAWL_STRATEGIES), default=DEFAULT_CRAWL_STRATEGY, help='Follow every link (bfs) or only the articles listed by the wiki enumeration pages (allpages)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='The number of pages fetched concurrently')
+    parser.add_argument('--interval', type=float, default=DEFAULT_REQUEST_INTERVAL, help='The minimal delay in seconds between requests to the same host')
+    parser.add_argument('--exclude', action='append', default=list(), help='Skip pages with URLs containing this text (can be repeated)')
+    parser.add_argument('--no-default-excludes', action='store_true', help='Do not skip the default set of non-article pages')
+    parser.add_argument('--checkpoint', type=Path, default=Path(__file__).parent / '.cache' / 'crawl.sqlite', help='The file the crawl state is periodically saved to')
+    parser.add_argument('--resume', action='store_true', help='Continue the crawl saved in the checkpoint file instead of starting over')
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument('--archive', type=Path, help='Record fetched pages into this archive instead of debug files, revalidating pages already in it')
+    archive_group.add_argument('--replay', type=Path, help='Serve pages from this archive without accessing the network')
+    parser.add_argument('--debug-dir', type=Path, default=Path(__file__).parent / 'debug', help='The directory fetched pages are dumped to when they are not recorded into an archive')
+    parser.add_argument('--download', type=Path, help='Download the original images into this directory')
+    parser.add_argument('--profile', type=Path, metavar='FILE', help='Write the crawl and download stages with request rates, fetched bytes and latency histograms to this JSON file')
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error(f'invalid number of workers: {args.workers}')
 
-    images = scrap_images(args.url)
-    output = Path(__file__).parent / 'images.json'
-    output.touch()
-    output.write_text(json.dumps({image_source: sorted(list(image_names)) for image_source, image_names in images.items()}, indent=4, sort_keys=True))
+    excluded_patterns = (list() if args.no_default_excludes else DEFAULT_EXCLUDED_PATTERNS) + args.exclude
+    page_stats = CrawlStats()
+    image_stats = CrawlStats()
+    if args.replay:
+        archive = PageArchive(args.replay)
+        page_getter = archive.get_page
+    else:
+        archive = PageArchive(args.archive) if args.archive else None
+        page_getter = PageFetcher(create_session(args.workers), HostRateLimiter(args.interval), archive, page_stats)
+    # pages recorded into or replayed from an archive are never dumped, no debug index lists files that do not exist
+    debug_dir = None if args.archive or args.replay else args.debug_dir.expanduser()
+    checkpoint = CrawlCheckpoint(args.checkpoint.expanduser(), args.resume)
+    with Profiler(args.profile is not None) as profiler:
+        try:
+            with profiler.stage('crawl'):
+                images = scrap_images(args.url, get_page=page_getter, workers=args.workers, excluded_patterns=excluded_patterns, checkpoint=checkpoint, strategy=args.strategy, debug_dir=debug_dir)
+        finally:
+            checkpoint.close()
+            if archive is not None:
+                archive.close()
+        output = Path(__file__).parent / 'images.json'
+        output.touch()
+        output.write_text(json.dumps({image_source: sorted(list(image_names)) for image_source, image_names in images.items()}, indent=4, sort_keys=True))
+        if args.download:
+            with profiler.stage('download'):
+                download_images(images, args.download.expanduser(), stats=image_stats)
+    if args.profile:
+        profiler.write(args.profile.expanduser(), pages=page_stats.report(), images=image_stats.report())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,225 @@
+from cache import content_hash
+from collections.abc import Iterator as LazySequence
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, List
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+
+JSON_BUFFER_SIZE = 1 << 16
+
+# only the top levels of a document are streamed, the values below them are encoded by the C encoder of json.dumps
+JSON_STREAMED_LEVELS = 2
+
+# outputs being replaced by a commit and the backups of their previous files, a commit interrupted by a crash is rolled back from it
+COMMIT_JOURNAL = '.outputs.commit'
+
+
+def json_key(key: Any) -> str:
+    return json.dumps(key) if isinstance(key, str) else json.dumps({key: None})[1:-len(': null}')]
+
+
+def iterencode(data: Any, levels: int = JSON_STREAMED_LEVELS) -> Iterator[str]:
+    # the same document as json.dumps, json.dump would encode everything in pure Python
+    # generators in the streamed levels are encoded as lists, their values are only created while they are written
+    if levels and isinstance(data, dict) and data:
+        yield '{'
+        for i, (key, value) in enumerate(data.items()):
+            yield f'{", " if i else ""}{json_key(key)}: '
+            yield from iterencode(value, levels - 1)
+        yield '}'
+    elif levels and (isinstance(data, (list, tuple)) and data or isinstance(data, LazySequence)):
+        yield '['
+        for i, value in enumerate(data):
+            if i:
+                yield ', '
+            yield from iterencode(value, levels - 1)
+        yield ']'
+    else:
+        yield json.dumps(data)
+
+
+class HashingFile:
+
+    def __init__(self, output: BinaryIO) -> None:
+        self.__output = output
+        self.__hash = hashlib.sha256()
+
+    def write(self, content: bytes) -> int:
+        self.__hash.update(content)
+        return self.__output.write(content)
+
+    def flush(self) -> None:
+        self.__output.flush()
+
+    def hexdigest(self) -> str:
+        return self.__hash.hexdigest()
+
+
+class JsonSink:
+
+    def __init__(self, outputs: List[Any]) -> None:
+        self.__outputs = outputs
+        self.__chunks = list()
+        self.__size = 0
+
+    def write(self, text: str) -> None:
+        # small chunks are encoded and passed on in bigger blocks
+        self.__chunks.append(text)
+        self.__size += len(text)
+        if self.__size >= JSON_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        content = ''.join(self.__chunks).encode()
+        self.__chunks.clear()
+        self.__size = 0
+        for output in self.__outputs:
+            output.write(content)
+
+
+class OutputWriter:
+
+    def __init__(self, output_dir: Path, compress: bool = True, debug: bool = False) -> None:
+        self.__output_dir = output_dir
+        self.__compress = compress
+        self.__debug = debug
+        # target file, temporary file, content hash
+        self.__staged = list()
+        self.__journal = output_dir / COMMIT_JOURNAL
+        # the previous outputs of a commit interrupted by a crash are restored before anything else is written
+        if self.__journal.is_file():
+            self.__roll_back()
+
+    def __enter__(self) -> 'OutputWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def __temporary_file(self, output_file: Path) -> Path:
+        return output_file.with_name(f'.{output_file.name}.{os.getpid()}.tmp')
+
+    def write_json(self, name: str, data: Any) -> None:
+        # the document is streamed into the temporary files, the whole JSON string is never built
+        if self.__debug:
+            print(f'Writing data to: {name}')
+            data = json.loads(''.join(iterencode(data)))
+            json.dump(data, sys.stdout, indent=4)
+            print()
+        output_file = self.__output_dir / name
+        compressed_file = output_file.with_name(f'{output_file.name}.gz')
+        temporary_file = self.__temporary_file(output_file)
+        temporary_compressed_file = self.__temporary_file(compressed_file)
+        self.__output_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            with temporary_file.open('wb') as output_content:
+                hashing_output = HashingFile(output_content)
+                if self.__compress:
+                    with temporary_compressed_file.open('wb') as compressed_content:
+                        hashing_compressed_output = HashingFile(compressed_content)
+                        # no file name and a fixed time in the gzip header, the same document is always compressed to the same bytes
+                        with gzip.GzipFile(filename='', mode='wb', fileobj=hashing_compressed_output, mtime=0) as compressed_output:
+                            self.__dump(data, [hashing_output, compressed_output])
+                else:
+                    self.__dump(data, [hashing_output])
+        except BaseException:
+            temporary_file.unlink(missing_ok=True)
+            temporary_compressed_file.unlink(missing_ok=True)
+            raise
+        self.__staged.append((output_file, temporary_file, hashing_output.hexdigest()))
+        if self.__compress:
+            self.__staged.append((compressed_file, temporary_compressed_file, hashing_compressed_output.hexdigest()))
+
+    @staticmethod
+    def __dump(data: Any, outputs: List[Any]) -> None:
+        sink = JsonSink(outputs)
+        for chunk in iterencode(data):
+            sink.write(chunk)
+        sink.flush()
+
+    def write_bytes(self, name: str, content: bytes) -> None:
+        output_file = self.__output_dir / name
+        temporary_file = self.__temporary_file(output_file)
+        self.__output_dir.mkdir(parents=True, exist_ok=True)
+        temporary_file.write_bytes(content)
+        self.__staged.append((output_file, temporary_file, hashlib.sha256(content).hexdigest()))
+
+    def commit(self) -> List[str]:
+        # every output is complete on disk before the first one is replaced, unchanged outputs keep their files
+        changed = list()
+        for output_file, temporary_file, output_hash in self.__staged:
+            if output_file.is_file() and content_hash([output_file]) == output_hash:
+                temporary_file.unlink()
+            else:
+                changed.append((output_file, temporary_file))
+        self.__staged.clear()
+        if not changed:
+            return list()
+        # every file replaces its output atomically, the set of outputs is replaced all or nothing through the backups in the journal
+        # readers may still see a mix of old and new outputs while the files are replaced or after a crash until the next writer rolls it back
+        journal = list()
+        try:
+            for output_file, _ in changed:
+                backup_file = None
+                if output_file.is_file():
+                    backup_file = output_file.with_name(f'.{output_file.name}.{os.getpid()}.bak')
+                    self.__backup(output_file, backup_file)
+                journal.append([output_file.name, backup_file.name if backup_file is not None else None])
+            temporary_journal = self.__temporary_file(self.__journal)
+            temporary_journal.write_text(json.dumps(journal))
+            temporary_journal.replace(self.__journal)
+            for output_file, temporary_file in changed:
+                temporary_file.replace(output_file)
+        except BaseException:
+            if self.__journal.is_file():
+                self.__roll_back()
+            else:
+                self.__remove_backups(journal)
+            for _, temporary_file in changed:
+                temporary_file.unlink(missing_ok=True)
+            raise
+        self.__journal.unlink()
+        self.__remove_backups(journal)
+        return [output_file.name for output_file, _ in changed]
+
+    @staticmethod
+    def __backup(output_file: Path, backup_file: Path) -> None:
+        # a hard link keeps the output in place, file systems without them get a copy
+        backup_file.unlink(missing_ok=True)
+        try:
+            os.link(output_file, backup_file)
+        except OSError:
+            shutil.copy2(output_file, backup_file)
+
+    def __remove_backups(self, journal: List[List]) -> None:
+        for _, backup_name in journal:
+            if backup_name is not None:
+                (self.__output_dir / backup_name).unlink(missing_ok=True)
+
+    def __roll_back(self) -> None:
+        journal = json.loads(self.__journal.read_text())
+        for output_name, backup_name in journal:
+            if backup_name is None:
+                (self.__output_dir / output_name).unlink(missing_ok=True)
+            elif (self.__output_dir / backup_name).is_file():
+                # renaming a hard link over its own output does nothing, the backup is removed after it
+                (self.__output_dir / backup_name).replace(self.__output_dir / output_name)
+                (self.__output_dir / backup_name).unlink(missing_ok=True)
+        self.__journal.unlink()
+
+    def discard(self) -> None:
+        for _, temporary_file, _ in self.__staged:
+            temporary_file.unlink(missing_ok=True)
+        self.__staged.clear()
+
+    @property
+    def staged(self) -> List[str]:
+        return [output_file.name for output_file, _, _ in self.__staged]
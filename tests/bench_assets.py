@@ -0,0 +1,72 @@
+from .context import assets, atlas
+from .test_assets import split_icons, synthetic_atlas
+
+from argparse import ArgumentParser
+from PIL import Image
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+import math
+import timeit
+
+
+def icons_config(atlas: Image.Image, icons: int) -> Dict[str, Tuple[int, int]]:
+    # spread the referenced icons over the whole atlas, like the icons_fill.json of the game
+    boxes, first_boxes = assets.icon_boxes(atlas)
+    positions = [(row, column) for row in range(len(first_boxes) - 1) for column in range(first_boxes[-row - 1] - first_boxes[-row - 2])]
+    step = max(1, len(positions) // icons)
+    return {f'icon-{row}-{column}': (row, column) for row, column in positions[::step][:icons]}
+
+
+def split_icons_sheet(atlas: Image.Image, icons_config: Dict[str, Tuple[int, int]]) -> Tuple[Image.Image, Dict[str, str]]:
+    # the sprite sheet composed from all icons cut by split_image on a square grid
+    icons = split_icons(atlas)
+    size = 64 * math.ceil(math.sqrt(len(set(icons_config.values()))))
+    icons_out = Image.new(atlas.mode, (size, size))
+    icons_positions = dict()
+    for i, icon_position in enumerate(dict.fromkeys(icons_config.values())):
+        x_offset, y_offset = 64 * (i % (size // 64)), 64 * (i // (size // 64))
+        icons_positions[icon_position] = f'-{x_offset}px -{y_offset}px'
+        selected_icon = icons[icon_position[0]][icon_position[1]]
+        icons_out.paste(selected_icon, (x_offset + math.floor((64-selected_icon.size[0])/2), y_offset + math.floor((64-selected_icon.size[1])/2)))
+    return icons_out, {icon_name: icons_positions[icon_position] for icon_name, icon_position in icons_config.items()}
+
+
+def icons_sheet(atlas_image: Image.Image, icons_config: Dict[str, Tuple[int, int]]) -> Tuple[Image.Image, Dict[str, str]]:
+    return atlas.pack_icons(assets.crop_icons(atlas_image, icons_config), atlas_image.mode)
+
+
+def benchmark(name: str, function: Callable, repeat: int) -> float:
+    best = min(timeit.repeat(function, number=1, repeat=repeat))
+    print(f'{name:<20} best of {repeat}: {best * 1000:9.2f}ms')
+    return best
+
+
+def main():
+    # Parse command line arguments
+    parser = ArgumentParser()
+    parser.add_argument('atlases', nargs='*', type=Path, help='Decoded BlockPreview atlases (PNG) to segment, e.g. saved from the texture cache')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[16, 32, 64], help='Rows and columns of the synthetic atlases')
+    parser.add_argument('--icons', type=int, default=400, help='The number of icons referenced by the configuration')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of measured rounds')
+    args = parser.parse_args()
+
+    atlases = [(atlas_file.name, Image.open(atlas_file)) for atlas_file in args.atlases]
+    atlases += [(f'synthetic {size}x{size}', synthetic_atlas(size, size)) for size in args.sizes]
+    for name, atlas_image in atlases:
+        atlas_image.load()
+        config = icons_config(atlas_image, args.icons)
+        print(f'{name}: {atlas_image.size[0]}x{atlas_image.size[1]}px, {len(assets.icon_boxes(atlas_image)[0])} icons, {len(config)} referenced')
+        all_icons = split_icons(atlas_image)
+        for icon_name, icon in assets.crop_icons(atlas_image, config).items():
+            if icon.tobytes() != all_icons[config[icon_name][0]][config[icon_name][1]].tobytes():
+                raise AssertionError('Vectorized segmentation returned a different icon than split_image')
+        split_time = benchmark('split_image', lambda: split_icons(atlas_image), args.repeat)
+        vectorized_time = benchmark('icon_boxes', lambda: assets.icon_boxes(atlas_image), args.repeat)
+        print(f'segmentation speedup: {split_time / vectorized_time:.2f}x')
+        split_time = benchmark('split_image sheet', lambda: split_icons_sheet(atlas_image, config), args.repeat)
+        vectorized_time = benchmark('icon_boxes sheet', lambda: icons_sheet(atlas_image, config), args.repeat)
+        print(f'sprite sheet speedup: {split_time / vectorized_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
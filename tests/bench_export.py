@@ -0,0 +1,113 @@
+from .context import analysis, assets, atlas, cache, fortrescraft, items
+from .synthetic import generate_game_data
+from .test_assets import synthetic_atlas
+
+from argparse import ArgumentParser
+from pathlib import Path
+from PIL import Image
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, List, Optional, Tuple
+from unittest import mock
+import math
+import sys
+import timeit
+
+
+# stages working on the same amount of data at every scale are not checked for scaling
+FIXED_SIZE_STAGES = {'icons'}
+
+
+def synthetic_game_icons(atlas_image: Image.Image) -> Callable:
+    # the icon stage of game_icons without decoding a Unity texture
+    def game_icons(game_data: Path, icons_config: Dict[str, Tuple[int, int]], index_file: Path = assets.DEFAULT_ASSET_INDEX, texture_cache: Optional['assets.TextureCache'] = None, icons: Optional[Dict[str, Image.Image]] = None) -> Tuple[Image.Image, Dict[str, str]]:
+        return atlas.pack_icons(assets.crop_icons(atlas_image, icons_config), atlas_image.mode)
+    return game_icons
+
+
+def export_stages(game_data: Path, work_dir: Path, atlas_image: Image.Image) -> Dict[str, Callable]:
+    receipe_sets = fortrescraft.read_recipe_sets(game_data / 'RecipeSets.xml')
+    receipe_files = [game_data / receipe_file for _, _, _, receipe_file in receipe_sets]
+    auto_craft_receipes = sorted((game_data / 'GenericAutoCrafter').iterdir())
+    item_list, _ = fortrescraft.read_items(game_data)
+    item_keys = [key for key, _, _ in item_list]
+    item_index = items.ItemIndex(item_list)
+    receipe_crafts = [fortrescraft.read_recipes(receipe_file) for receipe_file in receipe_files]
+    auto_crafters = [fortrescraft.read_auto_recipes(auto_craft_receipe) for auto_craft_receipe in auto_craft_receipes]
+    icons_config = fortrescraft.icons_configuration()
+    used_items = dict()
+    data_recipes = dict()
+    for receipe_file, crafts in zip(receipe_files, receipe_crafts):
+        for receip, receip_items in fortrescraft.resolve_recipes(receipe_file, crafts, 'set', 'factory', 'Factory', item_index):
+            data_recipes[receip.id] = receip
+            used_items.update((object.id, object) for object in receip_items)
+    for auto_craft_receipe, auto_crafter in zip(auto_craft_receipes, auto_crafters):
+        for _, receip, receip_items in fortrescraft.resolve_auto_recipes(auto_craft_receipe, auto_crafter, item_index):
+            data_recipes[receip.id] = receip
+            used_items.update((object.id, object) for object in receip_items)
+    output_dir = work_dir / 'output'
+    assets_data = work_dir / 'assets'
+    output_dir.mkdir(exist_ok=True)
+    assets_data.mkdir(exist_ok=True)
+
+    def export():
+        with mock.patch.object(fortrescraft, 'game_icons', synthetic_game_icons(atlas_image)):
+            fortrescraft.export(game_data, output_dir, cache.ExportCache(work_dir / 'cache', False), assets_data)
+
+    return {
+        'create_object_id': lambda: [fortrescraft.IdConverter().create_object_id(key) for key in item_keys],
+        'terrain': lambda: list(fortrescraft.extract_terrain(game_data, fortrescraft.IdConverter())),
+        'items': lambda: list(fortrescraft.extract_items(game_data, fortrescraft.IdConverter())),
+        'item_index': lambda: items.ItemIndex(item_list),
+        'read_recipes': lambda: [fortrescraft.read_recipes(receipe_file) for receipe_file in receipe_files],
+        'resolve_recipes': lambda: [list(fortrescraft.resolve_recipes(receipe_file, crafts, 'set', 'factory', 'Factory', item_index)) for receipe_file, crafts in zip(receipe_files, receipe_crafts)],
+        'read_auto_recipes': lambda: [fortrescraft.read_auto_recipes(auto_craft_receipe) for auto_craft_receipe in auto_craft_receipes],
+        'resolve_auto_recipes': lambda: [list(fortrescraft.resolve_auto_recipes(auto_craft_receipe, auto_crafter, item_index)) for auto_craft_receipe, auto_crafter in zip(auto_craft_receipes, auto_crafters)],
+        'analysis': lambda: analysis.analyze(used_items, data_recipes),
+        'icons': lambda: atlas.encode_atlases(synthetic_game_icons(atlas_image)(assets_data, icons_config)[0]),
+        'export': export,
+    }
+
+
+def scaling_exponent(base_scale: float, base_time: float, scale: float, stage_time: float) -> float:
+    return math.log(stage_time / base_time) / math.log(scale / base_scale)
+
+
+def main():
+    # Parse command line arguments
+    parser = ArgumentParser()
+    parser.add_argument('--scales', type=float, nargs='*', default=[1, 10, 100], help='Sizes of the synthetic game data relative to the vanilla game, e.g. 1 10 100 1000')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of measured rounds')
+    parser.add_argument('--max-exponent', type=float, default=1.25, help='The highest accepted growth exponent of a stage time with the data size')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Stages faster than this many seconds at the biggest scale are not checked for scaling')
+    args = parser.parse_args()
+
+    atlas_image = synthetic_atlas(32, 32)
+    timings: Dict[str, List[float]] = dict()
+    scales = sorted(args.scales)
+    with TemporaryDirectory() as work_dir:
+        for scale in scales:
+            game_data = Path(work_dir) / f'game-{scale:g}'
+            counts = generate_game_data(game_data, scale)
+            print(f'scale {scale:g}x: {counts["items"]} items, {counts["recipes"]} recipes, {counts["auto_recipes"]} auto crafter recipes in {counts["files"]} files')
+            for stage, function in export_stages(game_data, Path(work_dir), atlas_image).items():
+                best = min(timeit.repeat(function, number=1, repeat=args.repeat))
+                timings.setdefault(stage, list()).append(best)
+                print(f'  {stage:<22} best of {args.repeat}: {best * 1000:10.2f}ms')
+
+    regressions = list()
+    if len(scales) > 1:
+        print(f'scaling from {scales[0]:g}x to {scales[-1]:g}x (time ~ size^exponent):')
+        for stage, stage_timings in timings.items():
+            exponent = scaling_exponent(scales[0], stage_timings[0], scales[-1], stage_timings[-1])
+            checked = stage not in FIXED_SIZE_STAGES and stage_timings[-1] >= args.min_time
+            status = 'superlinear' if checked and exponent > args.max_exponent else 'ok' if checked else 'not checked'
+            print(f'  {stage:<22} exponent {exponent:5.2f} {status}')
+            if status == 'superlinear':
+                regressions.append(stage)
+    if regressions:
+        print(f'Stages scaling worse than size^{args.max_exponent:g}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
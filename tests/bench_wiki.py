@@ -0,0 +1,51 @@
+from .context import wiki
+
+from argparse import ArgumentParser
+from bs4 import BeautifulSoup
+from pathlib import Path
+from typing import Callable, List
+import timeit
+
+
+TEST_PAGE = Path(__file__).parent / 'data' / 'Cargo_Lift_Controller.html'
+
+TEST_URL = 'https://fortresscrafte.fandom.com/wiki/Cargo_Lift_Controller'
+
+
+def extract_with_tree(page_content: str):
+    page = BeautifulSoup(page_content, 'html.parser')
+    return wiki.get_links(page, TEST_URL), wiki.get_images(page)
+
+
+def extract_with_stream(page_content: str):
+    page = wiki.parse_page(page_content)
+    return wiki.get_links(page, TEST_URL), wiki.get_images(page)
+
+
+def benchmark(name: str, extractor: Callable, pages: List[str], repeat: int) -> float:
+    timings = timeit.repeat(lambda: [extractor(page_content) for page_content in pages], number=1, repeat=repeat)
+    best = min(timings)
+    print(f'{name:<20} best of {repeat}: {best * 1000:9.2f}ms ({best * 1000 / len(pages):.3f}ms per page)')
+    return best
+
+
+def main():
+    # Parse command line arguments
+    parser = ArgumentParser()
+    parser.add_argument('pages', nargs='*', type=Path, default=[TEST_PAGE], help='HTML pages to extract links and images from')
+    parser.add_argument('--copies', type=int, default=50, help='How many times each page is extracted per round')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of measured rounds')
+    args = parser.parse_args()
+
+    pages = [page.read_text() for page in args.pages] * args.copies
+    for page_content in pages[:len(args.pages)]:
+        if extract_with_tree(page_content) != extract_with_stream(page_content):
+            raise AssertionError('Streaming extractor returned different links or images than BeautifulSoup')
+
+    tree_time = benchmark('BeautifulSoup tree', extract_with_tree, pages, args.repeat)
+    stream_time = benchmark('streaming parser', extract_with_stream, pages, args.repeat)
+    print(f'speedup: {tree_time / stream_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,18 @@
 import sys
 from pathlib import Path
 sys.path.insert(0, str((Path(__file__).parent / '..' / 'src').resolve()))
+# the export scripts import their sibling modules directly
+sys.path.insert(0, str((Path(__file__).parent / '..' / 'src' / 'export').resolve()))
 
-from export import wiki
\ No newline at end of file
+from export import wiki
+import analysis
+import assets
+import atlas
+import cache
+import fortrescraft
+import images
+import items
+import model
+import profiling
+import watch
+import writer
@@ -0,0 +1,136 @@
+from pathlib import Path
+from random import Random
+from typing import Dict, Iterator, List
+from xml.sax.saxutils import escape
+
+
+# approximate entry counts of the vanilla game files, multiplied by the scale of the generated game data
+VANILLA_SIZES = {
+    'terrain': 180,
+    'items': 550,
+    'recipe_sets': 12,
+    'recipes': 60,
+    'auto_crafters': 30,
+    'auto_recipes': 3,
+}
+
+TERRAIN_CATEGORIES = ['Terrain', 'Decoration', 'Ore', 'Agriculture']
+
+ITEM_CATEGORIES = ['Crafting Ingredient', 'Machine Upgrade', 'Consumable', 'Suit Upgrade', 'Robotics', 'Minecarts']
+
+XML_HEADER = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+XML_NAMESPACES = 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema"'
+
+
+def scaled(size: str, scale: float) -> int:
+    return max(1, round(VANILLA_SIZES[size] * scale))
+
+
+def fields(indent: str, **values) -> str:
+    return ''.join(f'{indent}<{tag}>{escape(str(value))}</{tag}>\n' for tag, value in values.items() if value is not None)
+
+
+def costs(random: Random, indent: str, keys: List[str], names: Dict[str, str], use_names: bool = False) -> str:
+    # real recipe files mix item keys with item names in the auto crafter files
+    craft_costs = list()
+    for key in random.sample(keys, random.randint(1, 4)):
+        reference = {'Name': names[key]} if use_names and random.random() < 0.3 else {'Key': names[key] if use_names and random.random() < 0.3 else key}
+        craft_costs.append(f'{indent}  <CraftCost>\n{fields(indent + "    ", **reference, Amount=random.randint(1, 16))}{indent}  </CraftCost>\n')
+    return f'{indent}<Costs>\n{"".join(craft_costs)}{indent}</Costs>\n'
+
+
+def write_entries(xml_file: Path, root_tag: str, entries: Iterator[str]):
+    xml_file.parent.mkdir(parents=True, exist_ok=True)
+    with xml_file.open('w') as xml_content:
+        xml_content.write(f'{XML_HEADER}<{root_tag} {XML_NAMESPACES}>\n')
+        for entry in entries:
+            xml_content.write(entry)
+        xml_content.write(f'</{root_tag}>\n')
+
+
+def generate_game_data(game_data: Path, scale: float = 1, seed: int = 0) -> Dict[str, int]:
+    # FortressCraft shaped game files, every recipe references existing items except for about one missing key in 200 recipes
+    random = Random(seed)
+    names = dict()
+    terrain_keys = list()
+    counts = {'items': 0, 'recipes': 0, 'auto_recipes': 0}
+
+    recipe_sets = [(f'SynthRecipes{i}', f'SynthMachine{i}') for i in range(scaled('recipe_sets', scale))]
+    auto_crafters = [f'SynthAutoCrafter{i}' for i in range(scaled('auto_crafters', scale))]
+
+    def terrain_entries() -> Iterator[str]:
+        machines = [machine for _, machine in recipe_sets] + auto_crafters
+        values = ''.join(f'      <ValueEntry>\n{fields("        ", Value=i, Key=machine, Name=f"Synth Machine {machine[5:]}")}      </ValueEntry>\n' for i, machine in enumerate(machines))
+        counts['items'] += len(machines)
+        yield f'  <TerrainDataEntry>\n{fields("    ", CubeType=1, Key="SynthMachinePlacement", Name="Machine Placement", Category="Machine", MaxStack=50)}    <Values>\n{values}    </Values>\n  </TerrainDataEntry>\n'
+        for i in range(scaled('terrain', scale)):
+            key = f'SynthTerrain{i}'
+            variants = random.randint(1, 6) if random.random() < 0.3 else 0
+            entry_fields = fields("    ", CubeType=i + 2, Key=key, Name=f'Synth Terrain {i}', Category=random.choice(TERRAIN_CATEGORIES), MaxStack=random.choice([None, 50, 100, 200]))
+            if variants:
+                value_entries = list()
+                for value in range(variants):
+                    variant_key = f'{key}Variant{value}'
+                    names[variant_key] = f'Synth Terrain {i} Variant {value}'
+                    terrain_keys.append(variant_key)
+                    value_entries.append(f'      <ValueEntry>\n{fields("        ", Value=value, Key=variant_key, Name=names[variant_key])}      </ValueEntry>\n')
+                counts['items'] += variants
+                yield f'  <TerrainDataEntry>\n{entry_fields}    <Values>\n{"".join(value_entries)}    </Values>\n  </TerrainDataEntry>\n'
+            else:
+                names[key] = f'Synth Terrain {i}'
+                terrain_keys.append(key)
+                counts['items'] += 1
+                yield f'  <TerrainDataEntry>\n{entry_fields}  </TerrainDataEntry>\n'
+
+    write_entries(game_data / 'TerrainData.xml', 'ArrayOfTerrainDataEntry', terrain_entries())
+
+    item_keys = list()
+
+    def item_entries() -> Iterator[str]:
+        for i in range(scaled('items', scale)):
+            key = f'SynthItem{i}'
+            names[key] = f'Synth Item {i}'
+            item_keys.append(key)
+            object_key = f'{key}Object' if random.random() < 0.1 else None
+            counts['items'] += 2 if object_key else 1
+            yield f'  <ItemData>\n{fields("    ", ItemID=i, Key=key, Name=names[key], Category=random.choice(ITEM_CATEGORIES), Type=random.choice(["ItemStack", "ItemSingle"]), Object=object_key)}  </ItemData>\n'
+
+    write_entries(game_data / 'Items.xml', 'ArrayOfItemData', item_entries())
+
+    ingredient_keys = terrain_keys + item_keys
+
+    counts['missing'] = 0
+
+    def crafted_key() -> str:
+        if random.random() < 0.005:
+            counts['missing'] += 1
+            return f'SynthMissing{counts["missing"]}'
+        return random.choice(item_keys)
+
+    write_entries(game_data / 'RecipeSets.xml', 'ArrayOfRecipeSet', (f'  <RecipeSet>\n{fields("    ", Id=recipe_set, Name=f"Synth Machine {machine[12:]}" if i % 3 else None, MachineKey=machine, FileName=f"Recipes/{recipe_set}.xml")}  </RecipeSet>\n' for i, (recipe_set, machine) in enumerate(recipe_sets)))
+
+    for recipe_set, _ in recipe_sets:
+        recipes = list()
+        for i in range(random.randint(VANILLA_SIZES['recipes'] // 2, VANILLA_SIZES['recipes'] * 3 // 2)):
+            recipes.append(f'  <CraftData>\n{fields("    ", Key=f"{recipe_set}Craft{i}")}{costs(random, "    ", ingredient_keys, names)}{fields("    ", CraftedKey=crafted_key(), CraftedAmount=random.randint(1, 4))}  </CraftData>\n')
+        counts['recipes'] += len(recipes)
+        write_entries(game_data / 'Recipes' / f'{recipe_set}.xml', 'ArrayOfCraftData', iter(recipes))
+
+    for auto_crafter in auto_crafters:
+        auto_recipes = list()
+        for i in range(random.randint(1, 2 * VANILLA_SIZES['auto_recipes'])):
+            recipe_fields = fields("    ", Key=crafted_key(), CraftedAmount=random.randint(1, 4), OptionalIngredients='true' if random.random() < 0.1 else None)
+            auto_recipes.append(f'  <Recipe>\n{recipe_fields}{costs(random, "    ", ingredient_keys, names, True)}  </Recipe>\n')
+        counts['auto_recipes'] += len(auto_recipes)
+        auto_crafter_file = game_data / 'GenericAutoCrafter' / f'{auto_crafter}.xml'
+        auto_crafter_file.parent.mkdir(parents=True, exist_ok=True)
+        with auto_crafter_file.open('w') as auto_crafter_content:
+            auto_crafter_content.write(f'{XML_HEADER}<GenericAutoCrafterDataEntry {XML_NAMESPACES}>\n')
+            auto_crafter_content.write(fields('  ', Name=f'Synth Machine {auto_crafter[5:]}', Value=auto_crafter, PowerUsePerSecond=random.choice([4, 8, 16, 32]), CraftTime=random.choice([0.5, 1.5, 5, 30])))
+            auto_crafter_content.writelines(auto_recipes)
+            auto_crafter_content.write('</GenericAutoCrafterDataEntry>\n')
+
+    counts['machines'] = len(recipe_sets) + len(auto_crafters)
+    counts['files'] = 3 + len(recipe_sets) + len(auto_crafters)
+    return counts
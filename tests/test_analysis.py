@@ -0,0 +1,77 @@
+from .context import analysis, model
+
+import unittest
+
+
+def item(item_id: str, row: int = 1) -> 'model.Item':
+    return model.Item(item_id, item_id.title(), 'intermediate-products', row, 200)
+
+
+def recipe(recipe_id: str, inputs: dict, outputs: dict, time: float = 1) -> 'model.Recipe':
+    return model.Recipe(recipe_id, recipe_id, 1000, time, inputs, outputs, 'factory', 0, 'intermediate-products')
+
+
+class RecipeGraphTestCase(unittest.TestCase):
+
+    ITEMS = {item_id: item(item_id, 0 if item_id.endswith('ore') else 1) for item_id in ['copper-ore', 'iron-ore', 'copper-bar', 'iron-bar', 'wire', 'canister', 'fuel', 'gem', 'trinket']}
+
+    RECIPES = {
+        'copper-bar': recipe('copper-bar', {'copper-ore': 2}, {'copper-bar': 1}, 2),
+        'iron-bar': recipe('iron-bar', {'iron-ore': 1}, {'iron-bar': 1}),
+        'wire': recipe('wire', {'copper-bar': 1}, {'wire': 4}, 0.5),
+        # canisters are refilled with fuel and emptied again
+        'fuel': recipe('fuel', {'canister': 1, 'iron-bar': 1}, {'fuel': 1}),
+        'canister': recipe('canister', {'fuel': 1}, {'canister': 1}),
+        'trinket': recipe('trinket', {'gem': 1, 'wire': 2}, {'trinket': 1}),
+        'free-wire': recipe('free-wire', {}, {'wire': 1}),
+    }
+
+    def test_analyze(self):
+        report = analysis.analyze(self.ITEMS, self.RECIPES)
+        self.assertEqual((report['items'], report['recipes']), (9, 7))
+        self.assertListEqual(report['raw_items'], ['copper-ore', 'iron-ore'])
+        self.assertListEqual(report['missing_producers'], ['gem'])
+        self.assertListEqual(report['unreachable_items'], ['canister', 'fuel', 'trinket'])
+        self.assertListEqual(report['unreachable_recipes'], ['canister', 'fuel', 'trinket'])
+        self.assertListEqual(report['no_input_recipes'], ['free-wire'])
+        self.assertListEqual(report['cycles'], [['canister', 'fuel']])
+
+    def test_cycles(self):
+        recipes = {
+            'a': recipe('a', {'x': 1}, {'y': 1}),
+            'b': recipe('b', {'y': 1}, {'z': 1, 'x': 1}),
+            'c': recipe('c', {'z': 1}, {'w': 1}),
+            'd': recipe('d', {'w': 1}, {'w': 2}),
+            'e': recipe('e', {'w': 1}, {'v': 1}),
+        }
+        self.assertListEqual(analysis.RecipeGraph(dict(), recipes).cycles(), [['w'], ['x', 'y']])
+
+    def test_steady_state(self):
+        graph = analysis.RecipeGraph(self.ITEMS, self.RECIPES)
+        steady_state = graph.steady_state('wire', 8)
+        # the first runnable recipe of an item is used
+        self.assertListEqual(list(steady_state['machines']), ['wire', 'copper-bar'])
+        self.assertAlmostEqual(steady_state['machines']['wire'], 1)
+        self.assertAlmostEqual(steady_state['machines']['copper-bar'], 4)
+        self.assertListEqual(list(steady_state['inputs']), ['copper-ore'])
+        self.assertAlmostEqual(steady_state['inputs']['copper-ore'], 4)
+        with self.assertRaises(ValueError):
+            graph.steady_state('trinket')
+        with self.assertRaises(KeyError):
+            graph.steady_state('unobtainium')
+
+    def test_regressions(self):
+        report = analysis.analyze(self.ITEMS, self.RECIPES)
+        self.assertDictEqual(analysis.regressions(report, report), {})
+        recipes = dict(self.RECIPES)
+        del recipes['iron-bar']
+        regressed = analysis.analyze(self.ITEMS, recipes)
+        found = analysis.regressions(regressed, report)
+        self.assertDictEqual(found, {'missing_producers': ['iron-bar']})
+        self.assertIn('1 new missing producers: iron-bar', str(analysis.RecipeGraphRegression(found)))
+        # fixed problems are no regressions
+        self.assertDictEqual(analysis.regressions(report, regressed), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
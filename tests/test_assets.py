@@ -0,0 +1,215 @@
+from .context import assets
+
+import numpy as np
+import os
+import shutil
+import struct
+import unittest
+from PIL import Image
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest import mock
+
+
+def synthetic_atlas(rows: int, columns: int, seed: int = 0) -> Image.Image:
+    # icons of random sizes with specks of noise between them, the last row and column touch the edges of the atlas
+    random = np.random.default_rng(seed)
+    pixels = np.zeros((rows * 72, columns * 72, 4), dtype=np.uint8)
+    for row in range(rows):
+        for column in range(columns):
+            height, width = random.integers(8, 65, 2)
+            top = row * 72 + (72 - height if row == rows - 1 else 4)
+            left = column * 72 + (72 - width if column == columns - 1 else 4)
+            pixels[top:top + height, left:left + width] = random.integers(0, 256, (height, width, 4), dtype=np.uint8)
+            pixels[top:top + height, left:left + width, random.integers(0, 4)] |= 1
+            if column < columns - 1:
+                speck = random.integers(1, 5)
+                pixels[top:top + speck, left + width + 2:left + width + 2 + speck, 3] = 255
+        if row < rows - 1:
+            pixels[row * 72 + 69, random.integers(0, columns * 72)] = (255, 255, 255, 0)
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def split_icons(atlas: Image.Image) -> List[List[Image.Image]]:
+    icons = [[icon for icon in assets.split_image(icons_row, assets.projection_x, assets.crop_box_x)] for icons_row in assets.split_image(atlas, assets.projection_y, assets.crop_box_y)]
+    icons.reverse()
+    return icons
+
+
+class IconBoxesTestCase(unittest.TestCase):
+
+    def test_icon_boxes(self):
+        atlases = [synthetic_atlas(4, 6, seed) for seed in range(5)] + [
+            Image.new('RGBA', (16, 16)),
+            Image.new('RGBA', (16, 16), (0, 0, 0, 255)),
+            Image.new('L', (3, 3), 1),
+        ]
+        for i, atlas in enumerate(atlases):
+            with self.subTest(f'{i}: icon boxes should crop the same icons as split_image'):
+                icons = split_icons(atlas)
+                boxes = assets.icon_boxes(atlas)
+                self.assertEqual(len(boxes[1]) - 1, len(icons))
+                self.assertEqual(len(boxes[0]), sum(map(len, icons)))
+                for row, icons_row in enumerate(icons):
+                    for column, icon in enumerate(icons_row):
+                        box = assets.icon_box(boxes, (row, column))
+                        self.assertEqual(atlas.crop(box).tobytes(), icon.tobytes())
+                        self.assertEqual(assets.icon_box(boxes, (row, column - len(icons_row))), box)
+                    with self.assertRaises(IndexError):
+                        assets.icon_box(boxes, (row, len(icons_row)))
+                with self.assertRaises(IndexError):
+                    assets.icon_box(boxes, (len(icons), 0))
+
+    def test_crop_icons(self):
+        atlas = synthetic_atlas(5, 8)
+        icons = split_icons(atlas)
+        icons_config = {f'icon-{row}-{column}': (row, column) for row in range(5) for column in range(0, 8, 3)}
+        icons_config.update({'duplicate': (2, 3), 'last': (-1, -1)})
+        cropped_icons = assets.crop_icons(atlas, icons_config)
+        self.assertListEqual(list(cropped_icons.keys()), list(icons_config.keys()))
+        for icon_name, (row, column) in icons_config.items():
+            self.assertEqual(cropped_icons[icon_name].tobytes(), icons[row][column].tobytes())
+        self.assertIs(cropped_icons['duplicate'], cropped_icons['icon-2-3'])
+
+    def test_game_icons(self):
+        atlas = synthetic_atlas(3, 4)
+        icons_config = {'no-icon': (0, 0), 'iron-gear': (1, 2), 'copper-wire': (2, 3)}
+        wiki_icons = {'iron-gear': Image.new('RGBA', (64, 64), (255, 0, 0, 255)), 'site-logo': Image.new('RGBA', (32, 32), (0, 0, 255, 255))}
+        record = {'asset': 'sharedassets0.assets', 'file': 'sharedassets0.assets', 'name': 'BlockPreview', 'type': 'Texture2D', 'path_id': 1}
+        with mock.patch.object(assets, 'load_asset_index', return_value={'assets': dict()}), mock.patch.object(assets, 'asset_texture', return_value=atlas):
+            with mock.patch.object(assets, 'find_asset_objects', return_value=iter([record])):
+                icons_image, positions = assets.game_icons(Path('game'), icons_config, icons=wiki_icons)
+            self.assertListEqual(list(positions), ['no-icon', 'copper-wire', 'iron-gear', 'site-logo'])
+            # the given icons replace the BlockPreview ones
+            x_offset, y_offset = (int(offset.strip('-px')) for offset in positions['iron-gear'].split())
+            self.assertEqual(icons_image.getpixel((x_offset, y_offset)), (255, 0, 0, 255))
+            self.assertEqual(icons_image.crop((x_offset, y_offset, x_offset + 64, y_offset + 64)).tobytes(), wiki_icons['iron-gear'].tobytes())
+            # without a BlockPreview only the given icons are packed
+            with mock.patch.object(assets, 'find_asset_objects', return_value=iter([])):
+                self.assertListEqual(list(assets.game_icons(Path('game'), icons_config, icons=wiki_icons)[1]), ['iron-gear', 'site-logo'])
+                self.assertDictEqual(assets.game_icons(Path('game'), icons_config)[1], dict())
+
+
+class AssetIndexTestCase(unittest.TestCase):
+
+    def test_load_asset_index(self):
+        with TemporaryDirectory() as work_dir:
+            game_data = Path(work_dir) / 'FC_Linux_Universal_Data'
+            game_data.mkdir()
+            (game_data / 'sharedassets0.assets').write_bytes(b'textures')
+            (game_data / 'sharedassets0.assets.resS').write_bytes(b'texture data')
+            (game_data / 'level0').write_bytes(b'scene')
+            # assemblies, mono and configuration files are not Unity asset files
+            (game_data / 'Managed').mkdir()
+            (game_data / 'Managed' / 'Assembly-CSharp.dll').write_bytes(b'assembly')
+            (game_data / 'Mono').mkdir()
+            (game_data / 'Mono' / 'config').write_bytes(b'config')
+            (game_data / 'app.info').write_bytes(b'info')
+            index_file = Path(work_dir) / 'assets.json'
+            indexed_files = list()
+
+            def read_asset_inventory(game_data: Path, asset_file: Path) -> List[assets.AssetRecord]:
+                asset = asset_file.relative_to(game_data).as_posix()
+                indexed_files.append(asset)
+                return [{'asset': asset, 'file': asset_file.name, 'name': 'BlockPreview' if asset_file.name.startswith('shared') else 'Sky', 'type': 'Texture2D', 'path_id': len(indexed_files)}]
+
+            with mock.patch.object(assets, 'read_asset_inventory', read_asset_inventory):
+                asset_index = assets.load_asset_index(game_data, index_file)
+                self.assertListEqual(indexed_files, ['level0', 'sharedassets0.assets'])
+                self.assertListEqual(list(assets.find_asset_objects(asset_index, 'BlockPreview')), [{'asset': 'sharedassets0.assets', 'file': 'sharedassets0.assets', 'name': 'BlockPreview', 'type': 'Texture2D', 'path_id': 2}])
+
+                self.assertDictEqual(assets.load_asset_index(game_data, index_file), asset_index)
+                self.assertEqual(len(indexed_files), 2)
+
+                asset_file = game_data / 'sharedassets0.assets'
+                os.utime(asset_file, ns=(asset_file.stat().st_atime_ns, asset_file.stat().st_mtime_ns + 1000000))
+                (game_data / 'level0').unlink()
+                asset_index = assets.load_asset_index(game_data, index_file)
+                self.assertListEqual(indexed_files, ['level0', 'sharedassets0.assets', 'sharedassets0.assets'])
+                self.assertListEqual(list(asset_index['assets'].keys()), ['sharedassets0.assets'])
+                self.assertEqual(next(assets.find_asset_objects(asset_index, 'BlockPreview'))['path_id'], 3)
+
+                # an index of a different game directory is not reused, switching back does not index the first one again
+                other_game_data = Path(work_dir) / 'FC_Windows_Data'
+                shutil.copytree(game_data, other_game_data)
+                other_asset_index = assets.load_asset_index(other_game_data, index_file)
+                self.assertEqual(len(indexed_files), 4)
+                self.assertEqual(other_asset_index['game'], other_game_data.absolute().as_posix())
+                self.assertDictEqual(assets.load_asset_index(game_data, index_file), asset_index)
+                self.assertDictEqual(assets.load_asset_index(other_game_data, index_file), other_asset_index)
+                self.assertEqual(len(indexed_files), 4)
+
+
+class TextureCacheTestCase(unittest.TestCase):
+
+    def assertImageEqual(self, image: Image.Image, expected: Image.Image):
+        self.assertEqual(image.mode, expected.mode)
+        self.assertEqual(image.size, expected.size)
+        self.assertEqual(image.tobytes(), expected.tobytes())
+
+    def test_load(self):
+        texture = Image.new('RGBA', (32, 16))
+        texture.putpixel((3, 5), (10, 20, 30, 40))
+        texture.putpixel((31, 15), (255, 0, 0, 128))
+        for texture_format in sorted(assets.TEXTURE_FORMATS):
+            with self.subTest(f'decoded textures should be cached as {texture_format}'), TemporaryDirectory() as work_dir:
+                decoded = list()
+
+                def decoder():
+                    decoded.append(texture)
+                    return texture.copy()
+
+                texture_cache = assets.TextureCache(Path(work_dir), texture_format=texture_format)
+                self.assertImageEqual(texture_cache.load('hash-1', decoder), texture)
+                self.assertImageEqual(texture_cache.load('hash-1', decoder), texture)
+                self.assertImageEqual(assets.TextureCache(Path(work_dir), texture_format=texture_format).load('hash-1', decoder), texture)
+                self.assertEqual(len(decoded), 1)
+                self.assertEqual((texture_cache.hits, texture_cache.misses), (1, 1))
+
+                self.assertImageEqual(texture_cache.load('hash-2', decoder), texture)
+                self.assertEqual(len(decoded), 2)
+
+    def test_load_modes(self):
+        palette = Image.new('RGB', (8, 4), (200, 100, 50)).quantize(4)
+        textures = [Image.new(mode, (8, 4), 3) for mode in ['RGBA', 'RGB', 'LA', 'L', 'I;16', 'I;16B', 'I', 'F']] + [Image.new('RGBA', (8, 4), (1, 2, 3, 4)).convert('RGBa'), palette]
+        for texture_format in sorted(assets.TEXTURE_FORMATS):
+            with TemporaryDirectory() as work_dir:
+                cache_dir = Path(work_dir)
+                texture_cache = assets.TextureCache(cache_dir, texture_format=texture_format)
+                for i, texture in enumerate(textures):
+                    with self.subTest(f'{texture.mode} textures should be cached as {texture_format} without changes'):
+                        texture_cache.load(f'texture-{i}', lambda: texture.copy())
+                        self.assertImageEqual(assets.TextureCache(cache_dir, texture_format=texture_format).load(f'texture-{i}', self.fail), texture)
+                # palette images are kept as PNG files, modes PNG would convert as raw textures
+                self.assertListEqual(sorted(texture_file.name for texture_file in cache_dir.glob('*.png')), ['texture-9.png'] if texture_format == 'raw' else ['texture-0.png', 'texture-1.png', 'texture-2.png', 'texture-3.png', 'texture-4.png', 'texture-9.png'])
+                self.assertEqual(texture_cache.load('texture-9', self.fail).getpalette(), palette.getpalette())
+
+        with TemporaryDirectory() as work_dir:
+            # raw textures of the previous header with truncated mode names are decoded again
+            cache_dir = Path(work_dir)
+            (cache_dir / 'truncated.raw').write_bytes(struct.pack('<4sII', b'I;16', 8, 4) + bytes(64))
+            texture = Image.new('I;16B', (8, 4), 7)
+            self.assertImageEqual(assets.TextureCache(cache_dir).load('truncated', lambda: texture.copy()), texture)
+            self.assertImageEqual(assets.TextureCache(cache_dir).load('truncated', self.fail), texture)
+
+    def test_eviction(self):
+        with TemporaryDirectory() as work_dir:
+            cache_dir = Path(work_dir)
+            texture_size = assets.RAW_TEXTURE_HEADER.size + 16 * 16 * 4
+            texture_cache = assets.TextureCache(cache_dir, 2 * texture_size)
+            for i, key in enumerate(['a', 'b']):
+                texture_cache.load(key, lambda: Image.new('RGBA', (16, 16)))
+                os.utime(cache_dir / f'{key}.raw', ns=(i * 1000000000, i * 1000000000))
+            # recently used textures are evicted last
+            texture_cache.load('a', lambda: Image.new('RGBA', (16, 16)))
+            texture_cache.load('c', lambda: Image.new('RGBA', (16, 16)))
+            self.assertListEqual(sorted(texture_file.name for texture_file in cache_dir.iterdir()), ['a.raw', 'c.raw'])
+
+            # a texture bigger than the whole cache is still kept until the next one is stored
+            texture_cache.load('d', lambda: Image.new('RGBA', (64, 64)))
+            self.assertListEqual(sorted(texture_file.name for texture_file in cache_dir.iterdir()), ['d.raw'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+from .context import atlas
+
+import unittest
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+from pathlib import Path
+from PIL import Image
+from tempfile import TemporaryDirectory
+
+
+def icon(color: tuple, size: tuple = (48, 40)) -> Image.Image:
+    return Image.new('RGBA', size, color)
+
+
+class AtlasTestCase(unittest.TestCase):
+
+    def test_pack_icons(self):
+        icons = {
+            'red': icon((255, 0, 0, 255)),
+            'green': icon((0, 255, 0, 255)),
+            'red-copy': icon((255, 0, 0, 255)),
+            'blue': icon((0, 0, 255, 255)),
+            'small-blue': icon((0, 0, 255, 255), (32, 32)),
+            'white': icon((255, 255, 255, 255), (64, 64)),
+        }
+        atlas_image, positions = atlas.pack_icons(icons)
+        # 5 distinct icons fit into 3x2 cells instead of a square of 3x3
+        self.assertEqual(atlas_image.size, (192, 128))
+        self.assertDictEqual(positions, {
+            'red': '-0px -0px',
+            'green': '-64px -0px',
+            'red-copy': '-0px -0px',
+            'blue': '-128px -0px',
+            'small-blue': '-0px -64px',
+            'white': '-64px -64px',
+        })
+        # icons are centered in their cells
+        self.assertEqual(atlas_image.getpixel((8, 12)), (255, 0, 0, 255))
+        self.assertEqual(atlas_image.getpixel((7, 12)), (0, 0, 0, 0))
+        self.assertEqual(atlas_image.getpixel((16, 80)), (0, 0, 255, 255))
+        self.assertEqual(atlas_image.getpixel((15, 80)), (0, 0, 0, 0))
+        self.assertEqual(atlas_image.getpixel((127, 127)), (255, 255, 255, 255))
+
+    def test_load_icons(self):
+        with TemporaryDirectory() as image_dir:
+            image_dir = Path(image_dir)
+            icon((255, 0, 0, 255), (256, 128)).save(image_dir / 'wide.png')
+            icon((0, 255, 0, 255), (32, 32)).convert('RGB').save(image_dir / 'small.jpg')
+            (image_dir / 'broken.png').write_bytes(b'broken')
+            image_files = {'wide': image_dir / 'wide.png', 'wide-copy': image_dir / 'wide.png', 'small': image_dir / 'small.jpg', 'broken': image_dir / 'broken.png'}
+            for workers, batch_size in [(1, 32), (3, 1)]:
+                with self.subTest(f'icons should be decoded by {workers} workers in batches of {batch_size}'):
+                    with redirect_stdout(StringIO()) as output:
+                        icons = atlas.load_icons(image_files, workers, batch_size)
+                    self.assertListEqual(list(icons), ['wide', 'wide-copy', 'small'])
+                    self.assertIn('broken.png', output.getvalue())
+                    # bigger images are scaled down into a cell keeping their aspect ratio, smaller ones are kept
+                    self.assertEqual(icons['wide'].size, (64, 32))
+                    self.assertEqual(icons['wide'].mode, 'RGBA')
+                    self.assertIs(icons['wide-copy'], icons['wide'])
+                    self.assertEqual(icons['small'].size, (32, 32))
+
+    def test_encode_atlas(self):
+        atlas_image, _ = atlas.pack_icons({f'icon-{i}': icon((i, 255 - i, i // 2, 255)) for i in range(0, 256, 16)})
+        for atlas_format in sorted(atlas.ATLAS_FORMATS):
+            with self.subTest(f'{atlas_format} atlas should be lossless without a size budget'):
+                with Image.open(BytesIO(atlas.encode_atlas(atlas_image, atlas_format))) as decoded:
+                    self.assertEqual(decoded.convert('RGBA').tobytes(), atlas_image.tobytes())
+
+        noise = Image.effect_noise((96, 96), 64).convert('RGBA')
+        lossless = atlas.encode_atlas(noise, 'webp')
+        self.assertLessEqual(len(atlas.encode_atlas(noise, 'webp', len(lossless) // 2)), len(lossless) // 2)
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertGreater(len(atlas.encode_atlas(noise, 'png', 16)), 16)
+        self.assertIn('does not fit into 16 bytes', output.getvalue())
+        with self.assertRaises(ValueError):
+            atlas.encode_atlas(noise, 'gif')
+
+    def test_encode_atlases(self):
+        atlas_image, _ = atlas.pack_icons({'red': icon((255, 0, 0, 255)), 'green': icon((0, 255, 0, 255))})
+        encoded = atlas.encode_atlases(atlas_image, ['png', 'webp'], [1, 0.5, 2], workers=4)
+        self.assertListEqual(list(encoded.keys()), ['icons.png', 'icons.webp', 'icons@0.5x.png', 'icons@0.5x.webp', 'icons@2x.png', 'icons@2x.webp'])
+        for atlas_file, size in [('icons.png', (128, 64)), ('icons@0.5x.webp', (64, 32)), ('icons@2x.png', (256, 128))]:
+            with Image.open(BytesIO(encoded[atlas_file])) as decoded:
+                self.assertEqual(decoded.size, size)
+        self.assertEqual(atlas.encode_atlases(atlas_image), {'icons.png': atlas.encode_atlas(atlas_image, 'png')})
+
+
+    def test_scale_atlas(self):
+        # icons filling their cells, any filter over the whole atlas would blend them at the borders
+        colors = [(255, 0, 0, 255), (0, 255, 0, 255), (0, 0, 255, 255), (255, 255, 255, 255), (0, 0, 0, 255)]
+        atlas_image, positions = atlas.pack_icons({f'icon-{i}': icon(color, (64, 64)) for i, color in enumerate(colors)})
+        for scale in [0.5, 0.3, 1.5, 2]:
+            with self.subTest(f'cells scaled {scale:g}x should contain only their own icon'):
+                scaled = atlas.scale_atlas(atlas_image, scale)
+                cell_size = round(64 * scale)
+                self.assertEqual(scaled.size, (3 * cell_size, 2 * cell_size))
+                for i, color in enumerate(colors):
+                    row, column = divmod(i, 3)
+                    self.assertEqual(positions[f'icon-{i}'], f'-{column * 64}px -{row * 64}px')
+                    cell = scaled.crop((column * cell_size, row * cell_size, (column + 1) * cell_size, (row + 1) * cell_size))
+                    self.assertListEqual(cell.getcolors(), [(cell_size * cell_size, color)])
+                # the empty cell stays transparent
+                self.assertEqual(scaled.crop((2 * cell_size, cell_size, 3 * cell_size, 2 * cell_size)).getbbox(), None)
+        self.assertEqual(atlas.scale_atlas(Image.new('RGBA', (1, 1)), 2).size, (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+from .context import cache
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+
+class ExportCacheTestCase(unittest.TestCase):
+
+    def test_load(self):
+        with TemporaryDirectory() as work_dir:
+            source = Path(work_dir) / 'Items.xml'
+            source.write_text('<Items />')
+            loads = list()
+
+            def loader():
+                loads.append(source.read_text())
+                return len(loads)
+
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache')
+            self.assertEqual(export_cache.load('items', [source], loader), 1)
+            self.assertEqual(export_cache.load('items', [source], loader), 1)
+
+            # same size and content with a new modification time
+            os.utime(source, ns=(source.stat().st_atime_ns, source.stat().st_mtime_ns + 1000000))
+            self.assertEqual(export_cache.load('items', [source], loader), 1)
+            self.assertEqual(cache.ExportCache(Path(work_dir) / 'cache').load('items', [source], loader), 1)
+
+            source.write_text('<Item />')
+            self.assertEqual(export_cache.load('items', [source], loader), 2)
+            self.assertEqual(export_cache.load('other', [source], loader), 3)
+            self.assertEqual(cache.ExportCache(Path(work_dir) / 'cache', False).load('items', [source], loader), 4)
+            self.assertEqual(export_cache.hits, 2)
+            self.assertEqual(export_cache.misses, 3)
+
+    def test_load_directory(self):
+        with TemporaryDirectory() as work_dir:
+            sources = Path(work_dir) / 'assets'
+            sources.mkdir()
+            (sources / 'sharedassets0.assets').write_bytes(b'assets')
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache')
+            self.assertEqual(export_cache.load('icons', [sources], lambda: 1, hash_contents=False), 1)
+            self.assertEqual(export_cache.load('icons', [sources], lambda: 2, hash_contents=False), 1)
+            (sources / 'sharedassets1.assets').write_bytes(b'more assets')
+            self.assertEqual(export_cache.load('icons', [sources], lambda: 3, hash_contents=False), 3)
+
+    def test_prune(self):
+        with TemporaryDirectory() as work_dir:
+            source = Path(work_dir) / 'Items.xml'
+            source.write_text('<Items />')
+            cache_dir = Path(work_dir) / 'cache'
+            export_cache = cache.ExportCache(cache_dir)
+            for kind in ['items', 'icons-png-1', 'icons-png-1-0123456789abcdef', 'icons-webp-1']:
+                export_cache.load(kind, [source], lambda: kind)
+            self.assertEqual(export_cache.prune('icons-'), 0)
+
+            # the entries of the kinds a following export does not use are removed, other kinds are kept
+            export_cache = cache.ExportCache(cache_dir)
+            self.assertEqual(export_cache.load('icons-png-1', [source], lambda: None), 'icons-png-1')
+            self.assertEqual(cache.ExportCache(cache_dir, False).prune('icons-'), 0)
+            self.assertEqual(export_cache.prune('icons-'), 2)
+            self.assertListEqual(sorted(entry_file.name.rpartition('-')[0] for entry_file in cache_dir.glob('*.pickle')), ['icons-png-1', 'items'])
+            self.assertEqual(cache.ExportCache(Path(work_dir) / 'missing').prune('icons-'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
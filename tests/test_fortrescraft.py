@@ -0,0 +1,357 @@
+from .context import analysis, assets, fortrescraft, cache, images, profiling, watch, wiki
+from .synthetic import generate_game_data
+
+import json
+import shutil
+import tracemalloc
+import unittest
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+from PIL import Image
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Optional, Tuple, Union
+from unittest import mock
+
+
+def fake_game_icons(game_data: Path, icons_config: Dict[str, Tuple[int, int]], index_file: Path = assets.DEFAULT_ASSET_INDEX, texture_cache: Optional['assets.TextureCache'] = None, icons: Optional[Dict[str, Image.Image]] = None) -> Tuple[Image.Image, Dict[str, str]]:
+    # given icons are placed into a row below the BlockPreview ones
+    positions = {icon_name: f'-{col}px -{row}px' for icon_name, (row, col) in icons_config.items()}
+    positions.update((icon_name, f'-{col}px -30px') for col, icon_name in enumerate(icons or dict()))
+    return Image.new('RGBA', (64, 64)), positions
+
+
+class FortressCraftTestCase(unittest.TestCase):
+
+    TEST_DATA = Path(__file__).parent / 'data'
+
+    GAME_DATA = TEST_DATA / 'game'
+
+    EXPORT_DATA = TEST_DATA / 'game_export'
+
+    OUTPUT_FILES = ['data.json', 'hash.json', 'icons.json']
+
+    def test_create_object_id(self):
+        test_cases = [
+            ('copper-ore', 'CopperOre'),
+            ('lightweight-machine-housing', 'LightweightMachineHousing'),
+            ('hodor', 'HODOR'),
+            ('bfl-9000', 'BFL9000'),
+            ('crafting-ingredient', 'Crafting Ingredient'),
+            ('missing-id-0', None),
+            ('missing-id-1', ''),
+            ]
+        id_converter = fortrescraft.IdConverter()
+        for i, (object_id, object_key) in enumerate(test_cases):
+            with self.subTest(f'{i}: "{object_id}" is id of "{object_key}"'):
+                self.assertEqual(id_converter.create_object_id(object_key), object_id)
+
+    def test_extract_items(self):
+        expected = json.loads((self.EXPORT_DATA / 'items.json').read_text())
+        id_converter = fortrescraft.IdConverter()
+        self.assertListEqual([[key, item.to_json(), category.to_json()] for key, item, category in fortrescraft.extract_terrain(self.GAME_DATA, id_converter)], expected['terrain'])
+        self.assertListEqual([[key, item.to_json(), category.to_json()] for key, item, category in fortrescraft.extract_items(self.GAME_DATA, id_converter)], expected['items'])
+
+    def test_extract_items_memory(self):
+        with TemporaryDirectory() as game_data:
+            game_data = Path(game_data)
+            item_entries = ''.join(f'<ItemData><ItemID>{i}</ItemID><Key>Item{i}</Key><Name>Item {i}</Name><Category>Crafting Ingredient</Category><Type>ItemStack</Type></ItemData>' for i in range(20000))
+            (game_data / 'Items.xml').write_text(f'<ArrayOfItemData>{item_entries}</ArrayOfItemData>')
+            tracemalloc.start()
+            try:
+                for _ in fortrescraft.extract_items(game_data, fortrescraft.IdConverter()):
+                    pass
+                _, peak_memory = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        # the whole document tree would take over 15MB
+        self.assertLess(peak_memory, 1 << 20)
+
+    def export(self, game_data: Path, output_dir: Path, export_cache: 'cache.ExportCache', jobs: int = 1, profiler: Optional['profiling.Profiler'] = None):
+        assets_data = output_dir.parent / 'assets'
+        assets_data.mkdir(exist_ok=True)
+        with mock.patch.object(fortrescraft, 'game_icons', fake_game_icons):
+            fortrescraft.export(game_data, output_dir, export_cache, assets_data, jobs, profiler=profiler)
+
+    def assertExported(self, output_dir: Path):
+        for output_file in self.OUTPUT_FILES:
+            with self.subTest(f'{output_file} should match the reference export'):
+                self.assertEqual((output_dir / output_file).read_text(), (self.EXPORT_DATA / output_file).read_text())
+
+    def test_export(self):
+        with TemporaryDirectory() as work_dir:
+            output_dir = Path(work_dir) / 'output'
+            output_dir.mkdir()
+            self.export(self.GAME_DATA, output_dir, cache.ExportCache(Path(work_dir) / 'cache', False))
+            self.assertExported(output_dir)
+
+    def test_export_parallel(self):
+        with TemporaryDirectory() as work_dir:
+            output_dir = Path(work_dir) / 'output'
+            output_dir.mkdir()
+            self.export(self.GAME_DATA, output_dir, cache.ExportCache(Path(work_dir) / 'cache'), jobs=2)
+            self.assertExported(output_dir)
+
+    def test_export_synthetic(self):
+        with TemporaryDirectory() as work_dir:
+            game_data = Path(work_dir) / 'game'
+            counts = generate_game_data(game_data, 2)
+            for jobs in [1, 2]:
+                with self.subTest(f'synthetic game data should be exported with {jobs} jobs'):
+                    output_dir = Path(work_dir) / f'output-{jobs}'
+                    output_dir.mkdir()
+                    with redirect_stdout(StringIO()) as output:
+                        self.export(game_data, output_dir, cache.ExportCache(Path(work_dir) / 'cache', False), jobs)
+                    factoriolab_hash = json.loads((output_dir / 'hash.json').read_text())
+                    self.assertEqual(len(factoriolab_hash['factories']), counts['machines'])
+                    self.assertIn(f'Unresolved item keys ({counts["missing"]}):', output.getvalue())
+                    self.assertEqual((output_dir / 'data.json').read_text(), (Path(work_dir) / 'output-1' / 'data.json').read_text())
+
+    def test_export_profile(self):
+        with TemporaryDirectory() as work_dir:
+            output_dir = Path(work_dir) / 'output'
+            output_dir.mkdir()
+            with profiling.Profiler() as profiler:
+                self.export(self.GAME_DATA, output_dir, cache.ExportCache(Path(work_dir) / 'cache', False), profiler=profiler)
+            self.assertExported(output_dir)
+            report = profiler.report()
+            stages = {stage['name']: stage for stage in report['stages']}
+            self.assertListEqual(list(stages), ['game-items', 'recipe-sets', 'parse', 'resolve', 'icons', 'write'])
+            self.assertListEqual([stage['name'] for stage in stages['game-items']['stages']], ['terrain', 'items'])
+            self.assertListEqual([stage['name'] for stage in stages['parse']['stages']], ['recipes', 'autocrafters'])
+            self.assertListEqual([stage['name'] for stage in stages['icons']['stages']], ['sprites', 'encode'])
+            self.assertListEqual([stage['name'] for stage in stages['write']['stages']], ['icons.png', 'icons.json', 'data.json', 'hash.json', 'commit'])
+            self.assertGreater(stages['write']['peak_memory'], 0)
+            self.assertLessEqual(sum(stage['wall_time'] for stage in report['stages']), report['wall_time'])
+
+    def test_export_overlay(self):
+        with TemporaryDirectory() as work_dir:
+            overlay = Path(work_dir) / 'overlay'
+            (overlay / 'GenericAutoCrafter').mkdir(parents=True)
+            coiler = (self.GAME_DATA / 'GenericAutoCrafter' / 'CoilerPlant.xml').read_text()
+            (overlay / 'GenericAutoCrafter' / 'CoilerPlant.xml').write_text(coiler.replace('<CraftedAmount>4</CraftedAmount>', '<CraftedAmount>8</CraftedAmount>'))
+            assets_data = Path(work_dir) / 'assets'
+            assets_data.mkdir()
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache')
+            pipeline = fortrescraft.ExportPipeline(export_cache)
+            with mock.patch.object(fortrescraft, 'game_icons', fake_game_icons):
+                pipeline.export(self.GAME_DATA, Path(work_dir) / 'overlay-output', assets_data, [overlay])
+                misses = export_cache.misses
+                pipeline.export(self.GAME_DATA, Path(work_dir) / 'output', assets_data)
+            # only the replaced auto crafter file is parsed again, the shared items are not changed by the overlay
+            self.assertEqual(export_cache.misses, misses + 1)
+            self.assertEqual(export_cache.hits, 0)
+            self.assertExported(Path(work_dir) / 'output')
+            recipes = {recipe['id']: recipe for recipe in json.loads((Path(work_dir) / 'overlay-output' / 'data.json').read_text())['recipes']}
+            self.assertDictEqual(recipes['copper-wire-coiler-plant']['out'], {'copper-wire': 8})
+            self.assertEqual((Path(work_dir) / 'overlay-output' / 'hash.json').read_text(), (self.EXPORT_DATA / 'hash.json').read_text())
+
+    def test_export_wiki_icons(self):
+        wiki_image_url = 'https://static.wikia.nocookie.net/fortresscrafte/images/0/00/{}/revision/latest?cb=20160721235534'
+        wiki_image_names = {wiki_image_url.format(image_name): {image_name} for image_name in ['Iron_Gear.png', 'Copper_Wire.png', 'Coiler-plant.jpg', 'Site-logo.png']}
+
+        def fetch_image(image_url: str) -> bytes:
+            image_content = BytesIO()
+            Image.new('RGB', (128, 128), (len(image_url), 0, 0)).save(image_content, format='JPEG' if image_url.endswith('.jpg') else 'PNG')
+            return image_content.getvalue()
+
+        with TemporaryDirectory() as work_dir:
+            wiki_images = Path(work_dir) / 'wiki'
+            wiki.download_images(wiki_image_names, wiki_images, fetch_image)
+            output_dir = Path(work_dir) / 'output'
+            assets_data = Path(work_dir) / 'assets'
+            assets_data.mkdir()
+            packed_icons = list()
+
+            def recorded_game_icons(*args, icons: Optional[Dict[str, Image.Image]] = None, **kwargs) -> Tuple[Image.Image, Dict[str, str]]:
+                packed_icons.append(icons)
+                return fake_game_icons(*args, icons=icons, **kwargs)
+
+            with profiling.Profiler() as profiler:
+                pipeline = fortrescraft.ExportPipeline(cache.ExportCache(Path(work_dir) / 'cache'), jobs=2, profiler=profiler, wiki_images=wiki_images)
+                with mock.patch.object(fortrescraft, 'game_icons', recorded_game_icons), redirect_stdout(StringIO()) as output:
+                    pipeline.export(self.GAME_DATA, output_dir, assets_data)
+                    pipeline.export(self.GAME_DATA, output_dir, assets_data)
+            self.assertIn('Wiki images matched: 3 of 14 items', output.getvalue())
+            # the matched images are decoded and scaled down once, the BlockPreview icons are left to the other items
+            self.assertEqual(len(packed_icons), 1)
+            self.assertListEqual(list(packed_icons[0]), ['iron-gear', 'copper-wire', 'coiler-plant'])
+            self.assertTrue(all(icon.size == (64, 64) for icon in packed_icons[0].values()))
+            self.assertIn(wiki_images / images.IMAGE_MANIFEST, pipeline.dependencies(output_dir))
+            stages = {stage['name']: stage for stage in profiler.report()['stages']}
+            self.assertListEqual([stage['name'] for stage in stages['icons']['stages']], ['match', 'decode', 'sprites', 'encode'])
+
+            factoriolab_icons = json.loads((output_dir / 'icons.json').read_text())
+            reference_icons = json.loads((self.EXPORT_DATA / 'icons.json').read_text())
+            # icons.json keeps the BlockPreview cells, the items drawn from wiki images are only positioned by data.json
+            wiki_icon_names = ['iron-gear', 'copper-wire', 'coiler-plant']
+            self.assertEqual(reference_icons['icons']['iron-gear'], {'row': 14, 'col': 28})
+            self.assertDictEqual(factoriolab_icons, dict(reference_icons, icons={icon_name: cell for icon_name, cell in reference_icons['icons'].items() if icon_name not in wiki_icon_names}))
+            positions = {icon['id']: icon['position'] for icon in json.loads((output_dir / 'data.json').read_text())['icons']}
+            self.assertDictEqual({icon_name: positions[icon_name] for icon_name in wiki_icon_names}, {'iron-gear': '-0px -30px', 'copper-wire': '-1px -30px', 'coiler-plant': '-2px -30px'})
+
+            # the icons rendered with the wiki images are pruned once no data set uses them
+            self.assertEqual(pipeline.prune_cache(), 0)
+            pipeline = fortrescraft.ExportPipeline(cache.ExportCache(Path(work_dir) / 'cache'))
+            with mock.patch.object(fortrescraft, 'game_icons', fake_game_icons):
+                pipeline.export(self.GAME_DATA, output_dir, assets_data)
+            self.assertEqual(pipeline.prune_cache(), 1)
+            self.assertEqual(len(list((Path(work_dir) / 'cache').glob(f'{fortrescraft.ICONS_CACHE_KIND}-*.pickle'))), 1)
+
+    def test_update_exports(self):
+        with TemporaryDirectory() as work_dir:
+            game_data = Path(work_dir) / 'game'
+            shutil.copytree(self.GAME_DATA, game_data)
+            output_dir = Path(work_dir) / 'output'
+            assets_data = Path(work_dir) / 'assets'
+            assets_data.mkdir()
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache')
+            pipeline = fortrescraft.ExportPipeline(export_cache)
+            datasets = [(output_dir, game_data, assets_data, [])]
+            with mock.patch.object(fortrescraft, 'game_icons', fake_game_icons):
+                pipeline.export(game_data, output_dir, assets_data)
+                watcher = watch.FileWatcher(pipeline.dependencies(output_dir))
+                self.assertIn(game_data / 'Recipes' / 'SmelterRecipes.xml', pipeline.dependencies(output_dir))
+                self.assertDictEqual(fortrescraft.update_exports(pipeline, datasets, watcher), {})
+                misses = export_cache.misses
+
+                coiler = game_data / 'GenericAutoCrafter' / 'CoilerPlant.xml'
+                coiler_content = coiler.read_text()
+                coiler.write_text(coiler_content.replace('<CraftedAmount>4</CraftedAmount>', '<CraftedAmount>16</CraftedAmount>'))
+                self.assertDictEqual(fortrescraft.update_exports(pipeline, datasets, watcher), {output_dir: ['data.json', 'data.json.gz']})
+                # only the changed file is parsed again
+                self.assertEqual(export_cache.misses, misses + 1)
+                recipes = {recipe['id']: recipe for recipe in json.loads((output_dir / 'data.json').read_text())['recipes']}
+                self.assertDictEqual(recipes['copper-wire-coiler-plant']['out'], {'copper-wire': 16})
+
+                # a file saved halfway keeps the previous outputs
+                coiler.write_text(coiler_content[:100])
+                with redirect_stdout(StringIO()) as output:
+                    self.assertDictEqual(fortrescraft.update_exports(pipeline, datasets, watcher), {})
+                self.assertIn('failed', output.getvalue())
+                coiler.write_text(coiler_content)
+                # new auto crafter files are exported too
+                (game_data / 'GenericAutoCrafter' / 'FuelCompressor.xml').rename(game_data / 'GenericAutoCrafter' / 'FuelCompressorMk2.xml')
+                self.assertIn(output_dir, fortrescraft.update_exports(pipeline, datasets, watcher))
+                self.assertIn(game_data / 'GenericAutoCrafter' / 'FuelCompressorMk2.xml', pipeline.dependencies(output_dir))
+            self.assertExported(output_dir)
+
+    def test_watch_exports_workers(self):
+        with TemporaryDirectory() as work_dir:
+            game_data = Path(work_dir) / 'game'
+            shutil.copytree(self.GAME_DATA, game_data)
+            output_dir = Path(work_dir) / 'output'
+            assets_data = Path(work_dir) / 'assets'
+            assets_data.mkdir()
+            pipeline = fortrescraft.ExportPipeline(cache.ExportCache(Path(work_dir) / 'cache'), jobs=2)
+            datasets = [(output_dir, game_data, assets_data, [])]
+            coiler = game_data / 'GenericAutoCrafter' / 'CoilerPlant.xml'
+            coiler_content = coiler.read_text()
+            crafted_amounts = iter(['16', '4'])
+
+            def change_coiler(interval: float) -> None:
+                # every sleep of the watch loop changes the file, the loop stops once all changes are exported
+                crafted_amount = next(crafted_amounts, None)
+                if crafted_amount is None:
+                    raise KeyboardInterrupt
+                coiler.write_text(coiler_content.replace('<CraftedAmount>4</CraftedAmount>', f'<CraftedAmount>{crafted_amount}</CraftedAmount>'))
+
+            with mock.patch.object(fortrescraft, 'game_icons', fake_game_icons):
+                pipeline.export(game_data, output_dir, assets_data)
+                with mock.patch.object(fortrescraft, 'ProcessPoolExecutor', wraps=fortrescraft.ProcessPoolExecutor) as executor, mock.patch.object(fortrescraft.time, 'sleep', change_coiler):
+                    with redirect_stdout(StringIO()) as output:
+                        fortrescraft.watch_exports(pipeline, datasets, 0)
+            # a single pool parses the changed files of the whole watch session
+            executor.assert_called_once_with(2)
+            self.assertEqual(output.getvalue().count(f'Updated {output_dir}'), 2)
+            self.assertExported(output_dir)
+
+    def test_watch_exports_initial_changes(self):
+        with TemporaryDirectory() as work_dir:
+            game_data = Path(work_dir) / 'game'
+            shutil.copytree(self.GAME_DATA, game_data)
+            output_dir = Path(work_dir) / 'output'
+            assets_data = Path(work_dir) / 'assets'
+            assets_data.mkdir()
+            pipeline = fortrescraft.ExportPipeline(cache.ExportCache(Path(work_dir) / 'cache'))
+            datasets = [(output_dir, game_data, assets_data, [])]
+            coiler = game_data / 'GenericAutoCrafter' / 'CoilerPlant.xml'
+            write_outputs = fortrescraft.write_outputs
+
+            def save_during_export(*args, **kwargs) -> None:
+                # the file is saved after it was parsed, while the first export writes its outputs
+                coiler.write_text(coiler.read_text().replace('<CraftedAmount>4</CraftedAmount>', '<CraftedAmount>16</CraftedAmount>'))
+                write_outputs(*args, **kwargs)
+
+            with mock.patch.object(fortrescraft, 'game_icons', fake_game_icons):
+                with mock.patch.object(fortrescraft, 'write_outputs', save_during_export):
+                    pipeline.export(game_data, output_dir, assets_data)
+                recipes = {recipe['id']: recipe for recipe in json.loads((output_dir / 'data.json').read_text())['recipes']}
+                self.assertDictEqual(recipes['copper-wire-coiler-plant']['out'], {'copper-wire': 4})
+                with mock.patch.object(fortrescraft.time, 'sleep', side_effect=[None, KeyboardInterrupt]), redirect_stdout(StringIO()) as output:
+                    fortrescraft.watch_exports(pipeline, datasets, 0)
+            self.assertIn(f'Updated {output_dir}', output.getvalue())
+            recipes = {recipe['id']: recipe for recipe in json.loads((output_dir / 'data.json').read_text())['recipes']}
+            self.assertDictEqual(recipes['copper-wire-coiler-plant']['out'], {'copper-wire': 16})
+
+    def test_export_analysis(self):
+        with TemporaryDirectory() as work_dir:
+            game_data = Path(work_dir) / 'game'
+            shutil.copytree(self.GAME_DATA, game_data)
+            output_dir = Path(work_dir) / 'output'
+            assets_data = Path(work_dir) / 'assets'
+            assets_data.mkdir()
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache', False)
+            with mock.patch.object(fortrescraft, 'game_icons', fake_game_icons), redirect_stdout(StringIO()) as output:
+                fortrescraft.ExportPipeline(export_cache, analysis=True, steady_states=[('copper-wire', 2)]).export(game_data, output_dir, assets_data)
+                self.assertIn('Recipe graph: 14 items, 6 recipes', output.getvalue())
+                self.assertExported(output_dir)
+                baseline = json.loads((output_dir / 'analysis.json').read_text())
+                self.assertListEqual(baseline['missing_producers'], ['empty-fuel-canister'])
+                self.assertAlmostEqual(baseline['steady_states']['copper-wire']['inputs']['copper-ore'], 8)
+
+                # the copper bars are no longer made
+                smelter = game_data / 'Recipes' / 'SmelterRecipes.xml'
+                smelter.write_text(smelter.read_text().replace('<CraftedKey>CopperBar</CraftedKey>', '<CraftedKey>IronBar</CraftedKey>'))
+                data = (output_dir / 'data.json').read_text()
+                with self.assertRaises(analysis.RecipeGraphRegression) as regression:
+                    fortrescraft.ExportPipeline(export_cache, analysis_baseline=baseline).export(game_data, output_dir, assets_data)
+                self.assertDictEqual(regression.exception.regressions, {
+                    'missing_producers': ['copper-bar'],
+                    'unreachable_items': ['copper-wire', 'lightweight-machine-housing'],
+                    'unreachable_recipes': ['copper-wire-coiler-plant', 'lightweight-machine-housing-manufacturer']
+                })
+                self.assertEqual((output_dir / 'data.json').read_text(), data)
+
+    def test_export_cache(self):
+        with TemporaryDirectory() as work_dir:
+            game_data = Path(work_dir) / 'game'
+            shutil.copytree(self.GAME_DATA, game_data)
+            output_dir = Path(work_dir) / 'output'
+            output_dir.mkdir()
+
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache')
+            self.export(game_data, output_dir, export_cache)
+            self.assertExported(output_dir)
+            self.assertEqual(export_cache.hits, 0)
+
+            # warm export, touched files with the same content are not parsed again
+            (game_data / 'Recipes' / 'SmelterRecipes.xml').touch()
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache')
+            with mock.patch.object(fortrescraft.ET, 'iterparse', side_effect=AssertionError('Game file parsed again')):
+                self.export(game_data, output_dir, export_cache)
+            self.assertExported(output_dir)
+            self.assertEqual(export_cache.misses, 0)
+
+            # only changed files are parsed again
+            receipe_file = game_data / 'Recipes' / 'ManufacturerRecipes.xml'
+            receipe_file.write_text(receipe_file.read_text().replace('<Amount>4</Amount>', '<Amount>5</Amount>'))
+            export_cache = cache.ExportCache(Path(work_dir) / 'cache')
+            self.export(game_data, output_dir, export_cache)
+            self.assertEqual(export_cache.misses, 1)
+            recipes = {recipe['id']: recipe for recipe in json.loads((output_dir / 'data.json').read_text())['recipes']}
+            self.assertDictEqual(recipes['lightweight-machine-housing-manufacturer']['in'], {'iron-gear': 5, 'copper-wire': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
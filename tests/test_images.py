@@ -0,0 +1,41 @@
+from .context import images
+
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+
+class ImagesTestCase(unittest.TestCase):
+
+    def test_image_name_key(self):
+        test_cases = [
+            ('iron gear', 'Iron_Gear.png'),
+            ('iron gear', 'Iron%20Gear.PNG'),
+            ('iron gear', 'iron-gear'),
+            ('t3 ore extractor', 'T3 Ore Extractor'),
+            ('cargo lift 1', 'Cargo-lift-1.jpg'),
+            ('', '%20_'),
+            ]
+        for image_key, image_name in test_cases:
+            with self.subTest(f'"{image_name}" has the key "{image_key}"'):
+                self.assertEqual(images.image_name_key(image_name), image_key)
+
+    def test_image_name_index(self):
+        manifest = {
+            'https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest?cb=20160721235534': {'file': 'objects/aa/aa.png', 'sha256': 'aa', 'names': ['Iron Gear', 'Iron_Gear.png']},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/2/27/Cargo-lift-1.jpg/revision/latest?cb=20160711213019': {'file': 'objects/bb/bb.jpg', 'sha256': 'bb', 'names': ['Cargo-lift-1.jpg']},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/9/99/Iron-gear.png/revision/latest?cb=20160721235534': {'file': 'objects/cc/cc.png', 'sha256': 'cc', 'names': ['Iron-gear.png']},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/0/00/Map.svg/revision/latest?cb=20160721235534': {'file': 'objects/dd/dd.svg', 'sha256': 'dd', 'names': ['Map.svg']},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/0/01/Blank.png/revision/latest?cb=20160721235534': {'file': 'objects/ee/ee.png', 'sha256': 'ee', 'names': ['_.png']}
+        }
+        with TemporaryDirectory() as images_dir:
+            images_dir = Path(images_dir)
+            self.assertDictEqual(images.image_name_index(images_dir), dict())
+            (images_dir / images.IMAGE_MANIFEST).write_text(json.dumps(manifest))
+            # a name shared by several images keeps the image with the first URL, images Pillow cannot decode and empty names are left out
+            self.assertDictEqual(images.image_name_index(images_dir), {'iron gear': images_dir / 'objects/cc/cc.png', 'cargo lift 1': images_dir / 'objects/bb/bb.jpg'})
+
+
+if __name__ == '__main__':
+    unittest.main()
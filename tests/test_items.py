@@ -0,0 +1,79 @@
+from .context import items, model
+
+import io
+import unittest
+from contextlib import redirect_stdout
+
+
+def item(item_id: str, name: str) -> 'model.Item':
+    return model.Item(item_id, name, 'intermediate-products', 1, 200)
+
+
+class ItemIndexTestCase(unittest.TestCase):
+
+    ITEMS = [
+        ('copperbar', item('copper-bar', 'Copper Bar'), {}),
+        ('coalore', item('coal-ore', 'Coal Ore'), {}),
+        ('enrichedcoal', item('enriched-coal', 'Enriched Coal'), {}),
+        ('emptyfuelcanister', item('empty-fuel-canister', 'Fuel Canister'), {}),
+        ('plasmacutterhead', item('plasma-cutter-head', 'Plasma Cutter Head'), {}),
+        ('lensitem', item('lens-item', 'Crystal Lens'), {}),
+    ]
+
+    def test_normalize_key(self):
+        test_cases = [
+            ('copperbar', 'Copper Bar'),
+            ('copperbar', 'copper-bar'),
+            ('copperbar', 'Copper_Bar'),
+            ('fuelcanisterkey', 'Fuel - Canister - Key'),
+            ('hodor', 'HODOR'),
+        ]
+        for i, (normalized_key, key) in enumerate(test_cases):
+            with self.subTest(f'{i}: "{normalized_key}" is normalized "{key}"'):
+                self.assertEqual(items.normalize_key(key), normalized_key)
+
+    def test_get(self):
+        item_index = items.ItemIndex(self.ITEMS)
+        test_cases = [
+            ('copper-bar', 'copperbar'),
+            ('copper-bar', 'CopperBar'),
+            ('copper-bar', 'Copper Bar'),
+            ('coal-ore', 'Coal'),
+            ('enriched-coal', 'CoalEnrichment'),
+            ('empty-fuel-canister', 'Fuel-Canister-Key'),
+            ('plasma-cutter-head', 'ChargedPlasmaHead'),
+            ('lens-item', 'Crystal Lens'),
+            (None, 'Unobtainium'),
+        ]
+        for i, (item_id, key) in enumerate(test_cases):
+            with self.subTest(f'{i}: "{key}" is key of "{item_id}"'):
+                object = item_index.get(key)
+                self.assertEqual(object.id if object else None, item_id)
+        self.assertIn('Copper Bar', item_index)
+        self.assertNotIn('Unobtainium', item_index)
+
+    def test_aliases(self):
+        item_index = items.ItemIndex(self.ITEMS, {'lens': 'Crystal Lens', 'dangling': 'Unobtainium'})
+        self.assertEqual(item_index.get('Lens').id, 'lens-item')
+        self.assertIsNone(item_index.get('Dangling'))
+        self.assertIsNone(item_index.get('Coal'))
+
+    def test_unresolved(self):
+        item_index = items.ItemIndex(self.ITEMS)
+        self.assertEqual(item_index.resolve('Copper Bar', 'Smelter.xml').id, 'copper-bar')
+        self.assertIsNone(item_index.resolve('Unobtainium', 'Smelter.xml'))
+        self.assertIsNone(item_index.resolve('Unobtainium', 'Compressor.xml'))
+        self.assertIsNone(item_index.resolve('Missing Item', 'Compressor.xml'))
+        self.assertIsNone(item_index.resolve('Unobtainium', 'Smelter.xml'))
+        self.assertDictEqual(item_index.unresolved, {
+            'Missing Item': ['Compressor.xml'],
+            'Unobtainium': ['Compressor.xml', 'Smelter.xml'],
+        })
+        output = io.StringIO()
+        with redirect_stdout(output):
+            item_index.report()
+        self.assertEqual(output.getvalue(), 'Unresolved item keys (2):\n  Missing Item: Compressor.xml\n  Unobtainium: Compressor.xml, Smelter.xml\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
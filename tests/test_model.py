@@ -0,0 +1,38 @@
+from .context import model
+
+import json
+import unittest
+
+
+class ModelTestCase(unittest.TestCase):
+
+    def test_item(self):
+        item = model.Item('copper-bar', 'Copper Bar', 'crafting-ingredient', 1, 200)
+        self.assertFalse(hasattr(item, '__dict__'))
+        self.assertEqual(json.dumps(item.to_json()), '{"category": "crafting-ingredient", "id": "copper-bar", "name": "Copper Bar", "row": 1, "stack": 200}')
+        factory = item.to_json(True)
+        self.assertListEqual(list(factory), ['category', 'id', 'name', 'row', 'stack', 'factory'])
+        # every factory gets its own details
+        factory["factory"]["speed"] = 2
+        self.assertEqual(item.to_json(True)["factory"], model.FACTORY)
+
+    def test_recipe(self):
+        recipe = model.Recipe('copper-wire-coiler-plant', 'Copper Wire (Coiler Plant)', 12.0, 1.5, {'copper-bar': 1, 'tin-bar': 2}, {'copper-wire': 4}, 'coiler-plant', 0, 'crafting-ingredient')
+        self.assertFalse(hasattr(recipe, '__dict__'))
+        self.assertTupleEqual(recipe.inputs, ('copper-bar', 'tin-bar'))
+        self.assertListEqual(list(recipe.input_amounts), [1, 2])
+        self.assertEqual(json.dumps(recipe.to_json()), json.dumps({
+            "id": "copper-wire-coiler-plant",
+            "name": "Copper Wire (Coiler Plant)",
+            "cost": 12.0,
+            "time": 1.5,
+            "in": {"copper-bar": 1, "tin-bar": 2},
+            "out": {"copper-wire": 4},
+            "producers": ["coiler-plant"],
+            "row": 0,
+            "category": "crafting-ingredient"
+        }))
+
+
+if __name__ == '__main__':
+    unittest.main()
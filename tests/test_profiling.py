@@ -0,0 +1,75 @@
+from .context import profiling
+
+import json
+import time
+import tracemalloc
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def test_stages(self):
+        with profiling.Profiler() as profiler:
+            for _ in range(2):
+                with profiler.stage('parse'):
+                    with profiler.stage('allocate'):
+                        data = bytearray(8 << 20)
+                        del data
+                    with profiler.stage('sleep'):
+                        time.sleep(0.01)
+            with profiler.stage('write'):
+                pass
+        self.assertFalse(tracemalloc.is_tracing())
+        report = profiler.report(extra={'pages': 1})
+        self.assertDictEqual(report['extra'], {'pages': 1})
+        parse, write = report['stages']
+        self.assertEqual((parse['name'], parse['calls'], write['name'], write['calls']), ('parse', 2, 'write', 1))
+        allocate, sleep = parse['stages']
+        # the peak of a nested stage is kept by its parent, but not passed on to the following stages
+        self.assertGreaterEqual(allocate['peak_memory'], 8 << 20)
+        self.assertGreaterEqual(parse['peak_memory'], 8 << 20)
+        self.assertLess(sleep['peak_memory'], 1 << 20)
+        self.assertLess(write['peak_memory'], 1 << 20)
+        self.assertGreaterEqual(report['peak_memory'], 8 << 20)
+        self.assertGreaterEqual(sleep['wall_time'], 0.02)
+        self.assertGreaterEqual(parse['wall_time'], sleep['wall_time'])
+        self.assertGreaterEqual(report['wall_time'], parse['wall_time'] + write['wall_time'])
+
+        with TemporaryDirectory() as report_dir:
+            report_file = Path(report_dir) / 'profile.json'
+            with redirect_stdout(StringIO()) as output:
+                profiler.write(report_file)
+            self.assertEqual(json.loads(report_file.read_text())['stages'][0]['stages'][1]['name'], 'sleep')
+            self.assertIn('  allocate', output.getvalue())
+
+    def test_disabled(self):
+        with profiling.Profiler(False) as profiler:
+            with profiler.stage('parse'):
+                self.assertFalse(tracemalloc.is_tracing())
+        self.assertListEqual(profiler.report()['stages'], [])
+
+    def test_crawl_stats(self):
+        stats = profiling.CrawlStats()
+        self.assertEqual(stats.report()['requests_per_second'], 0)
+        started = time.perf_counter()
+        stats.record(started, 1000, 200)
+        stats.record(started, 500, 304)
+        stats.record(started - 0.3, 0)
+        report = stats.report()
+        self.assertEqual((report['requests'], report['failures'], report['bytes']), (3, 1, 1500))
+        self.assertDictEqual(report['statuses'], {'200': 1, '304': 1})
+        self.assertGreaterEqual(report['elapsed'], 0.3)
+        self.assertAlmostEqual(report['requests_per_second'], 3 / report['elapsed'])
+        histogram = {bucket['le']: bucket['count'] for bucket in report['latency_histogram']}
+        self.assertEqual(histogram[0.01], 2)
+        self.assertEqual(histogram[0.5], 1)
+        self.assertEqual(sum(histogram.values()), 3)
+        self.assertIsNone(report['latency_histogram'][-1]['le'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+from .context import watch
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+
+class FileWatcherTestCase(unittest.TestCase):
+
+    def test_changed(self):
+        with TemporaryDirectory() as work_dir:
+            items = Path(work_dir) / 'Items.xml'
+            items.write_text('<Items />')
+            recipes = Path(work_dir) / 'Recipes.xml'
+            watcher = watch.FileWatcher([items, recipes])
+            self.assertEqual(len(watcher), 2)
+            self.assertListEqual(watcher.changed(), [])
+
+            os.utime(items, ns=(items.stat().st_atime_ns, items.stat().st_mtime_ns + 1000000))
+            recipes.write_text('<Recipes />')
+            self.assertListEqual(watcher.changed(), [items, recipes])
+            self.assertListEqual(watcher.changed(), [])
+
+            # tracked files keep their stamp
+            recipes.unlink()
+            watcher.track([recipes, Path(work_dir)])
+            self.assertEqual(len(watcher), 3)
+            self.assertListEqual(watcher.changed(), [recipes])
+
+            # stamps taken before a file was read report the changes made since then
+            stamps = {items: watch.path_stamp(items)}
+            items.write_text('<Items><Item /></Items>')
+            watcher = watch.FileWatcher()
+            watcher.track([items, recipes], stamps)
+            self.assertListEqual(watcher.changed(), [items])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,17 @@
-from .context import wiki
+from .context import profiling, wiki
 
+import gzip
+import json
+import requests
 import unittest
 from bs4 import BeautifulSoup
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Callable, Union
+from tempfile import TemporaryDirectory
+from threading import Lock, Thread
+from typing import Dict, List, Set, Tuple, Callable, Optional, Union
 
 
 class WikiTestCase(unittest.TestCase):
@@ -43,6 +51,64 @@ class WikiTestCase(unittest.TestCase):
         links = {'https://www.facebook.com/getfandom', 'https://www.fandom.com/topics/movies', 'https://www.fandom.com/', 'https://fortresscrafte.fandom.com/wiki/Research_Projects', 'https://static.wikia.nocookie.net/fortresscrafte/images/f/fe/Cargo_Lift_Controller.png/revision/latest?cb=20180804002939', 'https://www.youtube.com/fandomentertainment', 'https://www.fandom.com/terms-of-use', 'https://about.fandom.com/mediakit#contact', 'https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest?cb=20160721235534', 'https://fortresscrafte.fandom.com/wiki/Blog:Recent_posts', 'https://www.fandom.com/video', 'https://www.fanatical.com/', 'https://www.instagram.com/getfandom/', 'https://www.fandom.com/licensing', 'https://www.fandom.com/careers', 'https://www.fandom.com/press', 'https://community.fandom.com/Sitemap', 'https://fortresscrafte.fandom.com/wiki/Streamer%27s/Youtuber%27s', 'https://www.futhead.com/', 'https://twitter.com/getfandom', 'https://bit.ly/FanLabWikiBar', 'https://fortresscrafte.fandom.com/wiki/Machines', 'https://community.fandom.com/wiki/Community_Central', 'https://www.fandomatic.com', 'https://www.fandom.com/about', 'http://steamcommunity.com/app/254200', 'https://www.fandom.com/explore', 'https://www.linkedin.com/company/157252', 'https://createnewwiki.fandom.com/Special:CreateNewWiki', 'https://play.google.com/store/apps/details?id=com.fandom.app&referrer=utm_source%3Dwikia%26utm_medium%3Dglobalfooter', 'https://www.fandom.com/do-not-sell-my-info', 'https://about.fandom.com/mediakit', 'https://fandom.zendesk.com/', 'https://www.fandom.com/topics/tv', 'https://static.wikia.nocookie.net/fortresscrafte/images/4/43/Copper_Wire.png/revision/latest?cb=20160721234453', 'https://fortresscrafte.fandom.com', 'https://www.fandom.com/what-is-fandom', 'https://www.fandom.com/about#contact', 'https://fortresscrafte.fandom.com/wiki/Tools', 'https://auth.fandom.com/register?redirect=https%3A%2F%2Ffortresscrafte.fandom.com%2Fwiki%2FCargo_Lift_Controller', 'https://fortresscrafte.fandom.com/wiki/Survival_Mode', 'https://fortresscrafte.fandom.com/wiki/Special:AllPages', 'https://www.cortexrpg.com/', 'https://fortresscrafte.fandom.com/wiki/Ores', 'https://static.wikia.nocookie.net/fortresscrafte/images/2/27/Cargo-lift-1.jpg/revision/latest?cb=20160711213019', 'https://apps.apple.com/us/app/fandom-videos-news-reviews/id1230063803', 'https://bit.ly/FandomIG', 'https://www.fandom.com/topics/games', 'https://fortresscrafte.fandom.com/wiki/Special:Community', 'https://fortresscrafte.fandom.com/wiki/Survival', 'https://fortresscrafte.fandom.com/wiki/Special:AllMaps', 'https://www.fandom.com/topics/anime', 'https://community.fandom.com/wiki/Help:Contents', 'https://fortresscrafte.fandom.com/wiki/Special:Search', 'https://fortresscrafte.fandom.com/wiki/Talk:Cargo_Lift_Controller?action=edit&redlink=1', 'https://fortresscrafte.fandom.com/Blog:Recent_posts', 'https://fortresscrafte.fandom.com/wiki/Unfocused_Polished_Lens', 'https://fortresscrafte.fandom.com/wiki/Cargo_Lift_Controller?action=edit', 'https://fortresscrafte.fandom.com/wiki/Stamper_Plant', 'https://fortresscrafte.fandom.com/wiki/Charged_Lithium_Coils', 'https://fortresscrafte.fandom.com/wiki/Pipe_Extrusion_Plant', 'https://fortresscrafte.fandom.com/wiki/Pyrothermic_Generator', 'https://fortresscrafte.fandom.com/wiki/Local_Sitemap', 'https://fortresscrafte.fandom.com/wiki/Category:Transport', 'https://fortresscrafte.fandom.com/wiki/Rack_Rail', 'https://fortresscrafte.fandom.com/wiki/Storage_Hopper', 'https://fortresscrafte.fandom.com/wiki/Improved_Cargo_Lift', 'https://fortresscrafte.fandom.com/wiki/H.O.D.O.R', 'https://fortresscrafte.fandom.com/wiki/Assembly_Machines', 'https://fortresscrafte.fandom.com/wiki/Copper_Wire', 'https://fortresscrafte.fandom.com/wiki/Category:Machines', 'https://fortresscrafte.fandom.com/wiki/Rack_Railer', 'https://fortresscrafte.fandom.com/wiki/Coiler_Plant', 'https://fortresscrafte.fandom.com/wiki/Auto_Excavator', 'https://fortresscrafte.fandom.com/wiki/Hydrojet_Cutter', 'https://fortresscrafte.fandom.com/wiki/Category:Logistic', 'https://fortresscrafte.fandom.com/wiki/Cargo_Lift_Controller?action=history', 'https://fortresscrafte.fandom.com/wiki/Basic_Ore_Smelter', 'https://fortresscrafte.fandom.com/wiki/BFL-9000', 'https://fortresscrafte.fandom.com/wiki/Special:Categories', 'https://fortresscrafte.fandom.com/wiki/Cargo_Lift', 'https://fortresscrafte.fandom.com/wiki/Iron_Gear', 'https://fortresscrafte.fandom.com/wiki/Basic_Logistics', 'https://fortresscrafte.fandom.com/wiki/Geothermal_Power', 'https://www.fandom.com/privacy-policy', 'https://bit.ly/TikTokFandom', 'https://fortresscrafte.fandom.com/wiki/FortressCraft_Evolved_Wiki', 'https://fortresscrafte.fandom.com/wiki/Forum:Index', 'https://fortresscrafte.fandom.com/wiki/ARTHER', 'https://static.wikia.nocookie.net/fortresscrafte/images/2/2f/Charged_Lithium_Coils.png/revision/latest?cb=20180429052414', 'https://auth.fandom.com/signin?redirect=https%3A%2F%2Ffortresscrafte.fandom.com%2Fwiki%2FCargo_Lift_Controller', 'https://www.muthead.com/'}
         self.assertSetEqual(wiki.get_links(page, url), links)
 
+    def test_parse_page(self):
+        page_content = self.TEST_PAGE.read_text()
+        page = BeautifulSoup(page_content, 'html.parser')
+        wiki_page = wiki.parse_page(page_content)
+        for url in ['https://fortresscrafte.fandom.com/wiki/Cargo_Lift_Controller', 'http://page.url/wiki/fortress_craft_evolved/Cargo_Lift_Controller.html']:
+            with self.subTest(f'Should get the same links and base url for "{url}"'):
+                self.assertEqual(wiki.get_base_url(wiki_page, url), wiki.get_base_url(page, url))
+                self.assertSetEqual(wiki.get_links(wiki_page, url), wiki.get_links(page, url))
+        self.assertDictEqual(wiki.get_images(wiki_page), wiki.get_images(page))
+
+    def test_parse_page_attributes(self):
+        page_content = '<html><head><base target="_blank"><base href="https://base.url"></head><body>' \
+            '<a>no link</a><a href>empty link</a><a href="/first" href="/second">duplicate</a><a href="#top"/>' \
+            '<img src="https://static.wikia.nocookie.net/fortresscrafte/images/a/ab/Icon.png?a=1&amp;b=2" data-image-key="Icon.png">' \
+            '<script>var html = "<a href=\'/script\'>";</script></body></html>'
+        page = BeautifulSoup(page_content, 'html.parser')
+        wiki_page = wiki.parse_page(page_content)
+        url = 'https://page.url/wiki/Page'
+        self.assertEqual(wiki.get_base_url(wiki_page, url), 'https://base.url')
+        self.assertSetEqual(wiki.get_links(wiki_page, url), wiki.get_links(page, url))
+        self.assertDictEqual(wiki.get_images(wiki_page), wiki.get_images(page))
+
+    def test_canonical_url(self):
+        test_cases = [
+            ('https://fortresscrafte.fandom.com/wiki/Iron_Gear', 'https://fortresscrafte.fandom.com/wiki/Iron_Gear'),
+            ('https://fortresscrafte.fandom.com/wiki/Iron_Gear', 'https://fortresscrafte.fandom.com/wiki/Iron_Gear#Crafting'),
+            ('https://fortresscrafte.fandom.com/wiki/Iron_Gear', 'https://fortresscrafte.fandom.com/wiki/Iron_Gear?so=search'),
+            ('https://fortresscrafte.fandom.com/wiki/Iron_Gear', 'HTTPS://FortressCraftE.fandom.com/wiki/Iron_Gear'),
+            ('https://fortresscrafte.fandom.com/wiki/Iron_Gear', 'https://fortresscrafte.fandom.com/wiki/Iron%5FGear'),
+            ("https://fortresscrafte.fandom.com/wiki/Streamer's/Youtuber's", 'https://fortresscrafte.fandom.com/wiki/Streamer%27s/Youtuber%27s'),
+            ('https://fortresscrafte.fandom.com/wiki/Blog:Recent_posts', 'https://fortresscrafte.fandom.com/Blog:Recent_posts'),
+            ('https://fortresscrafte.fandom.com/wiki/AC%2FDC', 'https://fortresscrafte.fandom.com/wiki/AC%2fDC'),
+            ('https://fortresscrafte.fandom.com/wiki/AC/DC', 'https://fortresscrafte.fandom.com/wiki/AC/DC'),
+            ('https://fortresscrafte.fandom.com/wiki/Why%3F_100%25', 'https://fortresscrafte.fandom.com/wiki/Why%3f_100%25'),
+            ('https://fortresscrafte.fandom.com', 'https://fortresscrafte.fandom.com'),
+            ('https://fortresscrafte.fandom.com/wiki/Special:AllPages?from=B&namespace=0', 'https://fortresscrafte.fandom.com/wiki/Special:AllPages?namespace=0&from=B'),
+            ]
+        for i, (canonical_url, url) in enumerate(test_cases):
+            with self.subTest(f'{i}: "{canonical_url}" is canonical form of "{url}"'):
+                self.assertEqual(wiki.canonical_url(url), canonical_url)
+
+    def test_url_frontier(self):
+        frontier = wiki.UrlFrontier('https://fortresscrafte.fandom.com/wiki', ['Special:', 'action='])
+        self.assertTrue(frontier.add('https://fortresscrafte.fandom.com/wiki/Iron_Gear'))
+        self.assertFalse(frontier.add('https://fortresscrafte.fandom.com/wiki/Iron_Gear#Crafting'))
+        self.assertFalse(frontier.add('https://fortresscrafte.fandom.com/wiki/Special:AllPages'))
+        self.assertFalse(frontier.add('https://fortresscrafte.fandom.com/wiki/Iron_Gear?action=edit'))
+        self.assertFalse(frontier.add('https://www.fandom.com/wiki/Iron_Gear'))
+        self.assertTrue(frontier.add('https://fortresscrafte.fandom.com/wiki/Template:Machines'))
+        self.assertEqual(len(frontier), 2)
+        self.assertEqual(frontier.pop(), 'https://fortresscrafte.fandom.com/wiki/Iron_Gear')
+        self.assertFalse(frontier.add('https://fortresscrafte.fandom.com/Iron_Gear'))
+        self.assertSetEqual(frontier.visited, {'https://fortresscrafte.fandom.com/wiki/Iron_Gear'})
+        self.assertEqual(len(frontier), 1)
+        # the base domain is canonical too
+        frontier = wiki.UrlFrontier('HTTPS://FortressCraftE.fandom.com/wiki')
+        self.assertTrue(frontier.add('https://fortresscrafte.fandom.com/wiki/Iron_Gear'))
+
     # def test_get_links_2(self):
     #     page = BeautifulSoup((self.TEST_DATA / '../../src/export/debug/Research_Projects_1.html').read_text(), 'html.parser')
     #     url = 'https://fortresscrafte.fandom.com/wiki/Research_Projects'
@@ -53,6 +119,46 @@ class WikiTestCase(unittest.TestCase):
         images = {'https://static.wikia.nocookie.net/fortresscrafte/images/e/e6/Site-logo.png/revision/latest?cb=20210713163518': {'Site-logo.png'}, 'https://static.wikia.nocookie.net/fortresscrafte/images/f/fe/Cargo_Lift_Controller.png/revision/latest?cb=20180804002939': {'Cargo_Lift_Controller.png'}, 'https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest/scale-to-width-down/32?cb=20160721235534': {'Iron_Gear.png'}, 'https://static.wikia.nocookie.net/fortresscrafte/images/4/43/Copper_Wire.png/revision/latest/scale-to-width-down/32?cb=20160721234453': {'Copper_Wire.png'}, 'https://static.wikia.nocookie.net/fortresscrafte/images/2/2f/Charged_Lithium_Coils.png/revision/latest/scale-to-width-down/32?cb=20180429052414': {'Charged_Lithium_Coils.png'}, 'https://static.wikia.nocookie.net/fortresscrafte/images/2/27/Cargo-lift-1.jpg/revision/latest?cb=20160711213019': {'Cargo-lift-1.jpg'}}
         self.assertDictEqual(wiki.get_images(page), images)
 
+    def test_group_images(self):
+        images = {
+            'https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest/scale-to-width-down/32?cb=20160721235534': {'Iron_Gear.png'},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest?cb=20160721235534': {'Iron_Gear.png', 'Gear.png'},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest/scale-to-width-down/64?cb=20150101000000': {'Iron_Gear.png'},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/4/43/Copper_Wire.png/revision/latest/scale-to-width-down/32?cb=20160721234453': {'Copper_Wire.png'},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/e/e6/Site-logo.png': {'Site-logo.png'}
+            }
+        originals = {
+            'https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest?cb=20160721235534': {'Iron_Gear.png', 'Gear.png'},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/4/43/Copper_Wire.png/revision/latest?cb=20160721234453': {'Copper_Wire.png'},
+            'https://static.wikia.nocookie.net/fortresscrafte/images/e/e6/Site-logo.png': {'Site-logo.png'}
+            }
+        self.assertDictEqual(wiki.group_images(images), originals)
+
+    def test_download_images(self):
+        page = BeautifulSoup(self.TEST_PAGE.read_text(), 'html.parser')
+        images = wiki.get_images(page)
+        downloaded = list()
+
+        def fetch_image(image_url: str) -> bytes:
+            downloaded.append(image_url)
+            # Iron_Gear.png and Copper_Wire.png have the same content
+            return b'wire' if 'Copper_Wire' in image_url or 'Iron_Gear' in image_url else image_url.encode()
+
+        with TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            manifest = wiki.download_images(images, output_dir, fetch_image, workers=4)
+            self.assertEqual(len(downloaded), len(images))
+            self.assertEqual(len(list((output_dir / 'objects').glob('*/*'))), len(images) - 1)
+            self.assertEqual(manifest['https://static.wikia.nocookie.net/fortresscrafte/images/f/fc/Iron_Gear.png/revision/latest?cb=20160721235534']['file'], manifest['https://static.wikia.nocookie.net/fortresscrafte/images/4/43/Copper_Wire.png/revision/latest?cb=20160721234453']['file'])
+
+            downloaded.clear()
+            self.assertDictEqual(wiki.download_images(images, output_dir, fetch_image), manifest)
+            self.assertListEqual(downloaded, [])
+
+            (output_dir / manifest['https://static.wikia.nocookie.net/fortresscrafte/images/e/e6/Site-logo.png/revision/latest?cb=20210713163518']['file']).write_bytes(b'broken')
+            wiki.download_images(images, output_dir, fetch_image)
+            self.assertListEqual(downloaded, ['https://static.wikia.nocookie.net/fortresscrafte/images/e/e6/Site-logo.png/revision/latest?cb=20210713163518'])
+
     def get_page(self, url: str, debug_dump_file: Union[Path, None] = None) -> BeautifulSoup:
         print(f'Visiting page: "{url}"')
         if url in self.visited:
@@ -66,6 +172,192 @@ class WikiTestCase(unittest.TestCase):
         self.assertDictEqual(wiki.scrap_images(wiki.DEFAULT_WIKI_URL, get_page=self.get_page), wiki.get_images(page))
         self.assertEqual(len(self.visited), 39)
 
+    def test_scrap_allpages(self):
+        self.visited = set()
+        page = BeautifulSoup(self.TEST_PAGE.read_text(), 'html.parser')
+        self.assertDictEqual(wiki.scrap_images(wiki.DEFAULT_WIKI_URL, get_page=self.get_page, strategy='allpages'), wiki.get_images(page))
+        self.assertEqual(len(self.visited), 32)
+        self.assertSetEqual({url for url in self.visited if ':' in url[len('https://'):]}, {'https://fortresscrafte.fandom.com/wiki/Special:AllPages'})
+
+    def get_page_concurrently(self, url: str, debug_dump_file: Union[Path, None] = None) -> BeautifulSoup:
+        with self.visited_lock:
+            if url in self.visited:
+                self.fail()
+            self.visited.add(url)
+        return BeautifulSoup(self.TEST_PAGE.read_text(), 'html.parser')
+
+    def test_scrap_concurrent(self):
+        self.visited = set()
+        self.visited_lock = Lock()
+        page = BeautifulSoup(self.TEST_PAGE.read_text(), 'html.parser')
+        self.assertDictEqual(wiki.scrap_images(wiki.DEFAULT_WIKI_URL, get_page=self.get_page_concurrently, workers=8), wiki.get_images(page))
+        self.assertEqual(len(self.visited), 39)
+
+    def test_scrap_mixed_case_url(self):
+        self.visited = set()
+        page = BeautifulSoup(self.TEST_PAGE.read_text(), 'html.parser')
+        self.assertDictEqual(wiki.scrap_images(wiki.DEFAULT_WIKI_URL.replace('fortresscrafte', 'FortressCraftE'), get_page=self.get_page), wiki.get_images(page))
+        self.assertEqual(len(self.visited), 39)
+
+    def test_scrap_workers(self):
+        with self.assertRaises(ValueError):
+            wiki.scrap_images(wiki.DEFAULT_WIKI_URL, get_page=self.get_page, workers=0)
+
+    def test_scrap_resume(self):
+        page = BeautifulSoup(self.TEST_PAGE.read_text(), 'html.parser')
+        first_visits = list()
+
+        def interrupted_get_page(url: str, debug_dump_file: Union[Path, None] = None) -> BeautifulSoup:
+            if len(first_visits) == 10:
+                raise ConnectionError('Network blip')
+            first_visits.append(url)
+            return page
+
+        with TemporaryDirectory() as checkpoint_dir:
+            # the directory of the checkpoint is created with it
+            checkpoint_file = Path(checkpoint_dir) / '.cache' / 'crawl.sqlite'
+            checkpoint = wiki.CrawlCheckpoint(checkpoint_file, interval=3)
+            with self.assertRaises(ConnectionError):
+                wiki.scrap_images(wiki.DEFAULT_WIKI_URL, get_page=interrupted_get_page, checkpoint=checkpoint)
+            checkpoint.close()
+
+            self.visited = set()
+            checkpoint = wiki.CrawlCheckpoint(checkpoint_file, resume=True)
+            images = wiki.scrap_images(wiki.DEFAULT_WIKI_URL, get_page=self.get_page, checkpoint=checkpoint)
+            checkpoint.close()
+
+        self.assertDictEqual(images, wiki.get_images(page))
+        self.assertSetEqual(self.visited & set(first_visits), set())
+        self.assertEqual(len(self.visited) + len(first_visits), 39)
+
+    def start_server(self, requested: List[str], etag: Union[str, None] = None) -> ThreadingHTTPServer:
+        test_page = self.TEST_PAGE.read_bytes()
+
+        class WikiHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requested.append(self.path)
+                if etag is not None and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(test_page)))
+                if etag is not None:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(test_page)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), WikiHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_scrap_local_server(self):
+        requested = list()
+        server = self.start_server(requested)
+        url = f'http://127.0.0.1:{server.server_address[1]}/wiki/FortressCraft_Evolved_Wiki'
+        results = list()
+        for workers in (1, 4):
+            requested.clear()
+            stats = profiling.CrawlStats()
+            page_fetcher = wiki.PageFetcher(wiki.create_session(workers), wiki.HostRateLimiter(0), stats=stats)
+            with TemporaryDirectory() as debug_dir:
+                images = wiki.scrap_images(url, get_page=page_fetcher, workers=workers, debug_dir=Path(debug_dir))
+                debug_files = json.loads((Path(debug_dir) / '_index.json').read_text())
+                self.assertEqual(len(list(Path(debug_dir).glob('*.html'))), len(requested))
+            self.assertEqual(sum(len(page_urls) for page_urls in debug_files.values()), len(requested))
+            results.append((images, sorted(requested)))
+            report = stats.report()
+            self.assertEqual(report['requests'], len(requested))
+            self.assertEqual(report['bytes'], len(requested) * len(self.TEST_PAGE.read_bytes()))
+        self.assertDictEqual(results[0][0], results[1][0])
+        self.assertListEqual(results[0][1], results[1][1])
+        self.assertEqual(len(results[0][1]), len(set(results[0][1])))
+
+    def test_page_archive(self):
+        with TemporaryDirectory() as archive_dir:
+            archive_file = Path(archive_dir) / 'crawl.warc.gz'
+            archive = wiki.PageArchive(archive_file)
+            archive.record('page-0', 'content 0', '"0"')
+            errors = list()
+
+            # readers keep reading while the archive grows and its map is replaced
+            def read_pages():
+                try:
+                    for _ in range(200):
+                        self.assertEqual(archive.read('page-0'), 'content 0')
+                except Exception as error:
+                    errors.append(error)
+
+            readers = [Thread(target=read_pages) for _ in range(4)]
+            for reader in readers:
+                reader.start()
+            for i in range(1, 200):
+                archive.record(f'page-{i}', f'content {i}' * (i % 7 + 1))
+                archive.read(f'page-{i}')
+            for reader in readers:
+                reader.join()
+            archive.close()
+            self.assertListEqual(errors, [])
+
+            # a record cut short is dropped when the index is rebuilt
+            archive_size = archive_file.stat().st_size
+            with archive_file.open('ab') as archive_content:
+                archive_content.write(gzip.compress(b'{"url": "page-200"}\ncontent 200')[:12])
+            (Path(archive_dir) / 'crawl.warc.gz.idx').unlink()
+            with redirect_stdout(StringIO()):
+                archive = wiki.PageArchive(archive_file)
+            self.assertEqual(len(archive), 200)
+            self.assertEqual(archive_file.stat().st_size, archive_size)
+            self.assertEqual(archive.read('page-199'), 'content 199' * 4)
+            self.assertDictEqual(archive.validators('page-0'), {'If-None-Match': '"0"'})
+
+            # error pages do not replace the archived pages
+            class ErrorSession:
+                def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+                    response = requests.Response()
+                    response.status_code = 503
+                    response._content = b'<html>Service unavailable</html>'
+                    return response
+
+            archive.record('http://localhost/Iron_Gear', 'archived')
+            with redirect_stdout(StringIO()):
+                wiki.PageFetcher(ErrorSession(), wiki.HostRateLimiter(0), archive)('http://localhost/Iron_Gear')
+            self.assertEqual(archive.read('http://localhost/Iron_Gear'), 'archived')
+            self.assertEqual(len(archive), 201)
+            archive.close()
+
+    def test_scrap_archive(self):
+        requested = list()
+        server = self.start_server(requested, '"test-page"')
+        url = f'http://127.0.0.1:{server.server_address[1]}/wiki/FortressCraft_Evolved_Wiki'
+        with TemporaryDirectory() as archive_dir:
+            archive_file = Path(archive_dir) / 'crawl.warc.gz'
+            archive = wiki.PageArchive(archive_file)
+            images = wiki.scrap_images(url, get_page=wiki.PageFetcher(rate_limiter=wiki.HostRateLimiter(0), archive=archive))
+            archive.close()
+            recorded = len(requested)
+            self.assertGreater(recorded, 1)
+
+            # replay from an archive with rebuilt index
+            (Path(archive_dir) / 'crawl.warc.gz.idx').unlink()
+            archive = wiki.PageArchive(archive_file)
+            self.assertEqual(len(archive), recorded)
+            self.assertDictEqual(wiki.scrap_images(url, get_page=archive.get_page), images)
+            self.assertEqual(len(requested), recorded)
+
+            # revalidate the archived pages
+            archive_size = archive_file.stat().st_size
+            images = wiki.scrap_images(url, get_page=wiki.PageFetcher(rate_limiter=wiki.HostRateLimiter(0), archive=archive))
+            archive.close()
+            self.assertEqual(len(requested), 2 * recorded)
+            self.assertEqual(archive_file.stat().st_size, archive_size)
+        self.assertDictEqual(images, wiki.get_images(BeautifulSoup(self.TEST_PAGE.read_text(), 'html.parser')))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,130 @@
+from .context import writer
+
+import gzip
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+
+class OutputWriterTestCase(unittest.TestCase):
+
+    DATA = {
+        "items": [{"id": f'item-{i}', "name": f'Item {i} – é', "stack": i} for i in range(5000)],
+        "recipes": []
+    }
+
+    def test_iterencode(self):
+        test_cases = [
+            self.DATA,
+            {},
+            [],
+            {"list": [], "dict": {}, "nested": [[1, [2]], {"a": {"b": None}}], "tuple": (1, 2.5, True)},
+            {1: "int", 2.5: "float", True: "bool", None: "null", "é": "unicode"},
+            [{"a": 1}, [], "text", 3, None],
+            "text",
+        ]
+        for i, data in enumerate(test_cases):
+            for levels in range(4):
+                with self.subTest(f'{i}: streaming {levels} levels should match json.dumps'):
+                    self.assertEqual(''.join(writer.iterencode(data, levels)), json.dumps(data))
+        lazy_data = {"items": (item for item in self.DATA["items"]), "recipes": map(dict, [])}
+        self.assertEqual(''.join(writer.iterencode(lazy_data)), json.dumps(self.DATA))
+
+    def test_write_json(self):
+        with TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            with writer.OutputWriter(output_dir) as output_writer:
+                output_writer.write_json('data.json', self.DATA)
+                output_writer.write_bytes('icons.png', b'png')
+                self.assertListEqual(output_writer.staged, ['data.json', 'data.json.gz', 'icons.png'])
+                self.assertTrue(all(path.name.startswith('.') and path.suffix == '.tmp' for path in output_dir.iterdir()))
+                self.assertFalse((output_dir / 'data.json').exists())
+            self.assertEqual((output_dir / 'data.json').read_text(), json.dumps(self.DATA))
+            self.assertEqual(gzip.decompress((output_dir / 'data.json.gz').read_bytes()).decode(), json.dumps(self.DATA))
+            self.assertEqual((output_dir / 'icons.png').read_bytes(), b'png')
+            self.assertListEqual(sorted(path.name for path in output_dir.iterdir()), ['data.json', 'data.json.gz', 'icons.png'])
+
+    def test_unchanged(self):
+        with TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            output_writer = writer.OutputWriter(output_dir)
+            output_writer.write_json('data.json', self.DATA)
+            output_writer.write_json('hash.json', {"items": []})
+            self.assertListEqual(output_writer.commit(), ['data.json', 'data.json.gz', 'hash.json', 'hash.json.gz'])
+            modification_time = (output_dir / 'data.json').stat().st_mtime_ns
+
+            output_writer.write_json('data.json', self.DATA)
+            output_writer.write_json('hash.json', {"items": ["copper-bar"]})
+            self.assertListEqual(output_writer.commit(), ['hash.json', 'hash.json.gz'])
+            self.assertEqual((output_dir / 'data.json').stat().st_mtime_ns, modification_time)
+
+            (output_dir / 'data.json.gz').unlink()
+            output_writer.write_json('data.json', self.DATA)
+            self.assertListEqual(output_writer.commit(), ['data.json.gz'])
+            self.assertListEqual(sorted(path.name for path in output_dir.iterdir()), ['data.json', 'data.json.gz', 'hash.json', 'hash.json.gz'])
+
+    def test_no_compression(self):
+        with TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            output_writer = writer.OutputWriter(output_dir, compress=False)
+            output_writer.write_json('data.json', self.DATA)
+            self.assertListEqual(output_writer.commit(), ['data.json'])
+
+    def test_discard(self):
+        with TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            (output_dir / 'data.json').write_text('{}')
+            with self.assertRaises(TypeError):
+                with writer.OutputWriter(output_dir) as output_writer:
+                    output_writer.write_json('data.json', self.DATA)
+                    output_writer.write_json('hash.json', {"items": {object()}})
+            # no output is replaced when any of them fails
+            self.assertListEqual(sorted(path.name for path in output_dir.iterdir()), ['data.json'])
+            self.assertEqual((output_dir / 'data.json').read_text(), '{}')
+
+    def test_commit_rollback(self):
+        with TemporaryDirectory() as output_dir:
+            output_dir = Path(output_dir)
+            output_writer = writer.OutputWriter(output_dir, compress=False)
+            output_writer.write_json('data.json', {"items": []})
+            output_writer.write_json('hash.json', {"items": []})
+            output_writer.commit()
+            replace = Path.replace
+
+            def failing_replace(path, target):
+                # the second output fails after the first one is replaced, restoring its backup succeeds
+                if Path(target).name == 'hash.json' and path.suffix == '.tmp':
+                    raise OSError('replace failed')
+                return replace(path, target)
+
+            output_writer.write_json('data.json', {"items": ["copper-bar"]})
+            output_writer.write_json('hash.json', {"items": ["copper-bar"]})
+            output_writer.write_json('icons.json', {})
+            with mock.patch.object(Path, 'replace', failing_replace):
+                with self.assertRaises(OSError):
+                    output_writer.commit()
+            self.assertListEqual(sorted(path.name for path in output_dir.iterdir()), ['data.json', 'hash.json'])
+            self.assertDictEqual(json.loads((output_dir / 'data.json').read_text()), {"items": []})
+            self.assertDictEqual(json.loads((output_dir / 'hash.json').read_text()), {"items": []})
+
+            # a crash leaves the journal behind, the next writer restores the previous outputs
+            output_writer.write_json('data.json', {"items": ["copper-bar"]})
+            output_writer.write_json('hash.json', {"items": ["copper-bar"]})
+            output_writer.write_json('icons.json', {})
+            with mock.patch.object(Path, 'replace', failing_replace), mock.patch.object(writer.OutputWriter, '_OutputWriter__roll_back'):
+                with self.assertRaises(OSError):
+                    output_writer.commit()
+            self.assertTrue((output_dir / writer.COMMIT_JOURNAL).is_file())
+            writer.OutputWriter(output_dir)
+            self.assertListEqual(sorted(path.name for path in output_dir.iterdir()), ['data.json', 'hash.json'])
+            self.assertDictEqual(json.loads((output_dir / 'data.json').read_text()), {"items": []})
+
+            output_writer.write_json('data.json', {"items": ["copper-bar"]})
+            self.assertListEqual(output_writer.commit(), ['data.json'])
+            self.assertListEqual(sorted(path.name for path in output_dir.iterdir()), ['data.json', 'hash.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()